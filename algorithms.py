@@ -0,0 +1,48 @@
+"""
+Plugin table of the forecasting algorithms.
+
+Every algorithm is registered by name with the 'module:attribute' path of
+its model class, not the class itself, so its module and the libraries it
+needs (statsmodels for ARIMA) are only imported the first time the
+algorithm is used. Another algorithm can be added without touching the
+tools with register('name', 'package.module:ModelClass').
+"""
+import importlib
+import threading
+
+
+ALGORITHMS = {
+    'linear-regression': 'linreg:StreamingLinearRegression',
+    'arima': 'arimasearch:ArimaModel',
+    'ensemble': 'ensemble:EnsembleModel',
+}
+
+_resolved = {}
+_lock = threading.Lock()
+
+
+def register(name, target):
+    with _lock:
+        ALGORITHMS[name] = target
+        _resolved.pop(name, None)
+
+
+# The model class of an algorithm, importing its module on first use
+def resolve(name):
+    model_class = _resolved.get(name)
+    if model_class is not None:
+        return model_class
+    try:
+        target = ALGORITHMS[name]
+    except KeyError:
+        raise ValueError(f'Unknown algorithm {name!r}, use one of {sorted(ALGORITHMS)}') from None
+    module_name, _, attribute = target.partition(':')
+    model_class = getattr(importlib.import_module(module_name), attribute)
+    with _lock:
+        _resolved[name] = model_class
+    return model_class
+
+
+# Create a model of an algorithm, passing the arguments to its class
+def create(name, *args, **kwargs):
+    return resolve(name)(*args, **kwargs)
@@ -1,36 +1,60 @@
 from flask import Flask, jsonify, request
-import requests
-import pandas as pd
-from sklearn.linear_model import LinearRegression
-from flask_caching import Cache
+from linreg import StreamingLinearRegression
+from pricestore import store
+from cachebackend import TrackedCache
+import cachebackend
+import codec
+from modelcache import ModelCache
+from singleflight import StaleWhileRevalidate
+import forecast
+import tiers
 import time
-import pickle
-import json
 
 app = Flask(__name__)
-cache = Cache(app, config={'CACHE_TYPE': 'simple'})
+cache = TrackedCache(app, config=cachebackend.cache_config())
+model_cache = ModelCache()
+coin_cache = StaleWhileRevalidate(ttl=60 * 60, stale_ttl=24 * 60 * 60)
 
 
-# Define function to fetch price data from the API
-@cache.cached(timeout=60 * 60)
+# Define function to fetch price data from the API and read its resolution tiers
 def fetch_price_data(crypto):
-    api_endpoint = f'https://api.coingecko.com/api/v3/coins/{crypto.lower()}/market_chart?vs_currency=usd&days=3652'
-    response = requests.get(api_endpoint)
-    price_data = response.json()
-    prices = pd.DataFrame(price_data['prices'], columns=['timestamp', 'price'])
-    prices['timestamp'] = pd.to_datetime(prices['timestamp'], unit='ms')
-    return prices
+    # Only the points newer than the last stored timestamp are downloaded
+    store.refresh(crypto)
+    # The hourly, daily and weekly bars are aggregated once per data update
+    return {tier: store.closes(crypto, tier) for tier in tiers.TIERS}
+
+# Define function to train a linear regression model on the closing prices of every tier.
+# Each freq predicts with the model of its tier (tiers.FREQ_TIERS). Models are cached
+# per coin and data watermark, so a coin is trained once per data update no matter
+# how many freq/period combinations are requested.
+def train_models(crypto, watermark, series):
+    # Fit straight on the int32 offsets and float32 closes of the compact series
+    def fit(tier):
+        model = StreamingLinearRegression()
+        return model.fit(series[tier].offsets, series[tier].values, origin=series[tier].base)
+
+    return {tier: model_cache.get_or_train(crypto, watermark, 'linear-regression', {'tier': tier}, lambda: fit(tier))
+            for tier in tiers.TIERS}
+
+# Define function to fetch the price data and train the models of a coin.
+# Concurrent requests for the same coin share one call, and once the data is an
+# hour old it keeps being served while a single background refresh runs.
+def load_coin(crypto):
+    def refresh():
+        # Other workers sharing the cache backend may have done the work this hour
+        shared_key = f'coin:{crypto.lower()}:{int(time.time() // (60 * 60))}'
+        shared = cache.get(shared_key)
+        if shared is not None:
+            return codec.decode_coin(shared)
+
+        series = fetch_price_data(crypto)
+        watermark = series['day'].end * 1000
+        models = train_models(crypto, watermark, series)
+        cache.set(shared_key, codec.encode_coin(watermark, models), timeout=2 * 60 * 60)
+        return watermark, models
+
+    return coin_cache.get(crypto.lower(), refresh)
 
-# Define function to train a linear regression model on price data
-def train_model(prices):
-    # Convert timestamps to Unix timestamp integers
-    timestamps = prices['timestamp'].map(lambda x: int(x.timestamp()))
-
-    # Train a linear regression model on the price data
-    model = LinearRegression()
-    model.fit(timestamps.to_frame(), prices['price'])
-
-    return model
 
 @app.route('/predictions/<freq>/<int:period>/<crypto>', methods=['GET'])
 def get_predictions(freq, period, crypto):
@@ -44,64 +68,54 @@ def get_predictions(freq, period, crypto):
     cache_key = f'{crypto}-{freq}-{period}'
     cached_predictions = cache.get(cache_key)
     if cached_predictions is not None:
-        return jsonify(cached_predictions)
-    
-    # Fetch and aggregate price data
-    prices = fetch_price_data(crypto)
-
-    # Train a linear regression model on the price data
-    model = train_model(prices)
-
-    # Predict future prices using the trained model
-    if freq == 'hour':
-        future_dates = pd.date_range(start=prices['timestamp'].iloc[-1], periods=period, freq='H')
-    elif freq == 'day':
-        future_dates = pd.date_range(start=prices['timestamp'].iloc[-1], periods=period, freq='D')
-    elif freq == 'month':
-        future_dates = pd.date_range(start=prices['timestamp'].iloc[-1], periods=period, freq='M')
-    else:
-        future_dates = pd.date_range(start=prices['timestamp'].iloc[-1], periods=period, freq='Y')
+        return app.response_class(cached_predictions, mimetype='application/json')
     
-    future_dates_int = future_dates.map(lambda x: int(x.timestamp()))
-    future_dates_reshaped = future_dates_int.to_numpy().reshape(-1, 1)
-    future_prices = model.predict(future_dates_reshaped)
+    # Fetch the price data and train the models, shared with concurrent requests
+    watermark, models = load_coin(crypto)
+
+    # Predict future prices using the model trained on the tier of this freq
+    future_dates = forecast.future_dates(forecast.watermark_date(watermark), period, freq)
+    future_prices = models[tiers.FREQ_TIERS[freq]].predict(forecast.epoch_seconds(future_dates).reshape(-1, 1))
 
     # Format the predictions based on the frequency requested
-    if freq == 'hour':
-        predictions = [{'date': date.strftime('%Y-%m-%d %H:%M:%S'), 'price': str(price)} for date, price in zip(future_dates, future_prices)]
-    elif freq == 'day':
-        predictions = [{'date': date.strftime('%Y-%m-%d'), 'price': str(price)} for date, price in zip(future_dates, future_prices)]
-    elif freq == 'month':
-        predictions = [{'date': date.strftime('%Y-%m'), 'price': str(price)} for date, price in zip(future_dates, future_prices)]
-    else:
-        predictions = [{'date': date.strftime('%Y'), 'price': str(price)} for date, price in zip(future_dates, future_prices)]
+    predictions = forecast.encode_predictions(future_dates, future_prices, freq)
 
     cache.set(cache_key, predictions, timeout=60 * 60)
     
-    return jsonify(predictions)
-
-# View the cache contents
-@app.route('/cache', methods=['GET'])
-def view_cache():
-    cache_data = []
-    json_cache_data = []
-    for key, value in cache.cache._cache.items():
-        try:
-            deserialized_value = pickle.loads(value[1])
-        except (pickle.UnpicklingError, TypeError):
-            try:
-                json_str = value[1].decode('utf-8')
-                deserialized_value = json.loads(json_str)
-            except (json.JSONDecodeError, TypeError):
-                deserialized_value = value[1].decode('utf-8', 'ignore')
-
-        expiration_time = value[0] - time.monotonic() if value[0] != 0 else None
-        cache_data.append({'key': key, 'value': deserialized_value, 'expiration_time': expiration_time})
+    return app.response_class(predictions, mimetype='application/json')
 
-        json_cache_data = json.dumps(cache_data, default=str)
+# Hit rate of the cache and memory of this worker
+@app.route('/cache/stats', methods=['GET'])
+def view_cache_stats():
+    stats = cachebackend.cache_stats(cache)
+    stats['models'] = model_cache.stats()
+    return jsonify(stats)
 
 
-    return jsonify(json_cache_data)
+# View the cache contents: metadata only, filtered by key prefix and paginated
+@app.route('/cache', methods=['GET'])
+def view_cache():
+    prefix = request.args.get('prefix', '')
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
+
+    keys = cache.keys(prefix)
+    entries = cache.describe(keys[offset:offset + limit])
+    return jsonify({'total': len(keys), 'offset': offset, 'limit': limit, 'entries': entries})
+
+
+# View a single cache entry including its value
+@app.route('/cache/entry/<path:key>', methods=['GET'])
+def view_cache_entry(key):
+    entries = cache.describe([key])
+    # Read from the backend directly so looking at an entry does not count as a hit
+    value = cache.cache.get(key)
+    if not entries or value is None:
+        return jsonify({'error': f'No cache entry for {key}.'}), 404
+
+    entry = entries[0]
+    entry['value'] = value if not isinstance(value, bytes) else f'<{len(value)} bytes>'
+    return jsonify(entry)
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
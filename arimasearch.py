@@ -0,0 +1,251 @@
+"""
+Parallel ARIMA order search with early stopping.
+
+The (p, d, q) grid is split into lanes, one per (d, q) pair, and each lane is
+walked in increasing p. Candidate fits run in a process pool, several p
+values ahead per lane so every core stays busy. Once a lane has gone
+`patience` p values without improving its best information criterion, the
+larger p orders of that lane are dominated by a smaller, better order: they
+are cancelled before they are fitted. With a single worker (main.py's batch
+mode already runs one fit per core) the orders are fitted in the calling
+process, without a pool.
+
+The chosen order is cached per coin and timeframe in a JSON file, so the
+search only runs again once the cached order is older than ORDER_MAX_AGE.
+"""
+import itertools
+import json
+import math
+import os
+import time
+import warnings
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows has no fcntl, concurrent writers may then drop each other's orders
+    fcntl = None
+
+
+ARIMA_ORDER_CACHE = os.environ.get('ARIMA_ORDER_CACHE', 'arima_orders.json')
+ORDER_MAX_AGE = 7 * 24 * 60 * 60
+
+CRITERIA = ('aic', 'bic')
+
+
+# This function returns a list of combinations of p, d, and q
+# values for the ARIMA model to optimize its performance.
+def get_pdq_values(p_values=range(0, 6), d_values=range(0, 2), q_values=range(0, 2)):
+    return list(itertools.product(p_values, d_values, q_values))
+
+
+# Fit one order and return its information criteria; a failed fit scores infinity.
+# Runs in the worker processes, so statsmodels is only imported there.
+def fit_order(series, order):
+    from statsmodels.tsa.arima.model import ARIMA
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        try:
+            result = ARIMA(np.asarray(series, dtype=np.float64), order=order).fit()
+        except (ValueError, np.linalg.LinAlgError):
+            return order, math.inf, math.inf
+    aic, bic = float(result.aic), float(result.bic)
+    if not np.isfinite(aic) or not np.isfinite(bic):
+        return order, math.inf, math.inf
+    return order, aic, bic
+
+
+class _Lane:
+    # The orders sharing one (d, q), fitted in increasing p
+    def __init__(self, orders):
+        self.orders = sorted(orders)
+        self.next_submit = 0
+        self.next_check = 0
+        self.scores = {}
+        self.best = math.inf
+        self.misses = 0
+        self.stopped = False
+        self.futures = []
+
+
+class _InlineExecutor:
+    # Runs every call in this process as it is submitted, for searches with a single worker
+    def submit(self, fn, *args):
+        future = Future()
+        try:
+            future.set_result(fn(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    def shutdown(self, cancel_futures=False):
+        pass
+
+
+# Search the grid for the order with the lowest AIC or BIC.
+# Returns (order, score, scores of every fitted order). max_workers is the number of
+# processes fitting orders, or of the workers of `executor` when one is passed in;
+# with a single worker the orders are fitted in this process.
+def search_order(series, orders=None, criterion='aic', max_workers=None, patience=2, executor=None):
+    if criterion not in CRITERIA:
+        raise ValueError(f'criterion must be one of {CRITERIA}')
+    orders = get_pdq_values() if orders is None else list(orders)
+    series = np.asarray(series, dtype=np.float64)
+
+    lanes = {}
+    for order in orders:
+        lanes.setdefault(order[1:], []).append(order)
+    lanes = [_Lane(lane_orders) for lane_orders in lanes.values()]
+
+    workers = max_workers or os.cpu_count() or 1
+    own_executor = executor is None
+    if own_executor:
+        executor = _InlineExecutor() if workers == 1 else ProcessPoolExecutor(max_workers=workers)
+    lookahead = max(1, math.ceil(workers / len(lanes)))
+    score_index = 1 if criterion == 'aic' else 2
+
+    scores = {}
+    pending = {}
+    try:
+        while True:
+            for lane in lanes:
+                while (not lane.stopped and lane.next_submit < len(lane.orders)
+                       and lane.next_submit - lane.next_check < lookahead):
+                    order = lane.orders[lane.next_submit]
+                    future = executor.submit(fit_order, series, order)
+                    pending[future] = lane
+                    lane.futures.append(future)
+                    lane.next_submit += 1
+            if not pending:
+                break
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                lane = pending.pop(future)
+                if future.cancelled():
+                    continue
+                result = future.result()
+                lane.scores[result[0]] = result[score_index]
+                scores[result[0]] = {'aic': result[1], 'bic': result[2]}
+                _advance(lane, patience, pending)
+    finally:
+        if own_executor:
+            executor.shutdown(cancel_futures=True)
+
+    best_order, best_score = None, math.inf
+    for order, order_scores in scores.items():
+        if order_scores[criterion] < best_score:
+            best_order, best_score = order, order_scores[criterion]
+    if best_order is None:
+        raise ValueError('No ARIMA order could be fitted to the series')
+    return best_order, best_score, scores
+
+
+# Walk a lane's results in p order and stop the lane once it stops improving
+def _advance(lane, patience, pending):
+    while not lane.stopped and lane.next_check < len(lane.orders):
+        order = lane.orders[lane.next_check]
+        if order not in lane.scores:
+            return
+        lane.next_check += 1
+        if lane.scores[order] < lane.best:
+            lane.best, lane.misses = lane.scores[order], 0
+        else:
+            lane.misses += 1
+            if lane.misses >= patience:
+                lane.stopped = True
+                for future in lane.futures:
+                    if future in pending and future.cancel():
+                        del pending[future]
+
+
+# Return the cached order of a coin/timeframe, or search and cache a new one
+def cached_order(coin, timeframe, series, cache_path=ARIMA_ORDER_CACHE, max_age=ORDER_MAX_AGE, **search_options):
+    key = f'{coin}-{timeframe}'
+    cache = _read_cache(cache_path)
+    entry = cache.get(key)
+    if entry is not None and time.time() - entry['searched_at'] < max_age:
+        return tuple(entry['order'])
+
+    order, score, _ = search_order(series, **search_options)
+    # Several processes (e.g. a batch run) may add orders at the same time
+    with _locked(cache_path):
+        cache = _read_cache(cache_path)
+        cache[key] = {'order': list(order), 'score': score, 'searched_at': time.time()}
+        tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(cache, f, indent=2)
+        os.replace(tmp_path, cache_path)
+    return order
+
+
+@contextmanager
+def _locked(cache_path):
+    if fcntl is None:
+        yield
+        return
+    with open(f'{cache_path}.lock', 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _read_cache(cache_path):
+    try:
+        with open(cache_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+class ArimaModel:
+    """ARIMA forecaster with the fit/predict interface of the regression models.
+
+    fit() takes timestamps and prices, picks the order (cached per coin and
+    timeframe when they are given) and fits it. predict() maps timestamps to
+    steps past the last observation and returns the forecast at those steps.
+    """
+
+    def __init__(self, orders=None, coin=None, timeframe=None, criterion='aic', **search_options):
+        self.orders = orders
+        self.coin = coin
+        self.timeframe = timeframe
+        self.criterion = criterion
+        self.search_options = search_options
+        self.order = None
+        self.result = None
+
+    def fit(self, X, y):
+        from statsmodels.tsa.arima.model import ARIMA
+
+        x = np.asarray(X, dtype=np.float64).ravel()
+        y = np.asarray(y, dtype=np.float64).ravel()
+        self.last_x = x[-1]
+        self.step = float(np.median(np.diff(x))) if len(x) > 1 else 1.0
+
+        options = dict(self.search_options, orders=self.orders, criterion=self.criterion)
+        if self.coin is not None:
+            self.order = cached_order(self.coin, self.timeframe, y, **options)
+        else:
+            self.order = search_order(y, **options)[0]
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            self.result = ARIMA(y, order=self.order).fit()
+        self._forecast = np.empty(0)
+        return self
+
+    def predict(self, X):
+        x = np.asarray(X, dtype=np.float64).ravel()
+        steps = np.maximum(1, np.rint((x - self.last_x) / self.step).astype(np.int64))
+        if steps.max() > len(self._forecast):
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                self._forecast = np.asarray(self.result.forecast(int(steps.max())))
+        return self._forecast[steps - 1]
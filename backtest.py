@@ -0,0 +1,288 @@
+"""
+Rolling-origin backtests of the price forecasts over the stored history.
+
+The backtest runs on the closes of one resolution tier (tiers.py), every
+stored bar of it rather than only the span the services train on, so
+points are evenly spaced and a horizon is a fixed time: the raw history
+mixes daily points with an hourly or 5 minute tail. Hourly bars are only
+one hour apart where hourly points were stored. Every bar after a warm-up is a forecast origin:
+the model sees the closes up to the origin, forecasts `horizons` bars ahead
+and is scored against what actually happened. Models are carried forward
+from origin to origin instead of being refitted from scratch:
+
+    linear-regression  the regression of pp.py and main.py; the sums of every
+                       training window come from prefix sums, so all
+                       origins are evaluated in one vectorized pass
+    arima              the order is searched once on the first window;
+                       parameters are re-estimated every `refit_every`
+                       bars, warm-started from the previous fit, and in
+                       between the Kalman filter state absorbs each new
+                       close and every horizon is projected from it at once
+
+Coins and algorithms are spread over a process pool, and MAE, MAPE and
+directional accuracy per coin, algorithm, tier and horizon are written as
+one table through reports.ReportWriter.
+
+Usage: python backtest.py [--coins bitcoin ethereum] [--tier day] [--horizons 1 7 30] [--output backtest]
+"""
+import argparse
+import sys
+import time
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import arimasearch
+import tiers
+from pricestore import PRICE_STORE_DIR, PriceStore
+from reports import ReportWriter
+
+
+ALGORITHMS = ('linear-regression', 'arima')
+
+# CoinGecko serves hourly points for the last 90 days only, daily bars are even over the whole history
+DEFAULT_TIER = 'day'
+
+# Bars ahead to forecast per tier: an hour, a day and a week of hourly bars, a day, a week
+# and a month of daily bars, a week, a month and a quarter of weekly bars
+DEFAULT_HORIZONS = {
+    'hour': (1, 24, 168),
+    'day': (1, 7, 30),
+    'week': (1, 4, 13),
+}
+
+# Bars an ARIMA fit is trained on, and how often its parameters are re-estimated
+ARIMA_WINDOW = 720
+ARIMA_REFIT_EVERY = 720
+# Refits start from the previous parameters; more iterations barely change the scores
+ARIMA_REFIT_MAXITER = 20
+
+HOUR_MS = 60 * 60 * 1000
+
+COLUMNS = ('coin', 'algorithm', 'tier', 'horizon', 'forecasts', 'mae', 'mape', 'directional_accuracy', 'seconds')
+
+
+# Forecasts of a linear regression on price against time, shape (len(horizons), len(origins)).
+# The model at origin t is trained on the `window` points up to and including t,
+# or on everything up to t when window is None, like the Flask services do.
+def linear_forecasts(timestamps, prices, origins, horizons, window=None):
+    # Hours since the first point keep the sums small enough for float64
+    x = (np.asarray(timestamps, dtype=np.int64) - int(timestamps[0])) / HOUR_MS
+    y = np.asarray(prices, dtype=np.float64)
+    origins = np.asarray(origins)
+
+    def prefix(values):
+        return np.concatenate(([0.0], np.cumsum(values)))
+
+    end = origins + 1
+    start = np.zeros_like(end) if window is None else np.maximum(0, end - window)
+    sums = {}
+    for name, values in (('x', x), ('y', y), ('xy', x * y), ('xx', x * x)):
+        cumulative = prefix(values)
+        sums[name] = cumulative[end] - cumulative[start]
+    n = (end - start).astype(np.float64)
+
+    mean_x = sums['x'] / n
+    mean_y = sums['y'] / n
+    sxx = sums['xx'] - sums['x'] * mean_x
+    sxy = sums['xy'] - sums['x'] * mean_y
+    with np.errstate(invalid='ignore', divide='ignore'):
+        slope = np.where(sxx > 0, sxy / sxx, 0.0)
+
+    forecasts = np.full((len(horizons), len(origins)), np.nan)
+    for i, h in enumerate(horizons):
+        valid = origins + h < len(y)
+        forecasts[i, valid] = mean_y[valid] + slope[valid] * (x[origins[valid] + h] - mean_x[valid])
+    return forecasts
+
+
+# Forecasts of an ARIMA model of fixed order, shape (len(horizons), len(origins)).
+# Origins must be sorted. Parameters are fitted on the `window` points up to an origin
+# (all of them when window is None) every `refit_every` points and filtered forward in between.
+def arima_forecasts(prices, origins, horizons, order, window=ARIMA_WINDOW, refit_every=ARIMA_REFIT_EVERY):
+    from statsmodels.tsa.arima.model import ARIMA
+
+    origins = np.asarray(origins)
+    # Coins priced at fractions of a cent make the variance estimate collapse,
+    # so fit on prices in units of the first window's level
+    scale = _level(prices[0 if window is None else max(0, origins[0] + 1 - window):origins[0] + 1])
+    y = np.asarray(prices, dtype=np.float64) / scale
+    forecasts = np.full((len(horizons), len(origins)), np.nan)
+    segments = (origins - origins[0]) // refit_every
+    bounds = np.flatnonzero(np.diff(segments)) + 1
+    params = None
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        for columns in np.split(np.arange(len(origins)), bounds):
+            first, last = origins[columns[0]], origins[columns[-1]]
+            lo = 0 if window is None else max(0, first + 1 - window)
+            try:
+                # Only the point forecasts are scored, so skip the parameter covariance
+                options = {} if params is None else {'method_kwargs': {'maxiter': ARIMA_REFIT_MAXITER}}
+                params = ARIMA(y[lo:first + 1], order=order).fit(start_params=params, cov_type='none', **options).params
+            except (ValueError, np.linalg.LinAlgError):
+                if params is None:
+                    continue  # Nothing fitted yet, leave this segment without forecasts
+
+            # One filter pass gives the state at every origin of the segment
+            result = ARIMA(y[lo:last + 1], order=order).filter(params).filter_results
+            states = result.filtered_state[:, origins[columns] - lo]
+            forecasts[:, columns] = _project(result, states, horizons)
+
+    for i, h in enumerate(horizons):
+        forecasts[i, origins + h >= len(y)] = np.nan
+    return forecasts * scale
+
+
+def _level(values):
+    level = float(np.mean(np.abs(values))) if len(values) else 0.0
+    return level if level > 0 and np.isfinite(level) else 1.0
+
+
+# Forecasts `horizons` steps past the given filtered states of a time-invariant state space model
+def _project(result, states, horizons):
+    transition = result.transition[:, :, 0]
+    state_intercept = result.state_intercept[:, :1]
+    design = result.design[0, :, 0]
+    obs_intercept = result.obs_intercept[0, 0]
+
+    wanted = {h: i for i, h in enumerate(horizons)}
+    projected = np.empty((len(horizons), states.shape[1]))
+    for step in range(1, max(horizons) + 1):
+        states = state_intercept + transition @ states
+        if step in wanted:
+            projected[wanted[step]] = obs_intercept + design @ states
+    return projected
+
+
+# MAE, MAPE (in percent) and directional accuracy of each horizon's forecasts
+def evaluate(prices, origins, horizons, forecasts):
+    y = np.asarray(prices, dtype=np.float64)
+    origins = np.asarray(origins)
+    scores = []
+    for h, predicted in zip(horizons, forecasts):
+        valid = np.isfinite(predicted) & (origins + h < len(y))
+        base = y[origins[valid]]
+        actual = y[origins[valid] + h]
+        predicted = predicted[valid]
+        errors = np.abs(predicted - actual)
+        nonzero = actual != 0
+        moved = actual != base
+        scores.append({
+            'horizon': h,
+            'forecasts': int(valid.sum()),
+            'mae': float(errors.mean()) if len(errors) else None,
+            'mape': float(100 * (errors[nonzero] / np.abs(actual[nonzero])).mean()) if nonzero.any() else None,
+            'directional_accuracy': (float((np.sign(predicted[moved] - base[moved]) == np.sign(actual[moved] - base[moved])).mean())
+                                     if moved.any() else None),
+        })
+    return scores
+
+
+# Backtest one algorithm on the bars of one tier of a coin of the store; runs in the worker
+# processes. Horizons, the window, min_train, step and refit_every count bars of the tier.
+def backtest_coin(coin, algorithm, horizons=None, tier=DEFAULT_TIER, store_root=PRICE_STORE_DIR, min_train=None,
+                  step=1, window=None, refit_every=ARIMA_REFIT_EVERY, order=None):
+    start = time.perf_counter()
+    series = PriceStore(store_root).closes(coin, tier, dtype=np.float64, recent=False)
+    timestamps, prices = series.seconds() * 1000, series.values
+    if horizons is None:
+        horizons = DEFAULT_HORIZONS[tier]
+    if algorithm == 'arima' and window is None:
+        window = ARIMA_WINDOW
+    if min_train is None:
+        min_train = window or max(horizons)
+    origins = np.arange(min_train - 1, len(prices) - min(horizons), step)
+    if len(origins) == 0:
+        raise ValueError(f'{coin} has {len(prices)} {tier} bars, too few to backtest')
+
+    if algorithm == 'linear-regression':
+        forecasts = linear_forecasts(timestamps, prices, origins, horizons, window=window)
+    elif algorithm == 'arima':
+        if order is None:
+            # Searched on the first training window only, so no later prices leak in
+            first = prices[max(0, origins[0] + 1 - window):origins[0] + 1]
+            order = arimasearch.cached_order(coin, f'backtest-{tier}-{window}', first / _level(first), max_workers=1)
+        forecasts = arima_forecasts(prices, origins, horizons, tuple(order), window=window, refit_every=refit_every)
+    else:
+        raise ValueError(f'Unknown algorithm {algorithm!r}, use one of {ALGORITHMS}')
+
+    seconds = time.perf_counter() - start
+    return [dict(coin=coin, algorithm=algorithm, tier=tier, seconds=seconds, **score)
+            for score in evaluate(prices, origins, horizons, forecasts)]
+
+
+# Backtest every coin and algorithm in a process pool.
+# Returns the result rows and the (coin, algorithm, error) of every failed backtest.
+def run_backtest(coins, algorithms=ALGORITHMS, max_workers=None, **options):
+    rows, failures = [], []
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = {(coin, algorithm): pool.submit(backtest_coin, coin, algorithm, **options)
+                   for coin in coins for algorithm in algorithms}
+        for (coin, algorithm), future in futures.items():
+            try:
+                rows.extend(future.result())
+            except Exception as e:
+                failures.append((coin, algorithm, e))
+    return rows, failures
+
+
+# Write the result rows as one table: .xlsx, .parquet, or a directory of CSV files
+def write_results(rows, path):
+    with ReportWriter(path) as report:
+        report.add_sheet('Backtest', {column: [row[column] for row in rows] for column in COLUMNS})
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description='Rolling-origin backtest of the price forecasts.')
+    parser.add_argument('--coins', nargs='+', help='coin ids to backtest (default: every coin in the store)')
+    parser.add_argument('--algorithms', nargs='+', choices=ALGORITHMS, default=list(ALGORITHMS))
+    parser.add_argument('--tier', choices=tiers.TIERS, default=DEFAULT_TIER, help='resolution tier of the bars to backtest on')
+    parser.add_argument('--horizons', nargs='+', type=int, default=None,
+                        help='bars of the tier ahead to forecast (default: '
+                             + ', '.join(f"{' '.join(map(str, h))} for {t}" for t, h in DEFAULT_HORIZONS.items()) + ')')
+    parser.add_argument('--store', default=PRICE_STORE_DIR, help='price store directory')
+    parser.add_argument('--refresh', action='store_true', help='update the stored history from CoinGecko first')
+    parser.add_argument('--window', type=int, default=None,
+                        help=f'bars each model is trained on (default: all for linear regression, {ARIMA_WINDOW} for ARIMA)')
+    parser.add_argument('--min-train', type=int, default=None, help='bars before the first origin (default: the window)')
+    parser.add_argument('--step', type=int, default=1, help='bars between origins')
+    parser.add_argument('--refit-every', type=int, default=ARIMA_REFIT_EVERY, help='bars between ARIMA parameter fits')
+    parser.add_argument('--order', type=int, nargs=3, metavar=('P', 'D', 'Q'), help='ARIMA order (default: searched per coin)')
+    parser.add_argument('--workers', type=int, default=None, help='processes (default: one per core)')
+    parser.add_argument('--output', default='backtest', help='a .xlsx or .parquet path, or a directory for CSV files')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    started = time.perf_counter()
+    store = PriceStore(args.store)
+    coins = args.coins or store.coins()
+    if args.refresh:
+        for coin in coins:
+            store.refresh(coin)
+
+    rows, failures = run_backtest(
+        coins, args.algorithms, max_workers=args.workers, tier=args.tier,
+        horizons=sorted(set(args.horizons)) if args.horizons else None, store_root=args.store, min_train=args.min_train, step=args.step, window=args.window,
+        refit_every=args.refit_every, order=args.order,
+    )
+    write_results(rows, args.output)
+
+    for coin, algorithm, error in failures:
+        print(f'Failed: {coin} {algorithm}: {error}', file=sys.stderr)
+    print(f"{'coin':<16} {'algorithm':<18} {'tier':<5} {'horizon':>7} {'forecasts':>9} {'mae':>12} {'mape %':>8} {'direction':>9}")
+    for row in rows:
+        mape = f"{row['mape']:.2f}" if row['mape'] is not None else '-'
+        direction = f"{row['directional_accuracy']:.3f}" if row['directional_accuracy'] is not None else '-'
+        mae = f"{row['mae']:.4g}" if row['mae'] is not None else '-'
+        print(f"{row['coin']:<16} {row['algorithm']:<18} {row['tier']:<5} {row['horizon']:>7} {row['forecasts']:>9} {mae:>12} {mape:>8} {direction:>9}")
+    print(f'{len(coins)} coins in {time.perf_counter() - started:.1f}s, results saved to {args.output}')
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
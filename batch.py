@@ -0,0 +1,137 @@
+"""
+Batch predictions for many (coin, freq, period) tuples in one request.
+
+The price histories of all coins in a batch are loaded concurrently with a
+bounded thread pool and the result is streamed back as a JSON array, one
+element per requested tuple, in request order. The array opens right away
+and every element is written as soon as its coin is loaded: the regressions
+of all requests whose coins are in by then are evaluated in one vectorized
+pass over the stacked models.
+"""
+import json
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import numpy as np
+
+import forecast
+import tiers
+from linreg import predict_stacked
+
+
+MAX_BATCH_SIZE = 500
+BATCH_FETCH_WORKERS = 8
+MAX_PERIOD = 3652
+
+
+# Validate the request body. Items may be objects or [crypto, freq, period] lists:
+#   {"requests": [{"crypto": "bitcoin", "freq": "day", "period": 7}, ["ethereum", "hour", 24]]}
+def parse_batch(payload):
+    if isinstance(payload, dict):
+        payload = payload.get('requests')
+    if not isinstance(payload, list) or not payload:
+        raise ValueError('Expected a non-empty list of (crypto, freq, period) requests.')
+    if len(payload) > MAX_BATCH_SIZE:
+        raise ValueError(f'A batch may contain at most {MAX_BATCH_SIZE} requests.')
+
+    items = []
+    for i, item in enumerate(payload):
+        if isinstance(item, dict):
+            item = (item.get('crypto'), item.get('freq'), item.get('period'))
+        if not isinstance(item, (list, tuple)) or len(item) != 3:
+            raise ValueError(f'Request {i} must be a (crypto, freq, period) tuple.')
+
+        crypto, freq, period = item
+        if not isinstance(crypto, str) or not crypto:
+            raise ValueError(f'Request {i} has an invalid crypto.')
+        if freq not in forecast.DATE_FORMATS:
+            raise ValueError(f'Request {i}: invalid frequency specified. Please use one of {list(forecast.DATE_FORMATS)}.')
+        if not isinstance(period, int) or isinstance(period, bool) or period < 1 or period > MAX_PERIOD:
+            raise ValueError(f'Request {i}: invalid period specified. Please use a value between 1 and {MAX_PERIOD}.')
+        items.append((crypto, freq, period))
+    return items
+
+
+# Compute the predictions of a batch and stream them back as one JSON array.
+# `load_coin` returns the (watermark, models per tier) of a coin, `cache` is the prediction cache,
+# and `on_computed` is called with the (crypto, freq, period) of every newly computed prediction.
+# The opening bracket goes out at once and every element as soon as its coin is loaded, in request order.
+def stream_batch(items, load_coin, cache, timeout=60 * 60, on_computed=None):
+    yield '['
+    bodies = {}
+    pending = {}  # key -> (crypto, freq, period) still to predict
+    for crypto, freq, period in items:
+        key = f'{crypto}-{freq}-{period}'
+        if key in bodies or key in pending:
+            continue
+        cached = cache.get(key)
+        if cached is not None:
+            bodies[key] = cached
+        else:
+            pending[key] = (crypto, freq, period)
+
+    # The price histories of all coins are loaded concurrently
+    pool = ThreadPoolExecutor(max_workers=BATCH_FETCH_WORKERS)
+    try:
+        loads = {crypto: pool.submit(load_coin, crypto)
+                 for crypto in dict.fromkeys(crypto for crypto, _, _ in pending.values())}
+        errors = {}
+        for i, (crypto, freq, period) in enumerate(items):
+            key = f'{crypto}-{freq}-{period}'
+            if key in pending:
+                # Wait for this coin, then predict every request whose coin is loaded by now in one pass
+                wait([loads[crypto]])
+                ready = [ready_key for ready_key, request in pending.items() if loads[request[0]].done()]
+                loaded = {}
+                for ready_crypto in dict.fromkeys(pending[ready_key][0] for ready_key in ready):
+                    error = loads[ready_crypto].exception()
+                    if error is None:
+                        loaded[ready_crypto] = loads[ready_crypto].result()
+                    else:
+                        errors[ready_crypto] = f'An error occurred: {error}'
+                computed = [ready_key for ready_key in ready if pending[ready_key][0] in loaded]
+                if computed:
+                    bodies.update(_predict([(ready_key, *pending[ready_key]) for ready_key in computed],
+                                           loaded, cache, timeout))
+                    if on_computed is not None:
+                        for ready_key in computed:
+                            on_computed(pending[ready_key])
+                for ready_key in ready:
+                    del pending[ready_key]
+
+            head = json.dumps({'crypto': crypto, 'freq': freq, 'period': period})[:-1]
+            if bodies.get(key) is not None:
+                chunk = f'{head}, "predictions": {bodies[key]}}}'
+            else:
+                chunk = f'{head}, "error": {json.dumps(errors.get(crypto, "No predictions available."))}}}'
+            yield chunk if i == 0 else ', ' + chunk
+    finally:
+        # A client that went away must not hold the response open until every load finished
+        pool.shutdown(wait=False, cancel_futures=True)
+    yield ']'
+
+
+# Evaluate all pending requests with one stacked prediction
+def _predict(pending, loaded, cache, timeout):
+    # One stacked model per (crypto, tier) pair in the batch
+    pairs = list(dict.fromkeys((crypto, tiers.FREQ_TIERS[freq]) for _, crypto, freq, _ in pending))
+    model_index = {pair: i for i, pair in enumerate(pairs)}
+    models = [loaded[crypto][1][tier] for crypto, tier in pairs]
+
+    dates, x, owners = [], [], []
+    for key, crypto, freq, period in pending:
+        watermark = loaded[crypto][0]
+        future_dates = forecast.future_dates(forecast.watermark_date(watermark), period, freq)
+        dates.append(future_dates)
+        x.append(forecast.epoch_seconds(future_dates))
+        owners.append(np.full(period, model_index[(crypto, tiers.FREQ_TIERS[freq])]))
+
+    future_prices = predict_stacked(models, np.concatenate(x), np.concatenate(owners))
+
+    bodies = {}
+    offset = 0
+    for (key, crypto, freq, period), future_dates in zip(pending, dates):
+        body = forecast.encode_predictions(future_dates, future_prices[offset:offset + period], freq)
+        offset += period
+        cache.set(key, body, timeout=timeout)
+        bodies[key] = body
+    return bodies
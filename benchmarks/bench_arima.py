@@ -0,0 +1,51 @@
+"""
+Wall-clock time of the ARIMA order search on synthetic series.
+
+Fits the default 24-order (p, d, q) grid on a synthetic ARIMA(2, 1, 1) price
+series, exhaustively and with early stopping, for an increasing number of
+worker processes.
+
+Usage: python benchmarks/bench_arima.py [--length 720] [--workers 1 2 4 8]
+"""
+import argparse
+import math
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import arimasearch  # noqa: E402
+
+
+# Prices whose differences follow an ARMA(2, 1) process
+def synthetic_series(length, seed=0):
+    rng = np.random.default_rng(seed)
+    noise = rng.normal(0, 1, length + 2)
+    diffs = np.zeros(length + 2)
+    for t in range(2, length + 2):
+        diffs[t] = 0.5 * diffs[t - 1] - 0.3 * diffs[t - 2] + noise[t] + 0.4 * noise[t - 1]
+    return 20000 + np.cumsum(diffs[2:]) * 50
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ARIMA order search benchmark')
+    parser.add_argument('--length', type=int, default=720, help='points in the synthetic series')
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    args = parser.parse_args()
+
+    series = synthetic_series(args.length)
+    print(f'{len(arimasearch.get_pdq_values())} orders, {args.length} points, {os.cpu_count()} cores')
+    print(f"{'mode':<12} {'workers':>7} {'seconds':>8} {'fits':>5} {'order':>10} {'aic':>10}")
+    for mode, patience in (('exhaustive', math.inf), ('early-stop', 2)):
+        for workers in args.workers:
+            start = time.perf_counter()
+            order, aic, scores = arimasearch.search_order(series, max_workers=workers, patience=patience)
+            elapsed = time.perf_counter() - start
+            print(f'{mode:<12} {workers:>7} {elapsed:>8.2f} {len(scores):>5} {str(order):>10} {aic:>10.1f}')
+
+
+if __name__ == '__main__':
+    main()
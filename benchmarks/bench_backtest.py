@@ -0,0 +1,81 @@
+"""
+Wall-clock time of the rolling-origin backtest on synthetic hourly history.
+
+Fills a temporary price store with `years` of hourly prices for `coins`
+coins (the synthetic series of the mock server) and backtests every bar of
+--tier (the hourly bars by default) with every worker of the process pool. For comparison, the linear regression is
+also refitted from scratch at a sample of origins and the cost is
+extrapolated to all of them.
+
+Usage: python benchmarks/bench_backtest.py [--coins 50] [--years 10] [--tier hour] [--algorithms linear-regression arima]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import backtest  # noqa: E402
+import tiers  # noqa: E402
+from linreg import StreamingLinearRegression  # noqa: E402
+from mockserver import HOUR_MS, synthetic_series  # noqa: E402
+from pricestore import PriceStore  # noqa: E402
+
+
+# Seconds to refit a linear regression from scratch at every origin, estimated from a sample
+def scratch_refit_seconds(timestamps, prices, origins, sample=200):
+    picked = origins[np.linspace(0, len(origins) - 1, min(sample, len(origins))).astype(int)]
+    start = time.perf_counter()
+    for origin in picked:
+        StreamingLinearRegression().fit(timestamps[:origin + 1], prices[:origin + 1])
+    return (time.perf_counter() - start) / len(picked) * len(origins)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backtest benchmark')
+    parser.add_argument('--coins', type=int, default=50)
+    parser.add_argument('--years', type=float, default=10)
+    parser.add_argument('--tier', choices=tiers.TIERS, default='hour')
+    parser.add_argument('--algorithms', nargs='+', choices=backtest.ALGORITHMS, default=list(backtest.ALGORITHMS))
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp()
+    try:
+        store = PriceStore(root)
+        end_ms = int(time.time() * 1000) // HOUR_MS * HOUR_MS
+        start_ms = end_ms - int(args.years * 365.25 * 24) * HOUR_MS
+        coins = [f'coin-{i}' for i in range(args.coins)]
+        for coin in coins:
+            store.append(coin, *synthetic_series(coin, start_ms, end_ms, HOUR_MS))
+        series = store.closes(coins[0], args.tier, dtype=np.float64, recent=False)
+        timestamps, prices = series.seconds() * 1000, series.values
+        print(f'{args.coins} coins x {len(prices)} {args.tier} bars, {os.cpu_count()} cores')
+
+        # A fixed order keeps the one-off order search out of the timings
+        os.environ['ARIMA_ORDER_CACHE'] = os.path.join(root, 'orders.json')
+        print(f"{'algorithm':<18} {'seconds':>8} {'per coin':>9} {'forecasts':>10}")
+        for algorithm in args.algorithms:
+            start = time.perf_counter()
+            rows, failures = backtest.run_backtest(coins, [algorithm], max_workers=args.workers, tier=args.tier,
+                                                   store_root=root, order=(1, 1, 1))
+            elapsed = time.perf_counter() - start
+            forecasts = sum(row['forecasts'] for row in rows)
+            print(f'{algorithm:<18} {elapsed:>8.2f} {elapsed / args.coins:>9.3f} {forecasts:>10}')
+            for coin, _, error in failures:
+                print(f'  failed {coin}: {error}')
+
+        if 'linear-regression' in args.algorithms:
+            origins = np.arange(max(backtest.DEFAULT_HORIZONS[args.tier]) - 1, len(prices) - 1)
+            estimate = scratch_refit_seconds(timestamps, prices, origins) * args.coins
+            print(f"{'refit from scratch':<18} {estimate:>8.0f} (estimated, one core)")
+    finally:
+        shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""
+Throughput of POST /predictions/batch against one GET per coin.
+
+Runs pp.py in-process against the local mock CoinGecko server and predicts
+the same top-50 style set of (coin, freq, period) tuples both ways:
+
+    cold: empty price store, every coin needs its full history
+    warm: price store populated, only the history tail is fetched
+
+Usage: python benchmarks/bench_batch.py [--coins 50] [--latency 0.05]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import mockserver  # noqa: E402
+
+
+FREQ_PERIODS = [('hour', 24), ('day', 7), ('month', 12)]
+
+
+def reset_caches(pp, store_dir=None):
+    pp.cache.clear()
+    pp.model_cache.clear()
+    pp.coin_cache = type(pp.coin_cache)(ttl=pp.coin_cache.ttl, stale_ttl=pp.coin_cache.stale_ttl)
+    if store_dir is not None:
+        pp.store.root = store_dir
+
+
+def run_single(client, items):
+    for crypto, freq, period in items:
+        response = client.get(f'/predictions/{freq}/{period}/{crypto}')
+        assert response.status_code == 200, response.get_data(as_text=True)
+
+
+def run_batch(client, items):
+    response = client.post('/predictions/batch', json={'requests': [list(item) for item in items]})
+    assert response.status_code == 200
+    assert '"error"' not in response.get_data(as_text=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Batch endpoint throughput benchmark')
+    parser.add_argument('--coins', type=int, default=50)
+    parser.add_argument('--latency', type=float, default=0.05, help='mock upstream latency in seconds')
+    args = parser.parse_args()
+
+    server = mockserver.start_server(latency=args.latency)
+    os.environ['COINGECKO_API_URL'] = server.coingecko_url
+    os.environ['PRICE_STORE_DIR'] = tempfile.mkdtemp()
+    import pp
+
+    client = pp.app.test_client()
+    coins = [f'coin-{i:02d}' for i in range(args.coins)]
+    items = [(coin, freq, period) for coin in coins for freq, period in FREQ_PERIODS]
+
+    print(f'{len(coins)} coins, {len(items)} predictions, upstream latency {args.latency * 1000:.0f} ms')
+    print(f"{'scenario':<8} {'mode':<7} {'seconds':>8} {'predictions/s':>14}")
+    for scenario in ('cold', 'warm'):
+        for mode, run in (('single', run_single), ('batch', run_batch)):
+            reset_caches(pp, tempfile.mkdtemp() if scenario == 'cold' else None)
+            if scenario == 'warm':
+                run_batch(client, items)
+                reset_caches(pp)
+            start = time.perf_counter()
+            run(client, items)
+            elapsed = time.perf_counter() - start
+            print(f'{scenario:<8} {mode:<7} {elapsed:>8.2f} {len(items) / elapsed:>14.1f}')
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Coin list lookups and /cryptocurrencies with the cached, indexed coin list.
+
+Serves the mock server's coin list (12000 coins, about CoinGecko's size) and
+measures:
+
+    download:  fetching and indexing the list, what a cold start pays once
+    disk load: loading the cached list after a restart
+    resolve:   coin id, symbol and name lookups, and a linear scan of the
+               list as the baseline
+    search:    prefix search through the sorted index
+    endpoint:  /cryptocurrencies on APIpp.py in full, one page, and
+               revalidated with If-None-Match (a 304 without a body)
+
+Usage: python benchmarks/bench_coinlist.py [--repeat 200]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import mockserver  # noqa: E402
+
+
+def best_us(fn, repeat, number=1):
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Coin list benchmark')
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    server = mockserver.start_server()
+    os.environ['COINGECKO_API_URL'] = server.coingecko_url
+    os.environ['COIN_LIST_CACHE'] = os.path.join(tempfile.mkdtemp(), 'coin_list.json')
+    os.environ['MATERIALIZE'] = '0'
+    import coinlist
+    import APIpp
+
+    path = os.environ['COIN_LIST_CACHE']
+    start = time.perf_counter()
+    coinlist.CoinList(path).index()
+    download_ms = (time.perf_counter() - start) * 1000
+    start = time.perf_counter()
+    index = coinlist.CoinList(path).index()
+    load_ms = (time.perf_counter() - start) * 1000
+    print(f'{len(index)} coins: download and index {download_ms:.1f} ms, load from disk {load_ms:.1f} ms')
+
+    last = index.coins[-1]
+
+    def scan():
+        return next(c['id'] for c in index.coins if last['symbol'] in (c['id'], c['symbol'], c['name'].lower()))
+
+    print()
+    print(f"{'lookup':<22} {'us':>9}")
+    lookups = (
+        ('resolve id', lambda: index.resolve(last['id'])),
+        ('resolve symbol', lambda: index.resolve(last['symbol'].upper())),
+        ('resolve name', lambda: index.resolve(last['name'])),
+        ('linear scan', scan),
+        ('search 20 by prefix', lambda: index.search('coin 11', 20)),
+    )
+    for name, fn in lookups:
+        print(f'{name:<22} {best_us(fn, args.repeat // 10 or 1, number=10):>9.2f}')
+
+    client = APIpp.app.test_client()
+    full = client.get('/cryptocurrencies')
+    etag = full.headers['ETag']
+    print()
+    print(f"{'/cryptocurrencies':<22} {'status':>6} {'bytes':>9} {'ms':>8}")
+    requests = (
+        ('full list', '/cryptocurrencies', {}),
+        ('limit=100', '/cryptocurrencies?limit=100', {}),
+        ('q=coin 11&limit=20', '/cryptocurrencies?q=coin 11&limit=20', {}),
+        ('full, If-None-Match', '/cryptocurrencies', {'If-None-Match': etag}),
+    )
+    for name, url, headers in requests:
+        response = client.get(url, headers=headers)
+        ms = best_us(lambda: client.get(url, headers=headers), max(args.repeat // 20, 3)) / 1000
+        print(f'{name:<22} {response.status_code:>6} {len(response.get_data()):>9} {ms:>8.2f}')
+
+
+if __name__ == '__main__':
+    main()
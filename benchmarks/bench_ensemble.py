@@ -0,0 +1,103 @@
+"""
+Latency and holdout error of ?model=ensemble on pp.py.
+
+Serves 10 years of hourly prices from the mock server and measures:
+
+    fit:    training the ensemble of each resolution tier from scratch, per
+            model and in total, and the weights it learned
+    warm:   GET /predictions/<freq>/<period>/<coin>?model=ensemble with the
+            coin and its ensembles cached but the prediction not, i.e.
+            predicting and formatting a whole horizon on every request,
+            next to the same requests with the linear model
+
+The script exits with status 1 when the warm p99 is over --budget-ms.
+
+Usage: python benchmarks/bench_ensemble.py [--requests 400] [--budget-ms 50]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import mockserver  # noqa: E402
+
+
+COIN = 'coin-07'
+REQUESTS = [(freq, period) for freq in ('hour', 'day', 'month', 'year') for period in (1, 24, 365, 3652)]
+
+
+def percentiles(samples):
+    return {q: float(np.percentile(samples, q)) * 1000 for q in (50, 90, 99)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Ensemble forecasting benchmark')
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--budget-ms', type=float, default=50.0)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    server = mockserver.start_server(hourly=True)
+    os.environ['COINGECKO_API_URL'] = server.coingecko_url
+    os.environ['PRICE_STORE_DIR'] = tempfile.mkdtemp()
+    os.environ['COIN_LIST_CACHE'] = os.path.join(tempfile.mkdtemp(), 'coin_list.json')
+    os.environ['MATERIALIZE'] = '0'
+    import ensemble
+    import pp
+    import tiers
+    from pricestore import store
+
+    client = pp.app.test_client()
+    client.get(f'/predictions/day/1/{COIN}')
+
+    print(f"{'tier':<5} {'points':>7} " + ' '.join(f'{name:>10}' for name in ensemble.MODELS)
+          + f" {'total ms':>9}  weights")
+    for tier in tiers.TIERS:
+        series = store.closes(COIN, tier)
+        x, y = series.offsets, series.values
+
+        def fit_one(name):
+            return ensemble._MODEL_CLASSES[name]().fit(x, y, origin=series.base)
+
+        model_ms = [min(timeit.repeat(lambda: fit_one(name), number=1, repeat=args.repeat)) * 1000
+                    for name in ensemble.MODELS]
+        model = ensemble.EnsembleModel(holdout=ensemble.HOLDOUTS[tier])
+        total_ms = min(timeit.repeat(lambda: model.fit(x, y, origin=series.base), number=1, repeat=args.repeat)) * 1000
+        weights = ', '.join(f'{name} {weight:.2f}' for name, weight in model.weights.items())
+        print(f'{tier:<5} {len(series):>7} ' + ' '.join(f'{ms:>10.2f}' for ms in model_ms)
+              + f' {total_ms:>9.2f}  {weights}')
+
+    print()
+    print(f"warm requests, {args.requests} per model over {len(REQUESTS)} freq/period pairs")
+    print(f"{'model':<9} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8}")
+    rng = random.Random(0)
+    over_budget = False
+    for model in pp.PREDICTION_MODELS:
+        for freq, period in REQUESTS:
+            client.get(f'/predictions/{freq}/{period}/{COIN}?model={model}')
+        samples = []
+        for _ in range(args.requests):
+            freq, period = rng.choice(REQUESTS)
+            pp.cache.delete('-'.join(str(part) for part in pp.prediction_key(COIN, freq, period, model)))
+            start = time.perf_counter()
+            response = client.get(f'/predictions/{freq}/{period}/{COIN}?model={model}')
+            samples.append(time.perf_counter() - start)
+            assert response.status_code == 200, response.get_data()
+        latency = percentiles(samples)
+        print(f'{model:<9} {latency[50]:>8.2f} {latency[90]:>8.2f} {latency[99]:>8.2f}')
+        over_budget = over_budget or (model == 'ensemble' and latency[99] > args.budget_ms)
+
+    print()
+    print(f"ensemble p99 {'over' if over_budget else 'within'} the {args.budget_ms:g} ms budget")
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == '__main__':
+    main()
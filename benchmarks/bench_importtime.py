@@ -0,0 +1,83 @@
+"""
+Import time of every entry point against its budget.
+
+Imports each entry point in a fresh interpreter with `python -X importtime`
+and reports the cumulative import time of the entry point module (the best
+of --repeat runs), its slowest direct imports, and whether any of the heavy
+libraries that must only load on first use (LAZY_MODULES) were imported.
+
+The script exits with status 1 when an entry point is over its budget or
+loads a lazy module at import.
+
+Usage: python benchmarks/bench_importtime.py [--repeat 5] [--entry-points pp main]
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Milliseconds each entry point may take to import, with headroom for slower machines
+BUDGETS_MS = {
+    'pp': 400,
+    'APIpp': 400,
+    'api': 400,
+    'main': 250,
+    'backtest': 250,
+}
+
+# Libraries no entry point may import before they are needed
+LAZY_MODULES = ('pandas', 'requests', 'statsmodels', 'sklearn', 'openpyxl', 'pyarrow')
+
+
+# Import `module` in a fresh interpreter: (cumulative us, {direct import: cumulative us}, imported modules)
+def import_once(module):
+    code = f'import sys, {module}; print(" ".join(sys.modules))'
+    env = dict(os.environ, MATERIALIZE='0')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                            cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+
+    total, children = None, {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        if name.strip() == module and depth == 0:
+            total = int(cumulative)
+        elif depth == 1:
+            # Direct imports are listed before the module that imports them
+            children[name.strip()] = int(cumulative)
+        elif depth == 0:
+            children = {}
+    return total, children, set(result.stdout.split())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import time benchmark')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--entry-points', nargs='+', default=list(BUDGETS_MS), choices=list(BUDGETS_MS))
+    parser.add_argument('--top', type=int, default=4, help='slowest direct imports to list')
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'entry point':<12} {'ms':>7} {'budget':>7}  {'status':<6} slowest imports (ms)")
+    for module in args.entry_points:
+        runs = [import_once(module) for _ in range(args.repeat)]
+        total, children, modules = min(runs, key=lambda run: run[0])
+        eager = sorted(name for name in LAZY_MODULES if name in modules)
+        ms = total / 1000
+        ok = ms <= BUDGETS_MS[module] and not eager
+        failed = failed or not ok
+        slowest = sorted(children.items(), key=lambda item: -item[1])[:args.top]
+        print(f'{module:<12} {ms:>7.1f} {BUDGETS_MS[module]:>7}  {"ok" if ok else "FAIL":<6} '
+              + ', '.join(f'{name} {us / 1000:.0f}' for name, us in slowest))
+        if eager:
+            print(f"{'':<12} imported at startup: {', '.join(eager)}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
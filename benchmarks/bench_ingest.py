@@ -0,0 +1,111 @@
+"""
+Tick ingestion throughput and the cost of keeping forecasts current.
+
+Loads `coins` coins from the mock server into pp.py and caches a few
+predictions of each, then replays a recorded feed of --hours of ticks (a
+random walk from the last stored price, one tick per coin every
+--tick-seconds) through an IngestWorker and reports:
+
+    ticks per second the worker takes, bars applied, and the mean time to
+    apply a bar (append, tier update, model update, forecast checks)
+    cached predictions replaced and kept under --threshold
+    the time to bring a coin's models forward by one bar next to refitting
+    them on the stored tiers, and the largest difference between the two
+    after the replay
+
+Usage: python benchmarks/bench_ingest.py [--coins 10] [--hours 3] [--tick-seconds 5] [--threshold 0.005]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import mockserver  # noqa: E402
+
+
+REQUESTS = ['hour/24', 'day/30', 'month/12', 'year/10']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tick ingestion benchmark')
+    parser.add_argument('--coins', type=int, default=10)
+    parser.add_argument('--hours', type=float, default=3)
+    parser.add_argument('--tick-seconds', type=float, default=5)
+    parser.add_argument('--interval', type=int, default=60, help='seconds per bar')
+    parser.add_argument('--threshold', type=float, default=0.005)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    server = mockserver.start_server(hourly=True)
+    os.environ['COINGECKO_API_URL'] = server.coingecko_url
+    os.environ['PRICE_STORE_DIR'] = tempfile.mkdtemp()
+    os.environ['COIN_LIST_CACHE'] = os.path.join(tempfile.mkdtemp(), 'coin_list.json')
+    os.environ['MATERIALIZE'] = '0'
+    os.environ['INGEST_THRESHOLD'] = str(args.threshold)
+    import ingest
+    import pp
+    import tiers
+    from linreg import StreamingLinearRegression
+    from pricestore import store
+
+    coins = [f'coin-{i:02d}' for i in range(args.coins)]
+    client = pp.app.test_client()
+    for coin in coins:
+        for request in REQUESTS:
+            client.get(f'/predictions/{request}/{coin}')
+
+    # Ticks of every coin interleaved in time, starting after the stored history
+    rng = np.random.default_rng(0)
+    start_ms = max(store.last_timestamp(coin) for coin in coins) + 1000
+    steps = int(args.hours * 3600 / args.tick_seconds)
+    times = start_ms + (np.arange(steps) * args.tick_seconds * 1000).astype(np.int64)
+    walks = {coin: float(store.closes(coin, 'hour').values[-1]) * np.exp(np.cumsum(rng.normal(0, 5e-4, steps)))
+             for coin in coins}
+    path = os.path.join(tempfile.mkdtemp(), 'ticks.ndjson')
+    ingest.write_ticks(path, ((coin, times[i], walks[coin][i]) for i in range(steps) for coin in coins))
+
+    worker = ingest.IngestWorker(ingest.ReplaySource(path), pp.ingest_prices, interval=args.interval)
+    started = time.perf_counter()
+    taken = worker.run()
+    elapsed = time.perf_counter() - started
+    stats = worker.stats()
+    print(f'{taken} ticks of {len(coins)} coins in {elapsed:.2f}s ({taken / elapsed:,.0f} ticks/s), '
+          f'{stats["bars"]} bars, {stats["apply_mean_seconds"] * 1000:.2f} ms per bar, '
+          f'{stats["failures"]} failures, aggregator {stats["aggregator_bytes"]} bytes')
+    checks = stats['replaced'] + stats['kept']
+    print(f'cached predictions: {stats["replaced"]} replaced, {stats["kept"]} kept '
+          f'({stats["kept"] / max(checks, 1):.0%} of {checks} checks within {args.threshold:g})')
+
+    print()
+    print(f"{'tier':<5} {'bars':>6} {'update us':>10} {'refit us':>10} {'max rel diff':>13}")
+    coin = coins[0]
+    watermark, models = pp.coin_cache.peek(coin)
+    for tier in tiers.TIERS:
+        series = store.closes(coin, tier)
+        # A bar that rewrote the last one: take the old close out, put the new one in
+        last = (series.offsets[-1:], series.values[-1:])
+
+        def update():
+            model = models[tier].copy()
+            model.remove(*last, origin=series.base)
+            return model.extend(*last, origin=series.base)
+
+        def refit():
+            return StreamingLinearRegression().fit(series.offsets, series.values, origin=series.base)
+
+        update_us = min(timeit.repeat(update, number=1, repeat=args.repeat)) * 1e6
+        refit_us = min(timeit.repeat(refit, number=1, repeat=args.repeat)) * 1e6
+        x = watermark / 1000 + np.arange(0, 10 * 365) * 86400.0
+        reference = refit().predict(x)
+        difference = np.max(np.abs(models[tier].predict(x) - reference) / np.abs(reference))
+        print(f'{tier:<5} {len(series):>6} {update_us:>10.1f} {refit_us:>10.1f} {difference:>13.2e}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+Cost of ?intervals=80,95 on pp.py.
+
+Serves 10 years of hourly prices from the mock server and measures:
+
+    per model:  predict() next to predict_std() and the bounds of two
+                levels, over a 3652 day horizon
+    requests:   GET /predictions/day/<period>/<coin> with the coin and its
+                models cached but the prediction not, with and without
+                ?intervals=80,95, for every model
+    check:      the linear bounds against statsmodels' OLS prediction
+                intervals, when statsmodels is installed
+
+Usage: python benchmarks/bench_intervals.py [--requests 300]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import mockserver  # noqa: E402
+
+
+COIN = 'coin-05'
+LEVELS = '80,95'
+PERIODS = (7, 30, 365, 3652)
+
+
+def percentiles(samples):
+    return {q: float(np.percentile(samples, q)) * 1000 for q in (50, 99)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prediction interval benchmark')
+    parser.add_argument('--requests', type=int, default=300)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    server = mockserver.start_server(hourly=True)
+    os.environ['COINGECKO_API_URL'] = server.coingecko_url
+    os.environ['PRICE_STORE_DIR'] = tempfile.mkdtemp()
+    os.environ['COIN_LIST_CACHE'] = os.path.join(tempfile.mkdtemp(), 'coin_list.json')
+    os.environ['MATERIALIZE'] = '0'
+    import forecast
+    import intervals
+    import pp
+    from pricestore import store
+
+    client = pp.app.test_client()
+    client.get(f'/predictions/day/1/{COIN}')
+    watermark, _ = pp.load_coin(COIN)
+    dates = forecast.future_dates(forecast.watermark_date(watermark), 3652, 'day')
+    x = forecast.epoch_seconds(dates).reshape(-1, 1)
+    levels = intervals.parse_levels(LEVELS)
+
+    print(f"{'model':<9} {'predict us':>11} {'std+bounds us':>14}")
+    for model in pp.PREDICTION_MODELS:
+        predictor = pp.train_predictor(COIN, watermark, 'day', model)
+        predict_us = min(timeit.repeat(lambda: predictor.predict(x), number=1, repeat=args.repeat)) * 1e6
+        bounds_us = min(timeit.repeat(
+            lambda: intervals.bounds(predictor.predict(x), predictor.predict_std(x), levels,
+                                     getattr(predictor, 'dof', None)),
+            number=1, repeat=args.repeat)) * 1e6 - predict_us
+        print(f'{model:<9} {predict_us:>11.1f} {bounds_us:>14.1f}')
+
+    print()
+    print(f'requests without the prediction cached, {args.requests} per row over periods {PERIODS}')
+    print(f"{'model':<9} {'intervals':<10} {'p50 ms':>8} {'p99 ms':>8}")
+    rng = random.Random(0)
+    for model in pp.PREDICTION_MODELS:
+        for levels_text in ('', LEVELS):
+            query = f'?model={model}' + (f'&intervals={levels_text}' if levels_text else '')
+            samples = []
+            for _ in range(args.requests):
+                period = rng.choice(PERIODS)
+                key = pp.prediction_key(COIN, 'day', period, model, 'usd', levels_text)
+                pp.cache.delete('-'.join(str(part) for part in key))
+                start = time.perf_counter()
+                response = client.get(f'/predictions/day/{period}/{COIN}{query}')
+                samples.append(time.perf_counter() - start)
+                assert response.status_code == 200, response.get_data()
+            latency = percentiles(samples)
+            print(f'{model:<9} {levels_text or "-":<10} {latency[50]:>8.2f} {latency[99]:>8.2f}')
+
+    try:
+        import statsmodels.api as sm
+    except ImportError:
+        return
+    series = store.closes(COIN, 'day')
+    predictor = pp.train_predictor(COIN, watermark, 'day')
+    seconds = series.seconds().astype(np.float64) - series.base
+    fit = sm.OLS(series.values.astype(np.float64), sm.add_constant(seconds)).fit()
+    future = forecast.epoch_seconds(dates).astype(np.float64) - series.base
+    frame = fit.get_prediction(sm.add_constant(future, has_constant='add')).summary_frame(alpha=0.05)
+    lower, upper = intervals.bounds(predictor.predict(x), predictor.predict_std(x), (95,), predictor.dof)[95]
+    difference = max(np.max(np.abs(lower - frame['obs_ci_lower'].to_numpy())),
+                     np.max(np.abs(upper - frame['obs_ci_upper'].to_numpy())))
+    print()
+    print(f'largest difference to statsmodels OLS 95% bounds: {difference:.2e} '
+          f'(interval width {np.mean(upper - lower):.2f})')
+
+
+if __name__ == '__main__':
+    main()
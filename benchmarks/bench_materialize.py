@@ -0,0 +1,83 @@
+"""
+Share of prediction requests answered from a materialized forecast.
+
+Simulates a day of requests for `keys` (crypto, freq, period) keys with
+Zipf-distributed popularity against a prediction cache with a one hour TTL,
+on a fake clock. Each request either hits the cache or computes the
+forecast inline; with the Materializer, hot keys are recomputed before they
+expire. Reports the inline compute rate, overall and for requests of keys
+that were already hot, the background refreshes spent on it, and the
+scheduler's queue depth and refresh lag.
+
+Usage: python benchmarks/bench_materialize.py [--keys 500] [--requests-per-hour 5000] [--hours 24]
+"""
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from materialize import Materializer  # noqa: E402
+
+
+TTL = 60 * 60
+
+
+def simulate(keys, requests_per_hour, hours, materialize, compute_seconds, seed=0):
+    rng = np.random.default_rng(seed)
+    n = int(requests_per_hour * hours)
+    times = np.sort(rng.uniform(0, hours * 3600, n))
+    requested = np.minimum(rng.zipf(1.3, n), keys) - 1
+
+    clock = [0.0]
+    expires = {}
+    background = [0]
+    max_depth = 0
+
+    def refresh(key):
+        clock[0] += compute_seconds  # The worker is busy for the compute time
+        expires[key] = clock[0] + TTL
+        background[0] += 1
+
+    materializer = Materializer(refresh, ttl=TTL, clock=lambda: clock[0])
+    inline = hot_requests = hot_inline = 0
+    for now, key in zip(times, requested):
+        if materialize:
+            clock[0] = max(clock[0], now)
+            # Everything run_pending() works through was queued at once
+            max_depth = max(max_depth, materializer.run_pending())
+        clock[0] = max(clock[0], now)
+        hot = materializer.rate(key) >= materializer.min_rate
+        hot_requests += hot
+        materializer.record(key)
+        if expires.get(key, -1) <= clock[0]:
+            inline += 1
+            hot_inline += hot
+            expires[key] = clock[0] + TTL
+            materializer.materialized(key)
+    return n, inline, hot_inline / max(hot_requests, 1), background[0], max_depth, materializer.stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Materialized forecast hit rate simulation')
+    parser.add_argument('--keys', type=int, default=500)
+    parser.add_argument('--requests-per-hour', type=int, default=5000)
+    parser.add_argument('--hours', type=float, default=24)
+    parser.add_argument('--compute-seconds', type=float, default=0.5, help='simulated fetch+train+predict time')
+    args = parser.parse_args()
+
+    print(f'{args.keys} keys, {args.requests_per_hour} requests per hour for {args.hours:g} hours')
+    print(f"{'mode':<12} {'requests':>9} {'inline':>7} {'inline %':>9} {'hot inline %':>12} "
+          f"{'background':>10} {'max queue':>9} {'mean lag s':>10}")
+    for mode, materialize in (('ttl only', False), ('materialize', True)):
+        n, inline, hot_inline, background, depth, stats = simulate(args.keys, args.requests_per_hour, args.hours,
+                                                       materialize, args.compute_seconds)
+        lag = stats['refresh_lag_mean_seconds']
+        lag = f'{lag:.2f}' if lag is not None else '-'
+        print(f'{mode:<12} {n:>9} {inline:>7} {100 * inline / n:>8.2f}% {100 * hot_inline:>11.2f}% '
+              f'{background:>10} {depth:>9} {lag:>10}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Request overhead of the Prometheus instrumentation in pp.py.
+
+Runs pp.py in-process against the local mock CoinGecko server and times the
+same requests with metrics.enabled switched on and off, alternating rounds
+so both settings see the same machine noise:
+
+    warm: GET /predictions answered from the prediction cache
+    cold: caches cleared before every request, the price store stays
+          populated so only the history tail is fetched
+
+With --http the requests go through a local WSGI server over HTTP, which
+is closer to what a client sees than Flask's test client.
+
+Reports the request time of the fastest round of each, the least noisy
+estimate on a busy machine, and the relative overhead, which
+should stay under 1%. Also times one scrape of /metrics.
+
+Usage: python benchmarks/bench_metrics.py [--requests 10000] [--cold-requests 500] [--rounds 20] [--http]
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+from werkzeug.serving import make_server
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import mockserver  # noqa: E402
+
+
+URL = '/predictions/day/7/coin-00'
+
+
+# Fastest round's seconds per request with instrumentation off and on, alternating rounds
+def median_request_seconds(metrics, run, number, rounds):
+    samples = {False: [], True: []}
+    per_round = max(number // rounds, 1)
+    for i in range(2 * rounds):
+        metrics.enabled = bool(i % 2)
+        start = time.perf_counter()
+        for _ in range(per_round):
+            run()
+        samples[metrics.enabled].append((time.perf_counter() - start) / per_round)
+    metrics.enabled = True
+    return min(samples[False]), min(samples[True])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Metrics overhead benchmark')
+    parser.add_argument('--requests', type=int, default=10000)
+    parser.add_argument('--cold-requests', type=int, default=500)
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--http', action='store_true', help='send the requests over HTTP to a local server')
+    args = parser.parse_args()
+
+    server = mockserver.start_server()
+    os.environ['COINGECKO_API_URL'] = server.coingecko_url
+    os.environ['PRICE_STORE_DIR'] = tempfile.mkdtemp()
+    os.environ['MATERIALIZE'] = '0'
+    os.environ['METRICS'] = '1'
+    import metrics
+    import pp
+
+    client = pp.app.test_client()
+    if args.http:
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        http_server = make_server('127.0.0.1', 0, pp.app, threaded=True)
+        threading.Thread(target=http_server.serve_forever, daemon=True).start()
+        session = requests.Session()
+        base_url = f'http://127.0.0.1:{http_server.server_port}'
+
+    def get():
+        response = session.get(base_url + URL) if args.http else client.get(URL)
+        assert response.status_code == 200
+
+    def get_cold():
+        pp.cache.clear()
+        pp.model_cache.clear()
+        pp.coin_cache = type(pp.coin_cache)(ttl=pp.coin_cache.ttl, stale_ttl=pp.coin_cache.stale_ttl)
+        get()
+
+    get()
+    print(f"{'scenario':<8} {'off ms':>8} {'on ms':>8} {'overhead':>9}")
+    for scenario, run, number in (('warm', get, args.requests), ('cold', get_cold, args.cold_requests)):
+        off, on = median_request_seconds(metrics, run, number, args.rounds)
+        print(f'{scenario:<8} {off * 1000:>8.3f} {on * 1000:>8.3f} {100 * (on - off) / off:>8.2f}%')
+
+    start = time.perf_counter()
+    client.get('/metrics')
+    print(f'one /metrics scrape: {(time.perf_counter() - start) * 1000:.2f} ms')
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Micro-benchmark of the prediction formatting path in get_predictions.
+
+Compares the original per-element implementation (lambda timestamp
+conversion, strftime and str(price) in a list comprehension, json.dumps)
+with the vectorized helpers in forecast.py for every freq/period
+combination the API accepts.
+
+Usage: python benchmarks/bench_predictions.py [--repeat N]
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import forecast  # noqa: E402
+
+
+FREQS = ['hour', 'day', 'month', 'year']
+PERIODS = [24, 365, 3652]
+
+# The original code used the 'H'/'D'/'M'/'Y' aliases, spelled as offsets here
+LEGACY_OFFSETS = {
+    'hour': pd.offsets.Hour(),
+    'day': pd.offsets.Day(),
+    'month': pd.offsets.MonthEnd(),
+    'year': pd.offsets.YearEnd(),
+}
+
+START = pd.Timestamp('2023-02-19 12:00:00')
+SLOPE, INTERCEPT = 2.5e-5, -30000.0
+
+
+def legacy(period, freq):
+    future_dates = pd.date_range(start=START, periods=period, freq=LEGACY_OFFSETS[freq])
+    future_dates_int = future_dates.map(lambda x: int(x.timestamp()))
+    future_prices = INTERCEPT + SLOPE * future_dates_int.to_numpy()
+    fmt = forecast.DATE_FORMATS[freq]
+    predictions = [{'date': date.strftime(fmt), 'price': str(price)} for date, price in zip(future_dates, future_prices)]
+    return json.dumps(predictions)
+
+
+def vectorized(period, freq):
+    future_dates = forecast.future_dates(START, period, freq)
+    future_prices = INTERCEPT + SLOPE * forecast.epoch_seconds(future_dates)
+    return forecast.encode_predictions(future_dates, future_prices, freq)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'freq':<6} {'period':>6} {'legacy ms':>10} {'vector ms':>10} {'speedup':>8}")
+    for freq in FREQS:
+        for period in PERIODS:
+            try:
+                assert legacy(period, freq) == vectorized(period, freq)
+            except pd.errors.OutOfBoundsDatetime:
+                print(f'{freq:<6} {period:>6} {"skipped: dates out of bounds":>30}')
+                continue
+            old = min(timeit.repeat(lambda: legacy(period, freq), number=1, repeat=args.repeat)) * 1000
+            new = min(timeit.repeat(lambda: vectorized(period, freq), number=1, repeat=args.repeat)) * 1000
+            print(f'{freq:<6} {period:>6} {old:>10.2f} {new:>10.2f} {old / new:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
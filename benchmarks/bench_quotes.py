@@ -0,0 +1,107 @@
+"""
+Upstream requests and join time of quote currencies derived from USD series.
+
+Against the mock server, quotes `coins` coins in every quote currency two ways:
+
+    per quote: a price store per vs_currency, downloading every coin in
+               every currency (N x M downloads)
+    derived:   USD downloads of the coins plus one FX series per quote
+               currency, cross rates computed locally (quotes.py)
+
+and reports the upstream requests and the wall time of each. Also times the
+vectorized as-of join and division of quotes.cross() against pandas
+merge_asof on each tier.
+
+Usage: python benchmarks/bench_quotes.py [--coins 20] [--quotes eur gbp jpy btc eth]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import timeit
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import mockserver  # noqa: E402
+import quotes  # noqa: E402
+import tiers  # noqa: E402
+from pricestore import PriceStore  # noqa: E402
+
+
+def per_quote(url, root, coins, quote_currencies):
+    for quote in quote_currencies:
+        store = PriceStore(root, url, vs_currency=quote)
+        for coin in coins:
+            store.refresh(coin)
+            for tier in tiers.TIERS:
+                store.closes(coin, tier)
+
+
+def derived(url, root, coins, quote_currencies):
+    store = PriceStore(root, url)
+    fx = quotes.FxRates(store)
+    for coin in set(coins) | {quotes.reference_coin(quote) for quote in quote_currencies}:
+        store.refresh(coin)
+    for quote in quote_currencies:
+        if quote in quotes.FIAT_QUOTES:
+            fx.refresh(quote)
+    for quote in quote_currencies:
+        for coin in coins:
+            for tier in tiers.TIERS:
+                fx.quoted(coin, quote, tier)
+    return fx
+
+
+def merge_asof(series, rates, tier):
+    left = pd.DataFrame({'bucket': tiers.bucket_start(series.seconds() * 1000, tier),
+                         'time': series.seconds(), 'price': series.values.astype(np.float64)})
+    right = pd.DataFrame({'bucket': tiers.bucket_start(rates.seconds() * 1000, tier),
+                          'rate': rates.values.astype(np.float64)})
+    joined = pd.merge_asof(left, right, on='bucket').dropna()
+    return joined['time'].to_numpy(), (joined['price'] / joined['rate']).to_numpy()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Quote currency benchmark')
+    parser.add_argument('--coins', type=int, default=20)
+    parser.add_argument('--quotes', nargs='+', default=['eur', 'gbp', 'jpy', 'btc', 'eth'])
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    server = mockserver.start_server(hourly=True)
+    handler = server.RequestHandlerClass
+    coins = [f'coin-{i:02d}' for i in range(args.coins)]
+    print(f'{len(coins)} coins x {len(args.quotes)} quote currencies ({" ".join(args.quotes)})')
+    print(f"{'strategy':<10} {'requests':>9} {'seconds':>8}")
+
+    fx = None
+    for name, run in (('per quote', per_quote), ('derived', derived)):
+        root = tempfile.mkdtemp()
+        try:
+            served = handler.requests_served
+            start = time.perf_counter()
+            fx = run(server.coingecko_url, root, coins, args.quotes) or fx
+            elapsed = time.perf_counter() - start
+            print(f'{name:<10} {handler.requests_served - served:>9} {elapsed:>8.2f}')
+            if name == 'derived':
+                print()
+                print(f"{'tier':<5} {'bars':>6} {'cross us':>9} {'merge_asof us':>14}")
+                for tier in tiers.TIERS:
+                    series = fx.store.closes(coins[0], tier)
+                    rates = fx.rates(args.quotes[0], tier)
+                    cross_us = min(timeit.repeat(lambda: quotes.cross(series, rates, tier),
+                                                 number=1, repeat=args.repeat)) * 1e6
+                    pandas_us = min(timeit.repeat(lambda: merge_asof(series, rates, tier),
+                                                  number=1, repeat=args.repeat)) * 1e6
+                    print(f'{tier:<5} {len(series):>6} {cross_us:>9.0f} {pandas_us:>14.0f}')
+        finally:
+            shutil.rmtree(root)
+
+
+if __name__ == '__main__':
+    main()
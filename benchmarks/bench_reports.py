@@ -0,0 +1,111 @@
+"""
+Time and peak memory of writing prediction reports.
+
+Writes `coins` x `algorithms` sheets of `rows` predictions each, once the
+way main.py used to (a normal openpyxl workbook per coin, filled cell by
+cell) and once per ReportWriter sink into a single multi-sheet report.
+Peak memory is measured with tracemalloc in a second run.
+
+Usage: python benchmarks/bench_reports.py [--coins 50] [--algorithms 2] [--rows 720]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import reports  # noqa: E402
+
+
+ALGORITHMS = ('Linear-Regression', 'ARIMA', 'Holt', 'Log-Linear')
+
+
+def synthetic_sheets(coins, algorithms, rows):
+    start = datetime(2024, 1, 1)
+    dates = [start + timedelta(hours=i + 1) for i in range(rows)]
+    rng = np.random.default_rng(0)
+    for c in range(coins):
+        for algorithm in ALGORITHMS[:algorithms]:
+            prices = 100 * (c + 1) + np.cumsum(rng.normal(0, 1, rows))
+            yield f'COIN{c}', algorithm, dates, prices
+
+
+# One normal workbook per coin, written cell by cell
+def write_cells(directory, sheets):
+    import openpyxl
+
+    for coin, algorithm, dates, prices in sheets:
+        wb = openpyxl.Workbook()
+        ws = wb.active
+        ws.title = 'Price Predictions'
+        ws.cell(1, 1, value='Date')
+        ws.cell(1, 2, value='Price')
+        ws.cell(1, 3, value='Algorithm')
+        ws.cell(2, 3, value=algorithm)
+        for i, (date, price) in enumerate(zip(dates, prices)):
+            ws.cell(i + 2, 1, value=date)
+            ws.cell(i + 2, 2, value=float(price))
+            ws.cell(i + 2, 1).number_format = 'mm/dd/yyyy hh:mm'
+        wb.save(os.path.join(directory, f'{algorithm}-{coin}.xlsx'))
+
+
+def write_report(path, sink, sheets):
+    with reports.ReportWriter(path, sink=sink) as report:
+        for coin, algorithm, dates, prices in sheets:
+            report.add_sheet(f'{coin} {algorithm}', {
+                'Date': dates,
+                'Price': prices,
+                'Algorithm': [algorithm] + [None] * (len(prices) - 1),
+            }, number_formats={'Date': 'mm/dd/yyyy hh:mm'})
+
+
+# Tracing slows allocation down, so time and peak memory come from separate runs
+def measure(write):
+    start = time.perf_counter()
+    write()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    write()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report writer benchmark')
+    parser.add_argument('--coins', type=int, default=50)
+    parser.add_argument('--algorithms', type=int, default=2, choices=range(1, len(ALGORITHMS) + 1))
+    parser.add_argument('--rows', type=int, default=720, help='predictions per sheet')
+    args = parser.parse_args()
+
+    def sheets():
+        return synthetic_sheets(args.coins, args.algorithms, args.rows)
+
+    directory = tempfile.mkdtemp()
+    runs = [('cell-by-cell', lambda: write_cells(directory, sheets()))]
+    for sink, extension in (('openpyxl', '.xlsx'), ('xlsxwriter', '.xlsx'), ('csv', ''), ('parquet', '.parquet')):
+        path = os.path.join(directory, f'report-{sink}{extension}')
+        runs.append((sink, lambda path=path, sink=sink: write_report(path, sink, sheets())))
+
+    print(f'{args.coins} coins x {args.algorithms} algorithms x {args.rows} rows')
+    print(f"{'writer':<14} {'seconds':>8} {'peak MiB':>9}")
+    try:
+        for name, write in runs:
+            try:
+                elapsed, peak = measure(write)
+            except ImportError as e:
+                print(f'{name:<14} skipped ({e.name} not installed)')
+                continue
+            print(f'{name:<14} {elapsed:>8.2f} {peak / 2 ** 20:>9.1f}')
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
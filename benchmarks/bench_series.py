@@ -0,0 +1,106 @@
+"""
+Memory of a coin's price history as a DataFrame and as a CompactSeries.
+
+Builds `years` of hourly prices for `coins` coins (the synthetic series of
+the mock server) and holds all of them at once in each representation:
+
+    dataframe:    the datetime64/float64 frame PriceStore.frame() returns,
+                  which pp.py used to cache per coin
+    compact:      the whole history as a CompactSeries (int32/float32)
+    tier closes:  the hourly, daily and weekly closes the services train on
+
+Memory is the traced allocation of holding every coin. Also reports the
+largest relative price error of float32 and the time to fit a linear
+regression from each representation.
+
+Usage: python benchmarks/bench_series.py [--coins 200] [--years 10]
+"""
+import argparse
+import gc
+import os
+import sys
+import time
+import timeit
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import forecast  # noqa: E402
+import tiers  # noqa: E402
+from linreg import StreamingLinearRegression  # noqa: E402
+from mockserver import HOUR_MS, synthetic_series  # noqa: E402
+from series import CompactSeries  # noqa: E402
+
+
+def as_frame(timestamps, prices):
+    return pd.DataFrame({'timestamp': pd.to_datetime(timestamps, unit='ms'), 'price': prices})
+
+
+def as_tier_closes(timestamps, prices):
+    closes = {}
+    for tier in tiers.TIERS:
+        bars = tiers.recent(tiers.aggregate(timestamps, prices, tier), tier)
+        closes[tier] = CompactSeries.from_arrays(bars['time'], bars['close'])
+    return closes
+
+
+# Traced bytes still allocated after building every coin with `build`
+def held_bytes(histories, build):
+    gc.collect()
+    tracemalloc.start()
+    held = [build(timestamps, prices) for timestamps, prices in histories]
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del held
+    return current
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compact series memory benchmark')
+    parser.add_argument('--coins', type=int, default=200)
+    parser.add_argument('--years', type=float, default=10)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    end_ms = int(time.time() * 1000) // HOUR_MS * HOUR_MS
+    start_ms = end_ms - int(args.years * 365.25 * 24) * HOUR_MS
+    histories = [synthetic_series(f'coin-{i}', start_ms, end_ms, HOUR_MS) for i in range(args.coins)]
+    points = len(histories[0][0])
+
+    print(f'{args.coins} coins x {points} hourly points')
+    print(f"{'representation':<14} {'MB held':>9} {'kB per coin':>12} {'ratio':>7}")
+    builds = (
+        ('dataframe', as_frame),
+        ('compact', CompactSeries.from_arrays),
+        ('tier closes', as_tier_closes),
+    )
+    baseline = None
+    for name, build in builds:
+        held = held_bytes(histories, build)
+        baseline = baseline or held
+        print(f'{name:<14} {held / 1e6:>9.1f} {held / args.coins / 1e3:>12.1f} {baseline / held:>6.1f}x')
+
+    timestamps, prices = histories[0]
+    compact = CompactSeries.from_arrays(timestamps, prices)
+    error = np.max(np.abs(compact.values / prices - 1))
+    print(f'largest relative float32 price error: {error:.1e}')
+
+    frame = as_frame(timestamps, prices)
+
+    def fit_frame():
+        x = forecast.epoch_seconds(frame['timestamp'])
+        return StreamingLinearRegression().fit(x.reshape(-1, 1), frame['price'].to_numpy())
+
+    def fit_compact():
+        return StreamingLinearRegression().fit(compact.offsets, compact.values, origin=compact.base)
+
+    frame_ms = min(timeit.repeat(fit_frame, number=1, repeat=args.repeat)) * 1000
+    compact_ms = min(timeit.repeat(fit_compact, number=1, repeat=args.repeat)) * 1000
+    print(f'fit from dataframe {frame_ms:.3f} ms, from compact views {compact_ms:.3f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Time to first byte and peak memory of the prediction encodings.
+
+Encodes hourly predictions for growing horizons with every encoding in
+forecast.py, whole and streamed in chunks, next to the original list of
+dicts passed through json.dumps:
+
+    first ms: time until the first chunk of the response exists
+    total ms: time to encode the whole response
+    peak kB:  largest traced allocation while encoding, chunks are dropped
+              as soon as they are "sent"
+
+Usage: python benchmarks/bench_streaming.py [--periods 24 365 3652 36520] [--repeat 5]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import forecast  # noqa: E402
+
+
+START = pd.Timestamp('2023-02-19 12:00:00')
+SLOPE, INTERCEPT = 2.5e-5, -30000.0
+
+
+def legacy(dates, prices):
+    fmt = forecast.DATE_FORMATS['hour']
+    yield json.dumps([{'date': date.strftime(fmt), 'price': str(price)} for date, price in zip(pd.DatetimeIndex(dates), prices)])
+
+
+def encoders(orjson_available):
+    modes = [('legacy list of dicts', legacy)]
+    for fmt in forecast.FORMATS:
+        modes.append((f'{fmt}', lambda d, p, fmt=fmt: iter([forecast.encode(d, p, 'hour', fmt)])))
+        modes.append((f'{fmt} streamed', lambda d, p, fmt=fmt: forecast.iter_encoded(d, p, 'hour', fmt)))
+    if orjson_available:
+        modes.append(('columns, no orjson', lambda d, p: _without_orjson(d, p)))
+    return modes
+
+
+def _without_orjson(dates, prices):
+    saved, forecast.orjson = forecast.orjson, None
+    try:
+        yield forecast.encode(dates, prices, 'hour', 'columns')
+    finally:
+        forecast.orjson = saved
+
+
+# Seconds to the first chunk and to the end, and the peak of traced memory
+def measure(encode, dates, prices, repeat):
+    first = total = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chunks = encode(dates, prices)
+        next(chunks)
+        first = min(first, time.perf_counter() - start)
+        for _ in chunks:
+            pass
+        total = min(total, time.perf_counter() - start)
+
+    tracemalloc.start()
+    for _ in encode(dates, prices):
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return first, total, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Streaming encoding benchmark')
+    parser.add_argument('--periods', type=int, nargs='+', default=[24, 365, 3652, 36520])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"orjson {'installed' if forecast.orjson is not None else 'not installed'}")
+    print(f"{'period':>7} {'encoding':<22} {'first ms':>9} {'total ms':>9} {'peak kB':>9}")
+    for period in args.periods:
+        dates = forecast.future_dates(START, period, 'hour')
+        prices = INTERCEPT + SLOPE * forecast.epoch_seconds(dates).astype(np.float64)
+        for name, encode in encoders(forecast.orjson is not None):
+            first, total, peak = measure(encode, dates, prices, args.repeat)
+            print(f'{period:>7} {name:<22} {first * 1000:>9.2f} {total * 1000:>9.2f} {peak / 1000:>9.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,258 @@
+"""
+Regression benchmark suite for the prediction API.
+
+Serves pp.py over HTTP in this process, fed by the mock server (10 years of
+hourly history per coin, --latency seconds per upstream request), and runs
+three load scenarios against /predictions/<freq>/<period>/<crypto> with
+--concurrency clients:
+
+    cold       empty price store and caches: every coin is downloaded,
+               aggregated into tiers and trained by the first requests
+    warm       the same requests again, answered from the prediction cache
+    ttl-storm  every cached prediction and coin expires at the same moment
+               and the clients ask for every key --storm-factor times at once
+
+followed by microbenchmarks of each stage of a prediction: parsing a 10 year
+market_chart response, aggregating a tier, training, generating the dates,
+predicting and formatting.
+
+--output writes the results as JSON. --compare BASELINE prints the change of
+every latency against an earlier run and exits with status 1 when one got
+slower by more than --threshold, so regressions between commits show up.
+
+Usage: python benchmarks/bench_suite.py [--coins 20] [--concurrency 8] [--output results.json] [--compare baseline.json]
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import timeit
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import mockserver  # noqa: E402
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+REQUESTS = [('hour', 24), ('day', 7), ('day', 365), ('month', 12), ('year', 10)]
+
+# Metrics compared with --compare; lower is better for all of them
+COMPARED = ('p50_ms', 'p99_ms', 'us')
+
+
+def percentile_ms(samples, q):
+    return round(float(np.percentile(samples, q)) * 1000, 3) if samples else None
+
+
+# Send every path with `concurrency` clients and summarize the latencies
+def run_load(base_url, paths, concurrency, upstream):
+    def fetch(path):
+        start = time.perf_counter()
+        try:
+            with urllib.request.urlopen(base_url + path, timeout=120) as response:
+                response.read()
+                ok = response.status == 200
+        except OSError:
+            ok = False
+        return time.perf_counter() - start, ok
+
+    served = upstream.requests_served
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(fetch, paths))
+    wall = time.perf_counter() - start
+
+    latencies = [seconds for seconds, ok in results if ok]
+    return {
+        'requests': len(results),
+        'errors': len(results) - len(latencies),
+        'p50_ms': percentile_ms(latencies, 50),
+        'p90_ms': percentile_ms(latencies, 90),
+        'p99_ms': percentile_ms(latencies, 99),
+        'max_ms': percentile_ms(latencies, 100),
+        'throughput_rps': round(len(results) / wall, 1),
+        'upstream_requests': upstream.requests_served - served,
+    }
+
+
+def load_scenarios(args, server):
+    import pp
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    from werkzeug.serving import make_server
+    http_server = make_server('127.0.0.1', 0, pp.app, threaded=True)
+    threading.Thread(target=http_server.serve_forever, daemon=True).start()
+    base_url = f'http://127.0.0.1:{http_server.server_port}'
+
+    # The coin cache runs on a clock the storm can move past its TTL
+    skew = [0.0]
+    pp.coin_cache.clock = lambda: time.monotonic() + skew[0]
+
+    coins = [f'coin-{i:02d}' for i in range(args.coins)]
+    paths = [f'/predictions/{freq}/{period}/{coin}' for coin in coins for freq, period in REQUESTS]
+    random.Random(0).shuffle(paths)
+    upstream = server.RequestHandlerClass
+
+    scenarios = {'cold': run_load(base_url, paths, args.concurrency, upstream)}
+    scenarios['warm'] = run_load(base_url, paths * args.warm_rounds, args.concurrency, upstream)
+
+    # Every prediction expires and every coin turns stale together
+    pp.cache.clear()
+    skew[0] += pp.coin_cache.ttl + 1
+    storm = paths * args.storm_factor
+    random.Random(1).shuffle(storm)
+    served = upstream.requests_served
+    scenarios['ttl-storm'] = run_load(base_url, storm, args.concurrency, upstream)
+    # Background refreshes started by the storm still count towards it
+    deadline = time.monotonic() + 60
+    while any(pp.coin_cache.refreshing(coin) for coin in coins) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    scenarios['ttl-storm']['upstream_requests'] = upstream.requests_served - served
+
+    http_server.shutdown()
+    return scenarios
+
+
+# Best time per call in microseconds, calling often enough to time at least 10 ms
+def best_us(fn, repeat):
+    number = max(1, int(0.01 / max(timeit.timeit(fn, number=1), 1e-7)))
+    return round(min(timeit.repeat(fn, number=number, repeat=repeat)) / number * 1e6, 2)
+
+
+def microbenchmarks(args):
+    import forecast
+    import tiers
+    from ensemble import EnsembleModel
+    from linreg import StreamingLinearRegression
+    from series import CompactSeries
+
+    end_ms = int(time.time() * 1000) // mockserver.HOUR_MS * mockserver.HOUR_MS
+    start_ms = end_ms - int(10 * 365.25 * 24) * mockserver.HOUR_MS
+    timestamps, prices = mockserver.synthetic_series('coin-00', start_ms, end_ms, mockserver.HOUR_MS)
+    body = json.dumps({'prices': np.column_stack([timestamps, prices]).tolist()})
+
+    bars = tiers.aggregate(timestamps, prices, 'day')
+    closes = CompactSeries.from_arrays(bars['time'], bars['close'])
+    model = StreamingLinearRegression().fit(closes.offsets, closes.values, origin=closes.base)
+    start = forecast.watermark_date(closes.end * 1000)
+    dates = forecast.future_dates(start, 3652, 'day')
+    x = forecast.epoch_seconds(dates).reshape(-1, 1)
+    predicted = model.predict(x)
+
+    stages = {
+        'parse market_chart (87k points)': lambda: np.asarray(json.loads(body)['prices'], dtype=np.float64),
+        'aggregate day tier': lambda: tiers.aggregate(timestamps, prices, 'day'),
+        'train linear (day tier)': lambda: StreamingLinearRegression().fit(closes.offsets, closes.values,
+                                                                           origin=closes.base),
+        'train ensemble (day tier)': lambda: EnsembleModel.for_tier('day').fit(closes.offsets, closes.values,
+                                                                               origin=closes.base),
+        'future dates (3652 days)': lambda: forecast.future_dates(start, 3652, 'day'),
+        'predict (3652 days)': lambda: model.predict(x),
+        'format json (3652 days)': lambda: forecast.encode_predictions(dates, predicted, 'day'),
+        'format columns (3652 days)': lambda: forecast.encode(dates, predicted, 'day', 'columns'),
+    }
+    return {name: {'us': best_us(fn, args.repeat)} for name, fn in stages.items()}
+
+
+def metadata(args):
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'options': vars(args),
+    }
+
+
+# Print every compared metric next to the baseline; returns the regressed ones
+def compare(results, baseline, threshold):
+    regressions = []
+    print()
+    print(f"{'benchmark':<34} {'metric':<7} {'baseline':>10} {'current':>10} {'change':>8}")
+    for section in ('scenarios', 'micro'):
+        for name, metrics in results[section].items():
+            before = baseline.get(section, {}).get(name, {})
+            for metric in COMPARED:
+                if metrics.get(metric) is None or before.get(metric) in (None, 0):
+                    continue
+                change = metrics[metric] / before[metric] - 1
+                regressed = change > threshold
+                if regressed:
+                    regressions.append((name, metric))
+                print(f'{name:<34} {metric:<7} {before[metric]:>10.2f} {metrics[metric]:>10.2f} '
+                      f'{change:>+7.0%}{"  REGRESSION" if regressed else ""}')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prediction API benchmark suite')
+    parser.add_argument('--coins', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.02, help='seconds the mock adds to every upstream request')
+    parser.add_argument('--warm-rounds', type=int, default=3)
+    parser.add_argument('--storm-factor', type=int, default=4, help='concurrent requests per key in the TTL storm')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--recorded', metavar='DIR', help='serve recorded histories (see mockserver.py)')
+    parser.add_argument('--skip-load', action='store_true', help='only run the microbenchmarks')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', metavar='BASELINE', help='JSON results of an earlier run')
+    parser.add_argument('--threshold', type=float, default=0.2, help='slowdown that counts as a regression')
+    args = parser.parse_args()
+
+    server = mockserver.start_server(latency=args.latency, hourly=True, recorded=args.recorded)
+    os.environ['COINGECKO_API_URL'] = server.coingecko_url
+    os.environ['CRYPTOCOMPARE_API_URL'] = server.cryptocompare_url
+    os.environ['PRICE_STORE_DIR'] = tempfile.mkdtemp()
+    os.environ['COIN_LIST_CACHE'] = os.path.join(tempfile.mkdtemp(), 'coin_list.json')
+    os.environ['MATERIALIZE'] = '0'
+    os.environ.setdefault('CACHE_TYPE', 'SimpleCache')
+
+    results = {'meta': metadata(args), 'scenarios': {}, 'micro': {}}
+    if not args.skip_load:
+        results['scenarios'] = load_scenarios(args, server)
+        print(f"{'scenario':<10} {'requests':>8} {'errors':>6} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} "
+              f"{'max ms':>8} {'req/s':>7} {'upstream':>8}")
+        for name, s in results['scenarios'].items():
+            print(f"{name:<10} {s['requests']:>8} {s['errors']:>6} {s['p50_ms']:>8.2f} {s['p90_ms']:>8.2f} "
+                  f"{s['p99_ms']:>8.2f} {s['max_ms']:>8.2f} {s['throughput_rps']:>7.1f} {s['upstream_requests']:>8}")
+        print()
+
+    results['micro'] = microbenchmarks(args)
+    print(f"{'stage':<34} {'us':>10}")
+    for name, m in results['micro'].items():
+        print(f"{name:<34} {m['us']:>10.2f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'\nResults written to {args.output}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print(f'\n{len(regressions)} regressions over {args.threshold:.0%}')
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+"""
+Memory per cached coin and fit time with resolution tiers.
+
+Fills a temporary price store with `years` of hourly prices for one coin
+(the synthetic series of the mock server) and compares what the Flask apps
+used to do, training one model on every raw point and caching the price
+frame with it, with training each freq on its tier (tiers.FREQ_TIERS) and
+caching only the watermark and the models (model state is counted as its
+JSON size). Also times building the tiers from scratch and bringing them up
+to date after an hour of 5 minute points.
+
+Usage: python benchmarks/bench_tiers.py [--years 10] [--repeat 20]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import codec  # noqa: E402
+import forecast  # noqa: E402
+import tiers  # noqa: E402
+from linreg import StreamingLinearRegression  # noqa: E402
+from mockserver import HOUR_MS, synthetic_series  # noqa: E402
+from pricestore import PriceStore  # noqa: E402
+
+
+COIN = 'coin-00'
+
+
+def fit_raw(prices):
+    timestamps = forecast.epoch_seconds(prices['timestamp'])
+    return StreamingLinearRegression().fit(timestamps.reshape(-1, 1), prices['price'].to_numpy())
+
+
+def fit_tier(bars):
+    return StreamingLinearRegression().fit(bars['time'] // 1000, bars['close'])
+
+
+def best_ms(fn, repeat):
+    return min(timeit.repeat(fn, number=1, repeat=repeat)) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Resolution tier benchmark')
+    parser.add_argument('--years', type=float, default=10)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp()
+    try:
+        store = PriceStore(root)
+        end_ms = int(time.time() * 1000) // HOUR_MS * HOUR_MS
+        start_ms = end_ms - int(args.years * 365.25 * 24) * HOUR_MS
+        store.append(COIN, *synthetic_series(COIN, start_ms, end_ms, HOUR_MS))
+
+        def build():
+            _reset_tiers(store)
+            store._update_tiers(COIN)
+
+        build_ms = best_ms(build, args.repeat)
+
+        # One hour of 5 minute points, then bring the tiers up to date
+        step_ms = 5 * 60 * 1000
+        tail = synthetic_series(COIN, end_ms + step_ms, end_ms + HOUR_MS, step_ms)
+        store.append(COIN, *tail)
+        update_start = time.perf_counter()
+        store.bars(COIN, 'day')
+        update_ms = (time.perf_counter() - update_start) * 1000
+
+        prices = store.frame(COIN)
+        bars = {tier: store.bars(COIN, tier) for tier in tiers.TIERS}
+        watermark = int(bars['day']['time'][-1])
+        raw_model = fit_raw(prices)
+        models = {tier: fit_tier(bars[tier]) for tier in tiers.TIERS}
+
+        raw_bytes = int(prices.memory_usage(deep=True).sum()) + len(raw_model.dumps())
+        tier_bytes = sum(len(model.dumps()) for model in models.values()) + 8
+        print(f'{len(prices)} raw points, bars: '
+              + ', '.join(f'{tier} {len(bars[tier])}' for tier in tiers.TIERS))
+        print(f'tier build {build_ms:.2f} ms, update after one hour of points {update_ms:.2f} ms')
+        print()
+        print(f"{'cached coin':<12} {'raw bytes':>12} {'tier bytes':>11} {'ratio':>8}")
+        print(f"{'in memory':<12} {raw_bytes:>12} {tier_bytes:>11} {raw_bytes / tier_bytes:>7.0f}x")
+        # The raw frame was shared as its int64 timestamp and float64 price buffers
+        shared_raw = 8 * len(prices) + prices['price'].to_numpy().nbytes + len(raw_model.dumps())
+        shared_tier = len(codec.encode_coin(watermark, models))
+        print(f"{'shared cache':<12} {shared_raw:>12} {shared_tier:>11} {shared_raw / shared_tier:>7.0f}x")
+        print()
+
+        raw_fit = best_ms(lambda: fit_raw(prices), args.repeat)
+        print(f"{'freq':<6} {'tier':<5} {'points':>7} {'raw fit ms':>11} {'tier fit ms':>12} {'speedup':>8}")
+        for freq, tier in tiers.FREQ_TIERS.items():
+            tier_fit = best_ms(lambda: fit_tier(bars[tier]), args.repeat)
+            print(f'{freq:<6} {tier:<5} {len(bars[tier]):>7} {raw_fit:>11.3f} {tier_fit:>12.3f} {raw_fit / tier_fit:>7.0f}x')
+    finally:
+        shutil.rmtree(root)
+
+
+# Delete the stored tiers so the next update builds them from scratch
+def _reset_tiers(store):
+    for tier in tiers.TIERS:
+        path = store._tier_path(COIN, tier)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
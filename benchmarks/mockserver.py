@@ -0,0 +1,217 @@
+"""
+Local mock of the CoinGecko and CryptoCompare endpoints the tools use.
+
+Every coin id gets a deterministic synthetic price series, so
+benchmarks are repeatable and never touch the real API or its rate limits.
+The full history is served at daily resolution like CoinGecko does for
+ranges over 90 days, or hourly with --hourly. /coins/list lists
+coin-00 ... coin-11999. Prices in another vs_currency than usd are
+divided by a synthetic FX rate (usd_per_unit).
+
+CryptoCompare's /data/v2/histohour and /data/top/mktcapfull are served from
+the same series, keyed by the lowercased symbol.
+
+With --recorded DIR, a coin with a DIR/<coin>.json file in CoinGecko's
+market_chart form ({"prices": [[ms, price], ...]}) is served from that
+recording instead; --record DIR --coins bitcoin ... downloads recordings
+from the real API (or whatever COINGECKO_API_URL points at).
+
+Usage: python benchmarks/mockserver.py [--port 8001] [--latency 0.05] [--hourly] [--recorded DIR]
+Then point the tools at it with COINGECKO_API_URL=http://127.0.0.1:8001/api/v3
+and CRYPTOCOMPARE_API_URL=http://127.0.0.1:8001
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+
+HOUR_MS = 60 * 60 * 1000
+DAY_MS = 24 * HOUR_MS
+
+FX_LEVELS = {'eur': 1.08, 'gbp': 1.27, 'jpy': 0.0067, 'chf': 1.12}
+
+# /coins/list serves coin-00 ... coin-11999, about the size of CoinGecko's list
+LISTED_COINS = 12000
+
+
+# Deterministic synthetic price series for a coin, one point per `step_ms`.
+# Prices are a closed-form function of the absolute hour, so overlapping
+# ranges and different resolutions always agree with each other.
+def synthetic_series(coin, start_ms, end_ms, step_ms):
+    first = (start_ms + step_ms - 1) // step_ms * step_ms
+    timestamps = np.arange(first, end_ms + 1, step_ms, dtype=np.int64)
+
+    rng = np.random.default_rng(zlib.crc32(coin.encode()))
+    base = 10 ** rng.uniform(-2, 4.5)
+    drift, phase = rng.normal(0, 2e-6), rng.uniform(0, 2 * np.pi)
+    hours = (timestamps // HOUR_MS).astype(np.float64)
+    noise = np.sin(hours * 12.9898 + phase) * 43758.5453 % 1.0 - 0.5
+    cycles = 0.3 * np.sin(hours / 2000.0 + phase) + 0.1 * np.sin(hours / 170.0)
+    prices = base * np.exp(drift * (hours - 4.0e5) + cycles + 0.02 * noise)
+    return timestamps, prices
+
+
+# USD price of one unit of a fiat currency, a slow deterministic wave around a fixed level
+def usd_per_unit(currency, timestamps):
+    if currency == 'usd':
+        return np.ones(len(timestamps))
+    level = FX_LEVELS.get(currency, 1.0)
+    phase = zlib.crc32(currency.encode()) % 1000 / 1000 * 2 * np.pi
+    hours = (np.asarray(timestamps) // HOUR_MS).astype(np.float64)
+    return level * (1 + 0.05 * np.sin(hours / 900.0 + phase))
+
+
+def coin_list(n=LISTED_COINS):
+    return [{'id': f'coin-{i:02d}', 'symbol': f'c{i:02d}', 'name': f'Coin {i:02d}'} for i in range(n)]
+
+
+# Recorded market_chart prices of every DIR/<coin>.json, as (timestamps, prices)
+def load_recordings(directory):
+    recordings = {}
+    for name in sorted(os.listdir(directory)):
+        if name.endswith('.json'):
+            with open(os.path.join(directory, name)) as f:
+                points = np.asarray(json.load(f)['prices'], dtype=np.float64).reshape(-1, 2)
+            recordings[name[:-len('.json')].lower()] = (points[:, 0].astype(np.int64), points[:, 1])
+    return recordings
+
+
+# Download the full market_chart history of `coins` into DIR/<coin>.json
+def record(coins, directory, days=3652):
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+    from upstream import COINGECKO_API_URL, client
+
+    os.makedirs(directory, exist_ok=True)
+    for coin in coins:
+        data = client.get_json(f'{COINGECKO_API_URL}/coins/{coin}/market_chart',
+                               params={'vs_currency': 'usd', 'days': days})
+        with open(os.path.join(directory, f'{coin}.json'), 'w') as f:
+            json.dump({'prices': data['prices']}, f)
+        print(f"Recorded {len(data['prices'])} points of {coin}")
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    latency = 0.0
+    hourly = False
+    recordings = {}
+    requests_served = 0
+
+    # Recorded points in the range when the coin was recorded, synthetic ones otherwise
+    def series(self, coin, start_ms, end_ms, step_ms):
+        recording = self.recordings.get(coin.lower())
+        if recording is None:
+            return synthetic_series(coin, start_ms, end_ms, step_ms)
+        timestamps, prices = recording
+        first, last = np.searchsorted(timestamps, [start_ms, end_ms + 1])
+        return timestamps[first:last], prices[first:last]
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        parts = [p for p in url.path.split('/') if p]
+        type(self).requests_served += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        if parts == ['api', 'v3', 'coins', 'list']:
+            return self._send_json(coin_list())
+
+        # /api/v3/coins/<id>/market_chart[/range]
+        if len(parts) >= 5 and parts[:3] == ['api', 'v3', 'coins'] and parts[4] == 'market_chart':
+            now_ms = int(time.time() * 1000)
+            if len(parts) == 6 and parts[5] == 'range':
+                start_ms = int(query['from']) * 1000
+                end_ms = min(int(query['to']) * 1000, now_ms)
+                step_ms = HOUR_MS
+            else:
+                start_ms = now_ms - int(query.get('days', 1)) * DAY_MS
+                end_ms = now_ms
+                step_ms = HOUR_MS if self.hourly else DAY_MS
+            timestamps, prices = self.series(parts[3], start_ms, end_ms, step_ms)
+            prices = prices / usd_per_unit(query.get('vs_currency', 'usd'), timestamps)
+            return self._send_json({'prices': np.column_stack([timestamps, prices]).tolist()})
+
+        # CryptoCompare: the last `limit` hours plus the current one
+        if parts == ['data', 'v2', 'histohour']:
+            step_ms = int(query.get('aggregate', 1)) * HOUR_MS
+            end_ms = int(time.time() * 1000) // step_ms * step_ms
+            start_ms = end_ms - int(query.get('limit', 168)) * step_ms
+            timestamps, closes = self.series(query['fsym'].lower(), start_ms, end_ms, step_ms)
+            closes = closes / usd_per_unit(query.get('tsym', 'USD').lower(), timestamps)
+            opens = np.r_[closes[:1], closes[:-1]]
+            rows = [{'time': int(t // 1000), 'open': o, 'high': max(o, c), 'low': min(o, c), 'close': c,
+                     'volumefrom': 1000.0, 'volumeto': 1000.0 * c}
+                    for t, o, c in zip(timestamps.tolist(), opens.tolist(), closes.tolist())]
+            data = {'Aggregated': False, 'TimeFrom': rows[0]['time'] if rows else None,
+                    'TimeTo': rows[-1]['time'] if rows else None, 'Data': rows}
+            return self._send_json({'Response': 'Success', 'Message': '', 'Data': data})
+
+        if parts == ['data', 'top', 'mktcapfull']:
+            limit = int(query.get('limit', 10))
+            coins = [{'CoinInfo': {'Name': c['symbol'].upper(), 'FullName': c['name']}} for c in coin_list(limit)]
+            return self._send_json({'Message': 'Success', 'Data': coins})
+
+        self._send_json({'error': 'Not found'}, status=404)
+
+    # history.py asks for histohour with a POST
+    do_POST = do_GET
+
+    def _send_json(self, data, status=200):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+# Start the mock server in a background thread; port 0 picks a free port
+def start_server(port=0, latency=0.0, hourly=False, recorded=None):
+    recordings = load_recordings(recorded) if recorded else {}
+    handler = type('Handler', (MockHandler,), {'latency': latency, 'hourly': hourly, 'recordings': recordings})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    server.base_url = f'http://127.0.0.1:{server.server_port}'
+    server.coingecko_url = server.base_url + '/api/v3'
+    server.cryptocompare_url = server.base_url
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mock CoinGecko server')
+    parser.add_argument('--port', type=int, default=8001)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--hourly', action='store_true', help='serve the full history at hourly resolution')
+    parser.add_argument('--recorded', metavar='DIR', help='serve the coins recorded in DIR/<coin>.json')
+    parser.add_argument('--record', metavar='DIR', help='record the history of --coins into DIR and exit')
+    parser.add_argument('--coins', nargs='+', default=['bitcoin', 'ethereum'], help='coins to --record')
+    args = parser.parse_args()
+
+    if args.record:
+        record(args.coins, args.record)
+        return
+
+    server = start_server(args.port, args.latency, args.hourly, args.recorded)
+    print(f'Mock CoinGecko API at {server.coingecko_url}')
+    print(f'Mock CryptoCompare API at {server.cryptocompare_url}')
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,294 @@
+"""
+Pluggable backend for the Flask services' cache.
+
+The backend is chosen with environment variables, so several Gunicorn
+workers can share one cache instead of each fetching and training on its own:
+
+    CACHE_TYPE=SimpleCache      per-process memory (default)
+    CACHE_TYPE=FileSystemCache  shared directory, set CACHE_DIR
+    CACHE_TYPE=RedisCache       Redis-compatible server, set CACHE_REDIS_URL
+    CACHE_TYPE=fakeredis        in-process fakeredis server, for tests
+
+TrackedCache records hits, misses and evictions and keeps a metadata index
+(value type and hit count per key) so entries can be listed without
+deserializing them.
+cache_stats() reports the hit rate with the memory of the current worker so
+backends can be compared.
+"""
+import os
+import struct
+import sys
+import threading
+import time
+
+from flask_caching import Cache
+
+
+def cache_config():
+    cache_type = os.environ.get('CACHE_TYPE', 'SimpleCache')
+    if cache_type == 'fakeredis':
+        cache_type = 'cachebackend.fakeredis_cache'
+    config = {'CACHE_TYPE': cache_type}
+    if 'Redis' in cache_type or cache_type.endswith('fakeredis_cache'):
+        # Keep our keys apart from anything else living on the same server
+        config['CACHE_KEY_PREFIX'] = os.environ.get('CACHE_KEY_PREFIX', 'pp:')
+    if 'CACHE_DIR' in os.environ or cache_type == 'FileSystemCache':
+        config['CACHE_DIR'] = os.environ.get('CACHE_DIR', 'cache')
+    if 'CACHE_REDIS_URL' in os.environ:
+        config['CACHE_REDIS_URL'] = os.environ['CACHE_REDIS_URL']
+    return config
+
+
+# One fakeredis server per process, so every cache set up in it shares the entries
+# like workers sharing a Redis server do
+_fakeredis_server = None
+
+
+# flask_caching factory for a RedisCache backed by fakeredis
+def fakeredis_cache(app, config, args, kwargs):
+    global _fakeredis_server
+    import fakeredis
+    from flask_caching.backends import RedisCache
+
+    if _fakeredis_server is None:
+        _fakeredis_server = fakeredis.FakeServer()
+    kwargs.update(key_prefix=config.get('CACHE_KEY_PREFIX'))
+    return RedisCache(fakeredis.FakeStrictRedis(server=_fakeredis_server), *args, **kwargs)
+
+
+class TrackedCache(Cache):
+    """flask_caching Cache that keeps a metadata index of its entries.
+
+    The index records the type of every value when it is set and counts hits
+    per key, so the cache can be listed without deserializing any value.
+    Cache-wide hits, misses and SimpleCache evictions are counted as well.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._index = None
+        super().__init__(*args, **kwargs)
+
+    @property
+    def index(self):
+        if self._index is None:
+            self._index = make_index(self.cache)
+        return self._index
+
+    def get(self, key, *args, **kwargs):
+        value = super().get(key, *args, **kwargs)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.index.record_hit(key)
+        return value
+
+    def set(self, key, value, *args, **kwargs):
+        # SimpleCache prunes silently on set, so count what disappeared; other
+        # backends evict on their own server and report it there
+        entries = getattr(self.cache, '_cache', None)
+        if entries is not None:
+            expected = len(entries) + (key not in entries)
+        result = super().set(key, value, *args, **kwargs)
+        if entries is not None:
+            self.evictions += max(0, expected - len(entries))
+        self.index.record_set(key, type(value).__name__)
+        return result
+
+    def delete(self, key, *args, **kwargs):
+        self.index.forget(key)
+        return super().delete(key, *args, **kwargs)
+
+    def clear(self):
+        self.index.clear()
+        return super().clear()
+
+    # Sorted keys of the live entries starting with `prefix`
+    def keys(self, prefix=''):
+        live = _backend_keys(self.cache, self.index)
+        if hasattr(self.cache, '_cache'):
+            # Entries expired or pruned by SimpleCache never pass through delete()
+            self.index.retain(live)
+        return sorted(key for key in live if key.startswith(prefix))
+
+    # Metadata of the given keys, read without deserializing their values
+    def describe(self, keys):
+        sizes, ttls = _backend_sizes(self.cache, keys)
+        types, hits = self.index.lookup(keys)
+        return [
+            {'key': key, 'size_bytes': size, 'ttl_remaining': ttl, 'hits': hit_count, 'type': type_name}
+            for key, size, ttl, type_name, hit_count in zip(keys, sizes, ttls, types, hits)
+            if size is not None
+        ]
+
+
+class LocalIndex:
+    # Metadata kept in the memory of this process
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._types = {}
+        self._hits = {}
+
+    def record_set(self, key, type_name):
+        with self._lock:
+            self._types[key] = type_name
+            self._hits[key] = 0
+
+    def record_hit(self, key):
+        with self._lock:
+            self._hits[key] = self._hits.get(key, 0) + 1
+
+    def forget(self, key):
+        with self._lock:
+            self._types.pop(key, None)
+            self._hits.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._types.clear()
+            self._hits.clear()
+
+    def retain(self, keys):
+        keys = set(keys)
+        with self._lock:
+            for key in [k for k in self._types if k not in keys]:
+                del self._types[key]
+                self._hits.pop(key, None)
+
+    def known_keys(self):
+        with self._lock:
+            return list(self._types)
+
+    def lookup(self, keys):
+        with self._lock:
+            return [self._types.get(k) for k in keys], [self._hits.get(k, 0) for k in keys]
+
+
+class RedisIndex:
+    # Metadata kept in two hashes on the Redis server, shared by every worker
+    def __init__(self, backend):
+        self.client = backend._write_client
+        prefix = backend._get_prefix()
+        self.types_key = f'{prefix}{INDEX_PREFIX}types'
+        self.hits_key = f'{prefix}{INDEX_PREFIX}hits'
+
+    def record_set(self, key, type_name):
+        pipe = self.client.pipeline()
+        pipe.hset(self.types_key, key, type_name)
+        pipe.hset(self.hits_key, key, 0)
+        pipe.execute()
+
+    def record_hit(self, key):
+        self.client.hincrby(self.hits_key, key, 1)
+
+    def forget(self, key):
+        pipe = self.client.pipeline()
+        pipe.hdel(self.types_key, key)
+        pipe.hdel(self.hits_key, key)
+        pipe.execute()
+
+    def clear(self):
+        self.client.delete(self.types_key, self.hits_key)
+
+    def known_keys(self):
+        return [k.decode() for k in self.client.hkeys(self.types_key)]
+
+    def lookup(self, keys):
+        if not keys:
+            return [], []
+        types = self.client.hmget(self.types_key, keys)
+        hits = self.client.hmget(self.hits_key, keys)
+        return [t.decode() if t is not None else None for t in types], [int(h or 0) for h in hits]
+
+
+# Keys of the index itself on shared servers
+INDEX_PREFIX = '__index__:'
+
+
+def make_index(backend):
+    if hasattr(backend, '_write_client'):
+        return RedisIndex(backend)
+    return LocalIndex()
+
+
+def _backend_keys(backend, index):
+    now = time.time()
+    if hasattr(backend, '_cache'):  # SimpleCache
+        return [key for key, (expires, _) in list(backend._cache.items()) if expires == 0 or expires > now]
+    if hasattr(backend, '_read_client'):  # RedisCache
+        prefix = backend._get_prefix()
+        keys = (raw.decode()[len(prefix):] for raw in backend._read_client.scan_iter(match=f'{prefix}*'))
+        return [key for key in keys if not key.startswith(INDEX_PREFIX)]
+    # FileSystemCache only stores hashed keys, so list the keys this worker wrote
+    return index.known_keys()
+
+
+# Serialized size in bytes and seconds to expiry of each key; size is None for missing keys
+def _backend_sizes(backend, keys):
+    now = time.time()
+    sizes, ttls = [], []
+    if hasattr(backend, '_cache'):  # SimpleCache stores the serialized value
+        for key in keys:
+            expires, raw = backend._cache.get(key, (None, None))
+            live = raw is not None and (expires == 0 or expires > now)
+            sizes.append(len(raw) if live else None)
+            ttls.append(expires - now if live and expires else None)
+
+    elif hasattr(backend, '_read_client'):  # RedisCache
+        prefix = backend._get_prefix()
+        pipe = backend._read_client.pipeline()
+        for key in keys:
+            pipe.strlen(prefix + key)
+            pipe.pttl(prefix + key)
+        results = pipe.execute()
+        for size, pttl in zip(results[::2], results[1::2]):
+            sizes.append(size if pttl != -2 else None)
+            ttls.append(pttl / 1000 if pttl >= 0 else None)
+
+    else:  # FileSystemCache: a 4 byte expiry header followed by the serialized value
+        for key in keys:
+            filename = backend._get_filename(key)
+            try:
+                with open(filename, 'rb') as f:
+                    expires = struct.unpack('I', f.read(4))[0]
+                size = os.path.getsize(filename) - 4
+            except (OSError, struct.error):
+                sizes.append(None)
+                ttls.append(None)
+                continue
+            live = expires == 0 or expires > now
+            sizes.append(size if live else None)
+            ttls.append(expires - now if live and expires else None)
+    return sizes, ttls
+
+
+def cache_stats(cache):
+    lookups = cache.hits + cache.misses
+    return {
+        'backend': type(cache.cache).__name__,
+        'pid': os.getpid(),
+        'rss_bytes': process_memory(),
+        'hits': cache.hits,
+        'misses': cache.misses,
+        'evictions': cache.evictions,
+        'hit_rate': cache.hits / lookups if lookups else None,
+    }
+
+
+# Resident memory of this worker in bytes, or None where it cannot be measured
+def process_memory():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Peak rather than current RSS: kilobytes on Linux, bytes on macOS
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return usage if sys.platform == 'darwin' else usage * 1024
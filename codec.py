@@ -0,0 +1,33 @@
+"""
+Compact binary encoding of coins for shared caches.
+
+A coin is stored as its data watermark with one model per resolution tier,
+in the models' own JSON form behind a small header. Nothing here uses
+pickle, so entries written by one worker can be read by any other worker or
+process version.
+"""
+import json
+import struct
+
+from linreg import StreamingLinearRegression
+
+
+COIN_MAGIC = b'PPC2'
+
+_HEADER = struct.Struct('<4sQ')  # magic, payload length
+
+
+# A coin's watermark (milliseconds of its last price point) and its model per tier in one blob
+def encode_coin(watermark, models):
+    state = {'watermark': int(watermark), 'models': {tier: model.to_dict() for tier, model in models.items()}}
+    payload = json.dumps(state).encode()
+    return _HEADER.pack(COIN_MAGIC, len(payload)) + payload
+
+
+def decode_coin(data):
+    magic, n = _HEADER.unpack_from(data)
+    if magic != COIN_MAGIC:
+        raise ValueError('Not an encoded coin')
+    state = json.loads(bytes(data[_HEADER.size:_HEADER.size + n]).decode())
+    models = {tier: StreamingLinearRegression.from_dict(model) for tier, model in state['models'].items()}
+    return state['watermark'], models
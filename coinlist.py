@@ -0,0 +1,200 @@
+"""
+CoinGecko coin list, cached on disk and indexed in memory.
+
+The full `coins/list` (10k+ entries) is downloaded at most once per
+`max_age` and kept in a JSON file, so restarts do not download it again.
+Once it is older than that, the next lookup starts one background refresh
+and keeps answering from the stale list until the new one is in.
+
+Lookups go through an in-memory index: exact id, symbol and name matches are
+dict lookups, and prefix search bisects one sorted list of every lowercased
+id, symbol and name. resolve() turns what a client typed into a coin id in
+microseconds, so unknown coins are rejected before anything is fetched.
+
+Set COIN_LIST_CACHE to change where the list is kept.
+"""
+import bisect
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from upstream import COINGECKO_API_URL, client
+
+
+logger = logging.getLogger(__name__)
+
+COIN_LIST_CACHE = os.environ.get('COIN_LIST_CACHE', 'coin_list.json')
+COIN_LIST_MAX_AGE = 24 * 60 * 60
+
+# Seconds before a failed download is tried again
+RETRY_AFTER = 60
+
+
+class UnknownCoin(ValueError):
+    """A coin id, symbol or name that matches no coin, or more than one."""
+
+    def __init__(self, query, candidates=()):
+        self.query = query
+        self.candidates = list(candidates)
+        if self.candidates:
+            message = f'Ambiguous cryptocurrency {query!r}, use one of the ids {self.candidates}.'
+        else:
+            message = f'Unknown cryptocurrency {query!r}.'
+        super().__init__(message)
+
+
+class CoinIndex:
+    """Immutable index over the id, symbol and name of every coin."""
+
+    def __init__(self, coins):
+        self.coins = sorted(({'id': c['id'], 'symbol': c.get('symbol', ''), 'name': c.get('name', '')}
+                             for c in coins), key=lambda c: c['id'])
+        self.by_id = {}
+        self.by_symbol = {}
+        self.by_name = {}
+        keys = []
+        for position, coin in enumerate(self.coins):
+            self.by_id[coin['id'].lower()] = position
+            self.by_symbol.setdefault(coin['symbol'].lower(), []).append(position)
+            self.by_name.setdefault(coin['name'].lower(), []).append(position)
+            keys += [(coin['id'].lower(), position), (coin['symbol'].lower(), position), (coin['name'].lower(), position)]
+        keys.sort()
+        self._keys = [key for key, _ in keys]
+        self._positions = [position for _, position in keys]
+
+        # Changes whenever the list does, for ETags
+        listing = '\n'.join(f"{c['id']}\t{c['symbol']}\t{c['name']}" for c in self.coins)
+        self.etag = hashlib.sha1(listing.encode()).hexdigest()[:16]
+
+    def __len__(self):
+        return len(self.coins)
+
+    # Coin id for an id, or a symbol or name that names exactly one coin
+    def resolve(self, query):
+        key = query.lower()
+        position = self.by_id.get(key)
+        if position is not None:
+            return self.coins[position]['id']
+        for index in (self.by_symbol, self.by_name):
+            positions = index.get(key)
+            if positions:
+                if len(positions) == 1:
+                    return self.coins[positions[0]]['id']
+                raise UnknownCoin(query, [self.coins[p]['id'] for p in positions])
+        raise UnknownCoin(query)
+
+    # Coins whose id, symbol or name starts with `prefix`, exact matches first
+    def search(self, prefix, limit=20):
+        prefix = prefix.lower()
+        found = {}
+        exact = [self.by_id.get(prefix)] + self.by_symbol.get(prefix, []) + self.by_name.get(prefix, [])
+        for position in exact:
+            if position is not None:
+                found.setdefault(position, None)
+        start, stop = self._span(prefix)
+        i = start
+        while len(found) < limit and i < stop:
+            found.setdefault(self._positions[i], None)
+            i += 1
+        return [self.coins[position] for position in list(found)[:limit]]
+
+    # Number of coins search() finds for `prefix` without a limit
+    def count(self, prefix):
+        start, stop = self._span(prefix.lower())
+        return len(set(self._positions[start:stop]))
+
+    # Range of the sorted keys starting with a lowercased prefix
+    def _span(self, prefix):
+        start = bisect.bisect_left(self._keys, prefix)
+        return start, bisect.bisect_left(self._keys, prefix + '\U0010ffff', start)
+
+
+class CoinList:
+    """The coin list with its disk cache, background refresh and index."""
+
+    def __init__(self, path=COIN_LIST_CACHE, api_url=COINGECKO_API_URL, max_age=COIN_LIST_MAX_AGE,
+                 clock=time.time):
+        self.path = path
+        self.api_url = api_url.rstrip('/')
+        self.max_age = max_age
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._index = None
+        self._fetched_at = None
+        self._refreshing = False
+        self._retry_at = 0.0
+
+    # The current index, loading or downloading the list on first use. None if it is unavailable.
+    def index(self):
+        if self._index is None:
+            if self.clock() < self._retry_at:
+                return None
+            with self._lock:
+                if self._index is None:
+                    self._load()
+                    if self._index is None:
+                        self._retry_at = self.clock() + RETRY_AFTER
+        elif self.clock() - self._fetched_at >= self.max_age:
+            self._refresh_in_background()
+        return self._index
+
+    # Coin id for an id, symbol or name. Without a coin list nothing can be
+    # checked, so the query is passed through and the fetch decides.
+    def resolve(self, query):
+        index = self.index()
+        if index is None:
+            return query
+        return index.resolve(query)
+
+    def search(self, prefix, limit=20):
+        index = self.index()
+        return index.search(prefix, limit) if index is not None else []
+
+    def refresh(self):
+        coins = client.get_json(f'{self.api_url}/coins/list')
+        fetched_at = self.clock()
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'fetched_at': fetched_at, 'coins': coins}, f)
+        os.replace(tmp_path, self.path)
+        self._install(coins, fetched_at)
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                cached = json.load(f)
+            self._install(cached['coins'], cached['fetched_at'])
+        except (OSError, ValueError, KeyError):
+            pass
+        if self._index is None or self.clock() - self._fetched_at >= self.max_age:
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception('Downloading the coin list failed')
+
+    def _install(self, coins, fetched_at):
+        self._index, self._fetched_at = CoinIndex(coins), fetched_at
+
+    def _refresh_in_background(self):
+        with self._lock:
+            if self._refreshing:
+                return
+            self._refreshing = True
+
+        def run():
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception('Refreshing the coin list failed')
+                self._fetched_at = self.clock() - self.max_age + RETRY_AFTER
+            finally:
+                self._refreshing = False
+
+        threading.Thread(target=run, name='coin-list-refresh', daemon=True).start()
+
+
+# Shared coin list used by the Flask apps
+coin_list = CoinList()
@@ -0,0 +1,365 @@
+"""
+Ensemble of cheap forecasters, weighted by their recent error.
+
+Four models are fitted on the same compact arrays (int32 second offsets from
+an origin and float32 prices, see series.py):
+
+    linear      the least squares trend of the services (linreg.py)
+    log-linear  the same regression on log prices, an exponential trend
+    holt        Holt's linear exponential smoothing; every (alpha, beta) of
+                a small grid is run at once, vectorized over the grid
+    arima       ARIMA(p, 1, 0) fitted by conditional least squares, with p
+                picked by AIC; one lstsq per order instead of a maximum
+                likelihood search, so it fits in milliseconds
+
+The last `holdout` points are held back: every model is fitted on the points
+before them and forecasts them, and its weight is the inverse of its mean
+squared error there. The models are then fitted on the whole series.
+
+Predictions are evaluated for the whole horizon at once: each model maps the
+timestamps to values in one vectorized pass and the weighted sum is a single
+matrix product. predict_std() gives the standard deviation of the forecast
+error the same way (see intervals.py): analytic per model, and for the
+ensemble the weighted sum of its models', as their errors largely move
+together.
+"""
+import json
+import math
+
+import numpy as np
+
+from linreg import StreamingLinearRegression
+
+
+MODELS = ('linear', 'log-linear', 'holt', 'arima')
+
+# Points held back to learn the weights, per resolution tier: a week of hours,
+# a month of days and a quarter of weeks
+HOLDOUTS = {'hour': 7 * 24, 'day': 30, 'week': 13}
+
+# Holt's smoothing only remembers the recent past, so it runs over the last
+# HOLT_WINDOW points for every pair of the grid
+HOLT_ALPHAS = (0.1, 0.2, 0.3, 0.5, 0.7, 0.9)
+HOLT_BETAS = (0.01, 0.05, 0.1, 0.2)
+HOLT_WINDOW = 512
+
+ARIMA_MAX_P = 3
+# Steps an ARIMA forecast is iterated for; past them the differences have
+# settled on their mean and the forecast continues as a straight line
+ARIMA_PATH = 256
+
+
+def _as_feature(X):
+    return np.asarray(X, dtype=np.float64).ravel()
+
+
+# Spacing of the points in seconds and the time of the last one
+def _steps(x, origin):
+    step = float(np.median(np.diff(x))) if len(x) > 1 else 1.0
+    return (step if step > 0 else 1.0), float(origin + x[-1])
+
+
+class LogLinearRegression:
+    """Linear regression of log prices on time, predicting exp of the trend."""
+
+    def __init__(self):
+        self.regression = StreamingLinearRegression()
+
+    def fit(self, X, y, origin=0):
+        y = np.asarray(y, dtype=np.float64)
+        if len(y) and y.min() <= 0:
+            raise ValueError('Log-linear trends need positive prices')
+        self.regression.fit(X, np.log(y), origin)
+        return self
+
+    def predict(self, X):
+        return np.exp(self.regression.predict(X))
+
+    # The error of the log price, carried over to the price (delta method)
+    def predict_std(self, X):
+        return self.predict(X) * self.regression.predict_std(X)
+
+    def to_dict(self):
+        return self.regression.to_dict()
+
+    @classmethod
+    def from_dict(cls, state):
+        model = cls()
+        model.regression = StreamingLinearRegression.from_dict(state)
+        return model
+
+
+class HoltSmoothing:
+    """Holt's linear exponential smoothing with alpha and beta picked from a grid."""
+
+    def __init__(self, alphas=HOLT_ALPHAS, betas=HOLT_BETAS, window=HOLT_WINDOW):
+        self.alphas = alphas
+        self.betas = betas
+        self.window = window
+        self.alpha = self.beta = None
+        self.level = self.trend = None
+        self.step = self.last_x = None
+        self.sigma2 = None
+
+    def fit(self, X, y, origin=0):
+        x = _as_feature(X)[-self.window:]
+        y = np.asarray(y, dtype=np.float64).ravel()[-self.window:]
+        if len(y) < 2:
+            raise ValueError('Holt smoothing needs at least two points')
+        self.step, self.last_x = _steps(x, origin)
+
+        alpha, beta = (np.array(grid, dtype=np.float64).ravel() for grid in np.meshgrid(self.alphas, self.betas))
+        level = np.full(alpha.shape, y[0])
+        trend = np.full(alpha.shape, (y[min(4, len(y) - 1)] - y[0]) / min(4, len(y) - 1))
+        sse = np.zeros(alpha.shape)
+        for value in y[1:]:
+            error = value - (level + trend)
+            sse += error * error
+            new_level = level + trend + alpha * error
+            trend = beta * (new_level - level) + (1 - beta) * trend
+            level = new_level
+
+        best = int(np.argmin(sse))
+        self.alpha, self.beta = float(alpha[best]), float(beta[best])
+        self.level, self.trend = float(level[best]), float(trend[best])
+        self.sigma2 = float(sse[best]) / (len(y) - 1)
+        return self
+
+    def predict(self, X):
+        steps = (_as_feature(X) - self.last_x) / self.step
+        return self.level + self.trend * steps
+
+    # h step forecast variance of Holt's method as an ETS(A,A,N) model,
+    # sigma^2 * (1 + (h - 1) * (a^2 + a b h + b^2 h (2h - 1) / 6)), where the
+    # trend's smoothing in error form is b = alpha * beta; 0 at the last point
+    def predict_std(self, X):
+        h = np.maximum((_as_feature(X) - self.last_x) / self.step, 0)
+        a, b = self.alpha, self.alpha * self.beta
+        growth = a * a + a * b * h + b * b * h * (2 * h - 1) / 6
+        return np.sqrt(self.sigma2 * (np.minimum(h, 1) + np.maximum(h - 1, 0) * growth))
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in ('alpha', 'beta', 'level', 'trend', 'step', 'last_x', 'sigma2')}
+
+    @classmethod
+    def from_dict(cls, state):
+        model = cls(alphas=(state['alpha'],), betas=(state['beta'],))
+        for name, value in state.items():
+            setattr(model, name, value)
+        return model
+
+
+class FastArima:
+    """ARIMA(p, 1, 0) fitted by conditional least squares, p picked by AIC."""
+
+    def __init__(self, max_p=ARIMA_MAX_P):
+        self.max_p = max_p
+        self.p = 0
+        self.constant = 0.0
+        self.phi = np.zeros(0)
+        self.recent = np.zeros(0)
+        self.last_y = self.step = self.last_x = None
+        self.sigma2 = 0.0
+
+    def fit(self, X, y, origin=0):
+        x = _as_feature(X)
+        y = np.asarray(y, dtype=np.float64).ravel()
+        diffs = np.diff(y)
+        if len(diffs) < 2 * self.max_p + 2:
+            raise ValueError('Too few points for an ARIMA fit')
+        self.step, self.last_x = _steps(x, origin)
+
+        # Every order is scored on the same rows so their AICs compare
+        target = diffs[self.max_p:]
+        lags = np.column_stack([np.ones(len(target))]
+                               + [diffs[self.max_p - lag:len(diffs) - lag] for lag in range(1, self.max_p + 1)])
+        best_aic = math.inf
+        for p in range(self.max_p + 1):
+            coefficients, *_ = np.linalg.lstsq(lags[:, :p + 1], target, rcond=None)
+            rss = float(np.sum((target - lags[:, :p + 1] @ coefficients) ** 2))
+            aic = len(target) * math.log(max(rss, 1e-300) / len(target)) + 2 * (p + 1)
+            if aic < best_aic and _stationary(coefficients[1:]):
+                best_aic, self.p, self.constant, self.phi = aic, p, float(coefficients[0]), coefficients[1:]
+                self.sigma2 = rss / len(target)
+
+        self.last_y = float(y[-1])
+        self.recent = diffs[::-1][:self.p].copy()
+        return self
+
+    # Mean step of the differences once the lags have settled
+    @property
+    def drift(self):
+        return self.constant / (1 - float(self.phi.sum()))
+
+    # Forecast level 0 ... `steps` steps ahead, 0 being the last observation
+    def path(self, steps):
+        levels = np.empty(steps + 1)
+        levels[0] = level = self.last_y
+        recent = list(self.recent)
+        for k in range(1, steps + 1):
+            diff = self.constant + sum(c * d for c, d in zip(self.phi, recent))
+            recent = [diff] + recent[:-1]
+            level += diff
+            levels[k] = level
+        return levels
+
+    def predict(self, X):
+        steps = np.maximum((_as_feature(X) - self.last_x) / self.step, 0)
+        horizon = min(int(math.ceil(steps.max())) if len(steps) else 0, ARIMA_PATH)
+        levels = self.path(horizon)
+        beyond = np.maximum(steps - horizon, 0)
+        return np.interp(np.minimum(steps, horizon), np.arange(horizon + 1), levels) + beyond * self.drift
+
+    # h step forecast variance sigma^2 * sum of Psi_j^2 for j < h, where Psi_j are the psi
+    # weights of the AR differences summed up for the integration. Past ARIMA_PATH
+    # steps Psi has settled at 1 / (1 - sum phi) and the variance grows linearly.
+    def predict_std(self, X):
+        steps = np.maximum((_as_feature(X) - self.last_x) / self.step, 0)
+        horizon = min(int(math.ceil(steps.max())) if len(steps) else 0, ARIMA_PATH)
+        psi = np.zeros(horizon + 1)
+        psi[0] = 1.0
+        for j in range(1, horizon + 1):
+            psi[j] = sum(c * psi[j - 1 - i] for i, c in enumerate(self.phi[:j]))
+        cumulative = np.cumsum(psi)
+        variance = self.sigma2 * np.r_[0.0, np.cumsum(cumulative[:horizon] ** 2)]
+        settled = self.sigma2 / (1 - float(self.phi.sum())) ** 2
+        beyond = np.maximum(steps - horizon, 0)
+        return np.sqrt(np.interp(np.minimum(steps, horizon), np.arange(horizon + 1), variance) + beyond * settled)
+
+    def to_dict(self):
+        return {
+            'max_p': self.max_p,
+            'constant': self.constant,
+            'sigma2': self.sigma2,
+            'phi': self.phi.tolist(),
+            'recent': self.recent.tolist(),
+            'last_y': self.last_y,
+            'step': self.step,
+            'last_x': self.last_x,
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        model = cls(max_p=state['max_p'])
+        model.phi = np.array(state['phi'], dtype=np.float64)
+        model.recent = np.array(state['recent'], dtype=np.float64)
+        model.p = len(model.phi)
+        for name in ('constant', 'last_y', 'step', 'last_x', 'sigma2'):
+            setattr(model, name, state[name])
+        return model
+
+
+# An AR polynomial is stationary when every root of its companion matrix is inside the unit circle
+def _stationary(phi):
+    if len(phi) == 0:
+        return True
+    companion = np.zeros((len(phi), len(phi)))
+    companion[0] = phi
+    companion[1:, :-1] = np.eye(len(phi) - 1)
+    return bool(np.all(np.abs(np.linalg.eigvals(companion)) < 1))
+
+
+_MODEL_CLASSES = {
+    'linear': StreamingLinearRegression,
+    'log-linear': LogLinearRegression,
+    'holt': HoltSmoothing,
+    'arima': FastArima,
+}
+
+
+class EnsembleModel:
+    """Weighted average of the MODELS, weighted by inverse holdout error.
+
+    holdout: points held back at the end of the series to learn the weights
+    """
+
+    def __init__(self, holdout=24):
+        if holdout < 1:
+            raise ValueError('holdout must be a positive number of points')
+        self.holdout = holdout
+        self.models = {}
+        self.weights = {}
+        self.errors = {}
+
+    # An ensemble holding out the points of HOLDOUTS for a resolution tier
+    @classmethod
+    def for_tier(cls, tier):
+        return cls(holdout=HOLDOUTS[tier])
+
+    def fit(self, X, y, origin=0):
+        x = _as_feature(X)
+        y = np.asarray(y, dtype=np.float64).ravel()
+        holdout = min(self.holdout, len(y) // 4)
+
+        self.errors = {}
+        if holdout > 0:
+            for name, model in self._fit_all(x[:-holdout], y[:-holdout], origin).items():
+                forecast = model.predict(x[-holdout:] + origin)
+                self.errors[name] = float(np.mean((forecast - y[-holdout:]) ** 2))
+
+        self.models = self._fit_all(x, y, origin)
+        if not self.models:
+            raise ValueError('None of the ensemble models could be fitted')
+
+        inverse = {name: 1 / self.errors[name] for name in self.models
+                   if math.isfinite(self.errors.get(name, math.nan)) and self.errors[name] > 0}
+        if len(inverse) < len(self.models):
+            # Without a usable error for every model, fall back to equal weights
+            inverse = {name: 1.0 for name in self.models}
+        total = sum(inverse.values())
+        self.weights = {name: weight / total for name, weight in inverse.items()}
+        return self
+
+    # Fit every model that accepts the series; a model that cannot is left out
+    @staticmethod
+    def _fit_all(x, y, origin):
+        models = {}
+        for name in MODELS:
+            try:
+                models[name] = _MODEL_CLASSES[name]().fit(x, y, origin=origin)
+            except (ValueError, np.linalg.LinAlgError):
+                continue
+        return models
+
+    # Predictions of every model, one row per model
+    def components(self, X):
+        x = _as_feature(X)
+        return {name: model.predict(x) for name, model in self.models.items()}
+
+    def predict(self, X):
+        components = self.components(X)
+        weights = np.array([self.weights[name] for name in components])
+        return weights @ np.vstack(list(components.values()))
+
+    # Weighted sum of the models' error standard deviations
+    def predict_std(self, X):
+        x = _as_feature(X)
+        weights = np.array([self.weights[name] for name in self.models])
+        return weights @ np.vstack([model.predict_std(x) for model in self.models.values()])
+
+    def to_dict(self):
+        return {
+            'holdout': self.holdout,
+            'weights': self.weights,
+            'errors': self.errors,
+            'models': {name: model.to_dict() for name, model in self.models.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        model = cls(holdout=state['holdout'])
+        model.weights = state['weights']
+        model.errors = state['errors']
+        model.models = {name: _MODEL_CLASSES[name].from_dict(s) for name, s in state['models'].items()}
+        return model
+
+    def dumps(self):
+        return json.dumps(self.to_dict())
+
+    @classmethod
+    def loads(cls, text):
+        return cls.from_dict(json.loads(text))
+
+    def __repr__(self):
+        weights = ', '.join(f'{name}={weight:.2f}' for name, weight in self.weights.items())
+        return f'EnsembleModel({weights})'
@@ -0,0 +1,202 @@
+"""
+Vectorized helpers shared by the Flask prediction services.
+
+Timestamps are converted, future dates are generated and predictions are
+formatted and JSON encoded for the whole horizon at once, without a Python
+call per element.
+
+Besides the default JSON array of {"date", "price"} strings, predictions can
+be encoded as NDJSON (one object per line) or in a columnar form with numeric
+prices, {"t": [...], "p": [...]}. iter_encoded() yields any of them in
+chunks of CHUNK_POINTS, so a streamed response never holds the whole payload.
+Numeric prices are encoded with orjson when it is installed.
+
+Every encoder takes the bounds of prediction intervals too, {level: (lower,
+upper)} as intervals.bounds() returns them, and adds them next to the price
+as "lower_<level>" and "upper_<level>".
+
+Dates are plain datetime64 arrays, so the prediction path never imports
+pandas; pandas objects are still accepted wherever dates are passed in.
+"""
+import json
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # Optional, fall back to the json module
+    orjson = None
+
+
+# Hour and day steps are fixed lengths, month and year steps follow the calendar
+_FIXED_STEPS = {
+    'hour': np.timedelta64(1, 'h'),
+    'day': np.timedelta64(1, 'D'),
+}
+_CALENDAR_UNITS = {
+    'month': 'M',
+    'year': 'Y',
+}
+
+DATE_FORMATS = {
+    'hour': '%Y-%m-%d %H:%M:%S',
+    'day': '%Y-%m-%d',
+    'month': '%Y-%m',
+    'year': '%Y',
+}
+
+# numpy renders the same formats as DATE_FORMATS when truncating to these units
+_DATE_UNITS = {
+    'hour': 's',
+    'day': 'D',
+    'month': 'M',
+    'year': 'Y',
+}
+
+
+# Convert datetimes to Unix timestamp integers (seconds) in one pass
+def epoch_seconds(values):
+    if hasattr(values, 'to_numpy'):
+        values = values.to_numpy()
+    # Normalize the unit first: pandas may hand back ns, us or ms resolution
+    return np.asarray(values).astype('datetime64[s]').view('int64')
+
+
+# Datetime of a data watermark in milliseconds since the epoch
+def watermark_date(watermark_ms):
+    return np.datetime64(int(watermark_ms), 'ms')
+
+
+# Generate the dates to predict, starting from the last known timestamp.
+# Month and year dates are period ends keeping the time of day of the start,
+# the same dates pd.date_range produces with the 'M' and 'Y' frequencies.
+def future_dates(start, period, freq):
+    start = np.datetime64(start, 'us')
+    steps = np.arange(period)
+    if freq in _FIXED_STEPS:
+        return start + steps * _FIXED_STEPS[freq]
+
+    unit = _CALENDAR_UNITS[freq]
+    time_of_day = start - start.astype('datetime64[D]')
+    next_periods = start.astype(f'datetime64[{unit}]') + steps + 1
+    period_ends = next_periods.astype('datetime64[D]') - np.timedelta64(1, 'D')
+    return period_ends + time_of_day
+
+
+# Format all dates of the horizon with the format of the requested frequency
+def format_dates(dates, freq):
+    if hasattr(dates, 'to_numpy'):
+        dates = dates.to_numpy()
+    values = np.asarray(dates).astype('datetime64[us]')
+    formatted = np.datetime_as_string(values, unit=_DATE_UNITS[freq])
+    if freq == 'hour':
+        formatted = np.char.replace(formatted, 'T', ' ')
+    return formatted
+
+
+# Names of the fields of the bounds of every level, ('lower_80', 'upper_80') for 80
+def bound_names(level):
+    return f'lower_{level:g}', f'upper_{level:g}'
+
+
+# The {"date", "price"} JSON objects of the horizon, one string each
+def _items(dates, prices, freq, bounds=None):
+    date_strings = format_dates(dates, freq)
+    price_strings = np.asarray(prices, dtype=np.float64).astype(str)
+    if bounds:
+        # With more columns one template per row beats growing every string column by column
+        names, columns = ['date', 'price'], [date_strings.tolist(), price_strings.tolist()]
+        for level, values in bounds.items():
+            for name, bound in zip(bound_names(level), values):
+                names.append(name)
+                columns.append(np.asarray(bound, dtype=np.float64).astype(str).tolist())
+        template = '{{' + ', '.join(f'"{name}": "{{}}"' for name in names) + '}}'
+        return [template.format(*row) for row in zip(*columns)]
+    items = np.char.add(np.char.add('{"date": "', date_strings), '", "price": "')
+    return np.char.add(np.char.add(items, price_strings), '"}').tolist()
+
+
+# The bounds of the points start:stop
+def _slice(bounds, start, stop):
+    return {level: (lower[start:stop], upper[start:stop]) for level, (lower, upper) in (bounds or {}).items()}
+
+
+# Encode predictions as the JSON list of {"date", "price"} objects the API returns.
+# Prices keep the str(price) representation, which is what astype(str) produces.
+def encode_predictions(dates, prices, freq, bounds=None):
+    return '[' + ', '.join(_items(dates, prices, freq, bounds)) + ']'
+
+
+FORMATS = ('json', 'ndjson', 'columns')
+
+MIMETYPES = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+    'columns': 'application/json',
+}
+
+# Points encoded per chunk of a streamed response
+CHUNK_POINTS = 1024
+
+
+# Comma separated JSON numbers, without the brackets. Non-finite values are written as null,
+# which is what orjson does, and the fallback uses its compact separators as well.
+def _numbers(prices):
+    prices = np.asarray(prices, dtype=np.float64)
+    if orjson is not None:
+        return orjson.dumps(prices, option=orjson.OPT_SERIALIZE_NUMPY)[1:-1].decode()
+    values = np.where(np.isfinite(prices), prices, None).tolist()
+    return json.dumps(values, separators=(',', ':'))[1:-1]
+
+
+# The numeric columns of the columnar form: "p" and the bounds of every level
+def _columns(prices, bounds):
+    columns = [('p', prices)]
+    for level, values in (bounds or {}).items():
+        columns += zip(bound_names(level), values)
+    return columns
+
+
+# Encode the whole horizon in one of FORMATS
+def encode(dates, prices, freq, fmt='json', bounds=None):
+    if fmt == 'json':
+        return encode_predictions(dates, prices, freq, bounds)
+    if fmt == 'ndjson':
+        return '\n'.join(_items(dates, prices, freq, bounds)) + '\n'
+    if fmt == 'columns':
+        date_strings = format_dates(dates, freq).tolist()
+        return ('{"t": ' + json.dumps(date_strings)
+                + ''.join(f', "{name}": [' + _numbers(values) + ']' for name, values in _columns(prices, bounds)) + '}')
+    raise ValueError(f'Unknown format: {fmt!r}')
+
+
+# Yield the encoding of the horizon in chunks of `chunk` points; joined they equal encode()
+def iter_encoded(dates, prices, freq, fmt='json', chunk=CHUNK_POINTS, bounds=None):
+    if fmt not in FORMATS:
+        raise ValueError(f'Unknown format: {fmt!r}')
+    starts = range(0, len(dates), chunk)
+
+    if fmt == 'json':
+        yield '['
+        for start in starts:
+            items = ', '.join(_items(dates[start:start + chunk], prices[start:start + chunk], freq,
+                                     _slice(bounds, start, start + chunk)))
+            yield items if start == 0 else ', ' + items
+        yield ']'
+
+    elif fmt == 'ndjson':
+        for start in starts:
+            yield '\n'.join(_items(dates[start:start + chunk], prices[start:start + chunk], freq,
+                                   _slice(bounds, start, start + chunk))) + '\n'
+
+    else:
+        yield '{"t": ['
+        for start in starts:
+            date_strings = format_dates(dates[start:start + chunk], freq).tolist()
+            yield json.dumps(date_strings)[1:-1] if start == 0 else ', ' + json.dumps(date_strings)[1:-1]
+        for name, values in _columns(prices, bounds):
+            yield f'], "{name}": ['
+            for start in starts:
+                numbers = _numbers(values[start:start + chunk])
+                yield numbers if start == 0 else ',' + numbers
+        yield ']}'
@@ -0,0 +1,388 @@
+"""
+Prices ingested from a streaming tick feed between data refreshes.
+
+Without a feed the services only see new prices once a coin's hourly TTL
+expires and the tail is downloaded again. An IngestWorker consumes a tick
+source in a background thread instead:
+
+    WebSocketSource  a live feed sending {"<coin id>": "<price>", ...}
+                     messages, the format of CoinCap's prices stream
+    ReplaySource     a recorded tick file, one JSON object per line, the
+                     stand-in for the live feed in tests and benchmarks
+
+Ticks are aggregated into bars of `interval` seconds by a BarAggregator,
+which holds one open bar per coin in a preallocated array, so memory stays
+the same however many ticks arrive. Every closed bar is handed to `apply`
+as the points of its open, high, low and close ticks; the services first
+refresh the coin from upstream when its stored history ends more than
+BACKFILL_GAP before the bar (the full history when nothing is stored yet),
+then append the points to the price store, bring the coin's models forward by the bars that
+changed, and only replace cached predictions whose prices moved by more
+than THRESHOLD (forecast_moved()).
+
+The worker uses the feed's own timestamps as its clock, so a recording
+replays the same way at any speed. run() consumes a source in the calling
+thread, for tests and benchmarks.
+"""
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+
+logger = logging.getLogger(__name__)
+
+INGEST_URL = os.environ.get('INGEST_URL', 'wss://ws.coincap.io/prices')
+
+# Relative price change that makes a cached prediction be replaced
+THRESHOLD = float(os.environ.get('INGEST_THRESHOLD', '0.005'))
+
+# Seconds per bar
+INTERVAL = 60
+
+# Upstream has no points closer than 5 minutes, so a shorter gap between the stored
+# history and the next bar has nothing to backfill it with
+BACKFILL_GAP = 5 * 60
+
+# A prediction moves on to a new horizon when its first date enters another period
+PERIOD_UNITS = {
+    'hour': 'h',
+    'day': 'D',
+    'month': 'M',
+    'year': 'Y',
+}
+
+_SLOT_DTYPE = np.dtype([
+    ('bucket', '<i8'),  # start of the open bar in ms, -1 when the coin has no open bar
+    ('open_time', '<i8'),
+    ('open', '<f8'),
+    ('high_time', '<i8'),
+    ('high', '<f8'),
+    ('low_time', '<i8'),
+    ('low', '<f8'),
+    ('close_time', '<i8'),  # kept after the bar closes, older ticks are dropped
+    ('close', '<f8'),
+])
+
+
+class ReplaySource:
+    """Ticks read back from a file of {"coin", "time", "price"} lines.
+
+    speed: 0 replays as fast as the worker takes the ticks, 1 in real time,
+           60 a minute of ticks per second
+    """
+
+    def __init__(self, path, speed=0, sleep=time.sleep):
+        self.path = path
+        self.speed = speed
+        self.sleep = sleep
+
+    def __iter__(self):
+        previous = None
+        with open(self.path) as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                tick = json.loads(line)
+                time_ms = int(tick['time'])
+                if self.speed and previous is not None and time_ms > previous:
+                    self.sleep((time_ms - previous) / 1000 / self.speed)
+                previous = time_ms
+                yield tick['coin'], time_ms, float(tick['price'])
+
+
+# Write (coin, time_ms, price) ticks in the format ReplaySource reads
+def write_ticks(path, ticks):
+    with open(path, 'w') as f:
+        for coin, time_ms, price in ticks:
+            f.write(json.dumps({'coin': coin, 'time': int(time_ms), 'price': float(price)}) + '\n')
+
+
+class WebSocketSource:
+    """Live prices from a WebSocket feed of {"<coin id>": "<price>"} messages.
+
+    Ticks are stamped with the time they arrive. When nothing arrived for
+    `idle` seconds a heartbeat (None, now, None) is yielded so open bars
+    still close, and a dropped connection is reopened after a delay that
+    doubles up to a minute. Needs the websocket-client package.
+    """
+
+    def __init__(self, coins, url=INGEST_URL, idle=5.0, clock=time.time):
+        self.coins = list(coins)
+        self.url = url
+        self.idle = idle
+        self.clock = clock
+        self.closed = False
+
+    def __iter__(self):
+        import websocket
+
+        delay = 1.0
+        while not self.closed:
+            try:
+                connection = websocket.create_connection(f'{self.url}?assets={",".join(self.coins)}',
+                                                         timeout=self.idle)
+            except (OSError, websocket.WebSocketException):
+                logger.exception('Connecting to %s failed, retrying in %gs', self.url, delay)
+                time.sleep(delay)
+                delay = min(delay * 2, 60.0)
+                continue
+
+            delay = 1.0
+            try:
+                while not self.closed:
+                    try:
+                        message = connection.recv()
+                    except websocket.WebSocketTimeoutException:
+                        yield None, int(self.clock() * 1000), None
+                        continue
+                    time_ms = int(self.clock() * 1000)
+                    for coin, price in json.loads(message).items():
+                        yield coin, time_ms, float(price)
+            except (OSError, ValueError, websocket.WebSocketException):
+                logger.exception('Tick feed %s dropped, reconnecting', self.url)
+            finally:
+                connection.close()
+
+    def close(self):
+        self.closed = True
+
+
+class BarAggregator:
+    """Bars of the ticks of up to `max_coins` coins, in fixed memory.
+
+    Every coin has one slot holding its open bar. A bar closes when a tick of
+    a later bar arrives or close_due() is called past its end, and is
+    returned as (coin, times, prices): the open, high, low and close ticks at
+    their own times, which aggregate into the same tier bars as every tick
+    would. Ticks older than the last one of their coin, with a price that is
+    not a positive number, or of a coin beyond `max_coins` are dropped.
+    """
+
+    def __init__(self, interval_ms, max_coins=1024):
+        self.interval_ms = int(interval_ms)
+        self.max_coins = max_coins
+        self._slots = np.zeros(max_coins, dtype=_SLOT_DTYPE)
+        self._slots['bucket'] = -1
+        self._coins = [None] * max_coins
+        self._index = {}  # coin -> slot
+        self.next_due = None  # end of the earliest open bar in ms
+        self.dropped = 0
+
+    @property
+    def nbytes(self):
+        return self._slots.nbytes
+
+    # Add one tick; returns the bar it closed, or None
+    def add(self, coin, time_ms, price):
+        if not price > 0 or price == float('inf'):
+            self.dropped += 1
+            return None
+        i = self._slot(coin)
+        if i is None:
+            self.dropped += 1
+            return None
+
+        slot = self._slots[i]
+        bucket = time_ms // self.interval_ms * self.interval_ms
+        open_bar = slot['bucket'] >= 0
+        if time_ms < slot['close_time'] or (not open_bar and time_ms == slot['close_time']):
+            self.dropped += 1
+            return None
+
+        closed = None
+        if open_bar and bucket != slot['bucket']:
+            closed = self._close(i)
+            open_bar = False
+
+        if not open_bar:
+            slot['bucket'] = bucket
+            slot['open_time'] = slot['high_time'] = slot['low_time'] = time_ms
+            slot['open'] = slot['high'] = slot['low'] = price
+            if self.next_due is None or bucket + self.interval_ms < self.next_due:
+                self.next_due = bucket + self.interval_ms
+        elif price > slot['high']:
+            slot['high_time'], slot['high'] = time_ms, price
+        elif price < slot['low']:
+            slot['low_time'], slot['low'] = time_ms, price
+        slot['close_time'], slot['close'] = time_ms, price
+        return closed
+
+    # Close every bar that ended at or before now_ms
+    def close_due(self, now_ms):
+        if self.next_due is None or now_ms < self.next_due:
+            return []
+        buckets = self._slots['bucket']
+        due = np.flatnonzero((buckets >= 0) & (buckets + self.interval_ms <= now_ms))
+        closed = [self._close(i) for i in due]
+        self._update_next_due()
+        return closed
+
+    # Close every open bar, e.g. when the feed ends
+    def close_all(self):
+        closed = [self._close(i) for i in np.flatnonzero(self._slots['bucket'] >= 0)]
+        self.next_due = None
+        return closed
+
+    def _slot(self, coin):
+        i = self._index.get(coin)
+        if i is not None:
+            return i
+        if len(self._index) < self.max_coins:
+            i = len(self._index)
+        else:
+            # Take over the slot of a coin without an open bar
+            free = np.flatnonzero(self._slots['bucket'] < 0)
+            if len(free) == 0:
+                return None
+            i = int(free[0])
+            del self._index[self._coins[i]]
+            self._slots[i]['close_time'] = 0
+        self._index[coin] = i
+        self._coins[i] = coin
+        return i
+
+    def _close(self, i):
+        slot = self._slots[i]
+        times = np.array([slot['open_time'], slot['high_time'], slot['low_time'], slot['close_time']])
+        prices = np.array([slot['open'], slot['high'], slot['low'], slot['close']])
+        order = np.argsort(times, kind='stable')
+        times, prices = times[order], prices[order]
+        # Ticks at the same time keep the later one, the close over the low over the high
+        last = np.r_[times[1:] != times[:-1], True]
+        slot['bucket'] = -1
+        return self._coins[i], times[last], prices[last]
+
+    def _update_next_due(self):
+        buckets = self._slots['bucket']
+        open_buckets = buckets[buckets >= 0]
+        self.next_due = int(open_buckets.min()) + self.interval_ms if len(open_buckets) else None
+
+
+# Whether a prediction moved away from its cached encoding (forecast.encode_predictions):
+# its first date is in another period of `freq`, or a price changed by more than
+# `threshold` relative to the cached one
+def forecast_moved(cached, dates, prices, freq, threshold=THRESHOLD):
+    items = json.loads(cached)
+    if len(items) != len(prices):
+        return True
+    unit = PERIOD_UNITS[freq]
+    first = np.datetime64(items[0]['date'].replace(' ', 'T'))
+    if first.astype(f'datetime64[{unit}]') != np.datetime64(dates[0]).astype(f'datetime64[{unit}]'):
+        return True
+    old = np.array([item['price'] for item in items], dtype=np.float64)
+    change = np.abs(np.asarray(prices, dtype=np.float64) - old) / np.maximum(np.abs(old), 1e-12)
+    return bool(change.max() > threshold)
+
+
+class IngestWorker:
+    """Consume a tick source and apply its bars.
+
+    source:    iterable of (coin, time_ms, price) ticks and (None, time_ms, None) heartbeats
+    apply:     function(coin, times_ms, prices) applying the points of a closed bar,
+               returning the number of cached predictions it replaced and kept
+    interval:  seconds per bar
+    coins:     only ingest these coins (None for every coin of the feed)
+    max_coins: coins with an open bar at the same time
+    """
+
+    def __init__(self, source, apply, interval=INTERVAL, coins=None, max_coins=1024):
+        self.source = source
+        self.apply = apply
+        self.coins = set(coins) if coins is not None else None
+        self.aggregator = BarAggregator(interval * 1000, max_coins)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopping = False
+        self.counters = {'ticks': 0, 'bars': 0, 'failures': 0, 'replaced': 0, 'kept': 0}
+        self.last_tick_ms = None
+        self.apply_seconds = 0.0
+
+    # Consume the source in this thread until it ends (or stop() is called), then close
+    # the open bars. Returns the number of ticks taken.
+    def run(self, max_ticks=None):
+        taken = 0
+        for coin, time_ms, price in self.source:
+            if self._stopping:
+                break
+            if coin is not None and (self.coins is None or coin in self.coins):
+                with self._lock:
+                    self.counters['ticks'] += 1
+                    self.last_tick_ms = time_ms
+                closed = self.aggregator.add(coin, time_ms, price)
+                if closed is not None:
+                    self._apply(*closed)
+                taken += 1
+            for bar in self.aggregator.close_due(time_ms):
+                self._apply(*bar)
+            if max_ticks is not None and taken >= max_ticks:
+                return taken
+        for bar in self.aggregator.close_all():
+            self._apply(*bar)
+        return taken
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping = False
+        self._thread = threading.Thread(target=self.run, name='ingest', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        self._stopping = True
+        if hasattr(self.source, 'close'):
+            self.source.close()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def stats(self):
+        with self._lock:
+            bars = self.counters['bars']
+            return dict(
+                self.counters,
+                dropped=self.aggregator.dropped,
+                last_tick_ms=self.last_tick_ms,
+                apply_mean_seconds=self.apply_seconds / bars if bars else None,
+                aggregator_bytes=self.aggregator.nbytes,
+            )
+
+    def _apply(self, coin, times, prices):
+        start = time.perf_counter()
+        try:
+            replaced, kept = self.apply(coin, times, prices)
+        except Exception:
+            logger.exception('Applying the bar of %r failed', coin)
+            with self._lock:
+                self.counters['failures'] += 1
+            return
+        with self._lock:
+            self.counters['bars'] += 1
+            self.counters['replaced'] += replaced
+            self.counters['kept'] += kept
+            self.apply_seconds += time.perf_counter() - start
+
+
+# Worker set up from the environment, or None when INGEST_SOURCE is not set:
+#
+#   INGEST_SOURCE=ws           the WebSocket feed at INGEST_URL
+#   INGEST_SOURCE=replay:PATH  a recorded tick file, at INGEST_SPEED (0: as fast as possible)
+#   INGEST_COINS=a,b           coins to ingest (required for ws)
+#   INGEST_INTERVAL=60         seconds per bar
+def from_env(apply):
+    spec = os.environ.get('INGEST_SOURCE')
+    if not spec:
+        return None
+    coins = [coin for coin in os.environ.get('INGEST_COINS', '').split(',') if coin] or None
+    if spec == 'ws':
+        if not coins:
+            raise ValueError('INGEST_COINS must name the coins to subscribe to')
+        source = WebSocketSource(coins)
+    elif spec.startswith('replay:'):
+        source = ReplaySource(spec[len('replay:'):], speed=float(os.environ.get('INGEST_SPEED', '0')))
+    else:
+        raise ValueError(f'Unknown INGEST_SOURCE: {spec!r}')
+    return IngestWorker(source, apply, interval=int(os.environ.get('INGEST_INTERVAL', INTERVAL)), coins=coins)
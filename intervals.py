@@ -0,0 +1,64 @@
+"""
+Prediction intervals around the point forecasts.
+
+Every forecaster has predict_std(X), the standard deviation of the error of
+predicting a new price at each X, worked out analytically for the whole
+horizon in one vectorized pass next to predict(X):
+
+    linear      the OLS prediction error from the sufficient statistics of
+                the regression, s * sqrt(1 + 1/n + (x - mean x)^2 / Sxx)
+    arima       the h step forecast variance of ARIMA(p, 1, 0) from its
+                psi weights
+    ensemble    the weighted sum of its models' (ensemble.py)
+
+The bounds of a confidence level are the forecast plus and minus that
+standard deviation times the level's quantile: Student's t with the
+regression's degrees of freedom where the model has them, the normal
+distribution otherwise. Nothing is resampled, so asking for intervals
+costs a few microseconds per level.
+"""
+from statistics import NormalDist
+
+import numpy as np
+
+
+# Confidence levels one request may ask for
+MAX_LEVELS = 4
+
+
+# Parse confidence levels in percent, '95,80' -> (80.0, 95.0)
+def parse_levels(text):
+    if not text:
+        return ()
+    try:
+        levels = sorted({float(part) for part in text.split(',')})
+    except ValueError:
+        levels = None
+    if not levels or len(levels) > MAX_LEVELS or not all(0 < level < 100 for level in levels):
+        raise ValueError(f'Invalid intervals specified: {text!r}. Please use up to {MAX_LEVELS} comma separated '
+                         f'confidence levels between 0 and 100, e.g. 80,95.')
+    return tuple(levels)
+
+
+# The canonical text of levels, the same for any order they were asked in
+def format_levels(levels):
+    return ','.join(f'{level:g}' for level in levels)
+
+
+# Two-sided quantile of a confidence level in percent. With degrees of freedom the
+# normal quantile is corrected towards Student's t (Cornish-Fisher expansion): within
+# 1.5% of it from 10 degrees of freedom on, and the tiers train on hundreds of points.
+def quantile(level, dof=None):
+    z = NormalDist().inv_cdf(0.5 + level / 200)
+    if dof is None or dof <= 0:
+        return z
+    return z + (z ** 3 + z) / (4 * dof) + (5 * z ** 5 + 16 * z ** 3 + 3 * z) / (96 * dof ** 2)
+
+
+# Lower and upper bounds of every level around the predictions, {level: (lower, upper)}
+def bounds(prices, std, levels, dof=None):
+    prices = np.asarray(prices, dtype=np.float64)
+    q = np.array([quantile(level, dof) for level in levels])[:, None]
+    half_widths = q * np.asarray(std, dtype=np.float64)
+    lower, upper = prices - half_widths, prices + half_widths
+    return {level: (lower[i], upper[i]) for i, level in enumerate(levels)}
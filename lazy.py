@@ -0,0 +1,42 @@
+"""
+Modules imported on first use.
+
+lazy_import('pandas') returns a stand-in that imports pandas the first time
+one of its attributes is looked up, so a module can name a heavy dependency
+at the top like any other import while only the code paths that actually
+use it pay for loading it. Lookups after the first go straight to the
+module.
+"""
+import importlib
+import threading
+
+
+class LazyModule:
+    """Stand-in for a module that is imported on the first attribute lookup."""
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._module is None:
+                self._module = importlib.import_module(self._name)
+        return self._module
+
+    # Only called for names the stand-in itself does not have
+    def __getattr__(self, attribute):
+        module = self._module if self._module is not None else self._load()
+        return getattr(module, attribute)
+
+    @property
+    def loaded(self):
+        return self._module is not None
+
+    def __repr__(self):
+        return f"<lazy module {self._name!r} ({'loaded' if self.loaded else 'not loaded'})>"
+
+
+def lazy_import(name):
+    return LazyModule(name)
@@ -0,0 +1,302 @@
+"""
+Closed-form streaming linear regression for a single feature.
+
+The model only keeps the sufficient statistics of the data it has seen
+(total weight, sum of x, y, xy, x^2 and y^2), so adding a new price point is
+O(1) and never requires another pass over the history. Old points can be
+forgotten with an exponential decay factor or a fixed-size sliding window.
+
+It exposes the parts of the scikit-learn LinearRegression interface the
+tools use (fit, predict, coef_, intercept_) and produces the same results
+within floating-point tolerance. Models serialize to JSON so they survive
+restarts.
+"""
+import json
+from collections import deque
+
+import numpy as np
+
+
+class StreamingLinearRegression:
+    """Ordinary least squares of y on one feature x, updated incrementally.
+
+    decay:  multiply the weight of everything seen so far by this factor
+            before each new point (0 < decay <= 1, None to disable)
+    window: only keep the last `window` points (None to keep everything)
+    """
+
+    def __init__(self, decay=None, window=None):
+        if decay is not None and not 0 < decay <= 1:
+            raise ValueError('decay must be in (0, 1]')
+        if window is not None and window < 1:
+            raise ValueError('window must be a positive number of points')
+        if decay is not None and window is not None:
+            raise ValueError('Use either decay or window, not both')
+        self.decay = decay
+        self.window = window
+        self.reset()
+
+    def reset(self):
+        # x is stored relative to the first point seen to keep the sums well conditioned
+        self.shift = None
+        self.weight = 0.0
+        self.sum_x = 0.0
+        self.sum_y = 0.0
+        self.sum_xy = 0.0
+        self.sum_xx = 0.0
+        self.sum_yy = 0.0
+        self.points = deque() if self.window is not None else None
+        self._updates_since_rebuild = 0
+        return self
+
+    # Refit from scratch on a whole series, like LinearRegression.fit
+    def fit(self, X, y, origin=0):
+        self.reset()
+        return self.extend(X, y, origin)
+
+    # Add one point in O(1)
+    def update(self, x, y):
+        x, y = float(x), float(y)
+        if self.shift is None:
+            self.shift = x
+        dx = x - self.shift
+
+        if self.decay is not None:
+            self._scale(self.decay)
+
+        self._add(dx, y, 1.0)
+
+        if self.points is not None:
+            self.points.append((dx, y))
+            if len(self.points) > self.window:
+                old_dx, old_y = self.points.popleft()
+                self._add(old_dx, old_y, -1.0)
+                self._updates_since_rebuild += 1
+                # Subtracting old points slowly accumulates rounding error
+                if self._updates_since_rebuild >= self.window:
+                    self._rebuild_from_window()
+        return self
+
+    # Add many points at once; equivalent to calling update() for each of them.
+    # X may be given relative to `origin`, e.g. int32 offsets from a base time.
+    def extend(self, X, y, origin=0):
+        x = _as_feature(X)
+        y = np.asarray(y, dtype=np.float64).ravel()
+        if len(x) != len(y):
+            raise ValueError(f'X has {len(x)} samples but y has {len(y)}')
+        if len(x) == 0:
+            return self
+
+        if self.shift is None:
+            self.shift = float(origin + x[0])
+        dx = x - (self.shift - origin)
+
+        if self.points is not None:
+            # Only the last `window` points can survive, the rest never need to be added
+            dx, y = dx[-self.window:], y[-self.window:]
+            self.points.extend(zip(dx.tolist(), y.tolist()))
+            while len(self.points) > self.window:
+                self.points.popleft()
+            self._rebuild_from_window()
+            return self
+
+        if self.decay is not None:
+            weights = self.decay ** np.arange(len(dx) - 1, -1, -1, dtype=np.float64)
+            self._scale(self.decay ** len(dx))
+        else:
+            weights = np.ones(len(dx))
+
+        self.weight += float(weights.sum())
+        self.sum_x += float(weights @ dx)
+        self.sum_y += float(weights @ y)
+        self.sum_xy += float(weights @ (dx * y))
+        self.sum_xx += float(weights @ (dx * dx))
+        self.sum_yy += float(weights @ (y * y))
+        return self
+
+    # Take points added before back out, e.g. a bar that was rewritten or left the
+    # training span, in O(1) per point. Only for models without decay or window.
+    def remove(self, X, y, origin=0):
+        if self.decay is not None or self.window is not None:
+            raise ValueError('Points can only be removed from models without decay or window')
+        x = _as_feature(X)
+        y = np.asarray(y, dtype=np.float64).ravel()
+        if len(x) != len(y):
+            raise ValueError(f'X has {len(x)} samples but y has {len(y)}')
+        if len(x) == 0:
+            return self
+        if len(x) > self.weight:
+            raise ValueError(f'Cannot remove {len(x)} points from a model of {self.weight:g}')
+
+        dx = x - (self.shift - origin)
+        self.weight -= float(len(dx))
+        self.sum_x -= float(dx.sum())
+        self.sum_y -= float(y.sum())
+        self.sum_xy -= float(dx @ y)
+        self.sum_xx -= float(dx @ dx)
+        self.sum_yy -= float(y @ y)
+        return self
+
+    @property
+    def n_samples(self):
+        return self.weight
+
+    @property
+    def slope(self):
+        if self.weight == 0:
+            raise ValueError('The model has not been fitted yet')
+        sxx = self.sum_xx - self.sum_x * self.sum_x / self.weight
+        if sxx <= 0:
+            # A single distinct x: LinearRegression also returns a flat line
+            return 0.0
+        sxy = self.sum_xy - self.sum_x * self.sum_y / self.weight
+        return sxy / sxx
+
+    @property
+    def intercept(self):
+        slope = self.slope
+        return self.sum_y / self.weight - slope * (self.sum_x / self.weight + self.shift)
+
+    # scikit-learn compatible attributes
+    @property
+    def coef_(self):
+        return np.array([self.slope])
+
+    @property
+    def intercept_(self):
+        return self.intercept
+
+    def predict(self, X):
+        x = _as_feature(X)
+        slope = self.slope
+        # Evaluate around the shift, not around 0, to avoid cancellation
+        mean_x = self.sum_x / self.weight
+        return self.sum_y / self.weight + slope * (x - self.shift - mean_x)
+
+    # Degrees of freedom of the residuals, for Student's t quantiles
+    @property
+    def dof(self):
+        return self.weight - 2
+
+    # Variance of the residuals around the line, from the sufficient statistics
+    @property
+    def residual_variance(self):
+        if self.weight <= 2:
+            return 0.0
+        syy = self.sum_yy - self.sum_y * self.sum_y / self.weight
+        sxx = self.sum_xx - self.sum_x * self.sum_x / self.weight
+        sxy = self.sum_xy - self.sum_x * self.sum_y / self.weight
+        explained = sxy * sxy / sxx if sxx > 0 else 0.0
+        return max(syy - explained, 0.0) / (self.weight - 2)
+
+    # Standard deviation of the error of predicting a new y at every X,
+    # s * sqrt(1 + 1/n + (x - mean x)^2 / Sxx): the OLS prediction interval
+    # before its quantile (see intervals.py)
+    def predict_std(self, X):
+        if self.weight == 0:
+            raise ValueError('The model has not been fitted yet')
+        x = _as_feature(X)
+        mean_x = self.sum_x / self.weight
+        sxx = self.sum_xx - self.sum_x * mean_x
+        dx = x - self.shift - mean_x
+        leverage = 1 / self.weight + (dx * dx / sxx if sxx > 0 else 0.0)
+        return np.sqrt(self.residual_variance * (1 + leverage))
+
+    def to_dict(self):
+        return {
+            'decay': self.decay,
+            'window': self.window,
+            'shift': self.shift,
+            'weight': self.weight,
+            'sum_x': self.sum_x,
+            'sum_y': self.sum_y,
+            'sum_xy': self.sum_xy,
+            'sum_xx': self.sum_xx,
+            'sum_yy': self.sum_yy,
+            'points': [list(p) for p in self.points] if self.points is not None else None,
+        }
+
+    @classmethod
+    def from_dict(cls, state):
+        model = cls(decay=state['decay'], window=state['window'])
+        for name in ('shift', 'weight', 'sum_x', 'sum_y', 'sum_xy', 'sum_xx', 'sum_yy'):
+            setattr(model, name, state[name])
+        if state['points'] is not None:
+            model.points = deque(tuple(p) for p in state['points'])
+        return model
+
+    def copy(self):
+        return self.from_dict(self.to_dict())
+
+    def dumps(self):
+        return json.dumps(self.to_dict())
+
+    @classmethod
+    def loads(cls, text):
+        return cls.from_dict(json.loads(text))
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            f.write(self.dumps())
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.loads(f.read())
+
+    def _add(self, dx, y, sign):
+        self.weight += sign
+        self.sum_x += sign * dx
+        self.sum_y += sign * y
+        self.sum_xy += sign * dx * y
+        self.sum_xx += sign * dx * dx
+        self.sum_yy += sign * y * y
+
+    def _scale(self, factor):
+        self.weight *= factor
+        self.sum_x *= factor
+        self.sum_y *= factor
+        self.sum_xy *= factor
+        self.sum_xx *= factor
+        self.sum_yy *= factor
+
+    def _rebuild_from_window(self):
+        dx = np.fromiter((p[0] for p in self.points), dtype=np.float64, count=len(self.points))
+        y = np.fromiter((p[1] for p in self.points), dtype=np.float64, count=len(self.points))
+        self.weight = float(len(dx))
+        self.sum_x = float(dx.sum())
+        self.sum_y = float(y.sum())
+        self.sum_xy = float(dx @ y)
+        self.sum_xx = float(dx @ dx)
+        self.sum_yy = float(y @ y)
+        self._updates_since_rebuild = 0
+
+    def __repr__(self):
+        return f'StreamingLinearRegression(decay={self.decay!r}, window={self.window!r})'
+
+
+# Accept the (n_samples, 1) matrices sklearn takes as well as flat sequences
+def _as_feature(X):
+    x = np.asarray(X, dtype=np.float64)
+    if x.ndim == 2:
+        if x.shape[1] != 1:
+            raise ValueError(f'Expected a single feature, got {x.shape[1]}')
+        x = x[:, 0]
+    return x.ravel()
+
+
+# Predict with many models in one vectorized pass: x[i] is evaluated with
+# models[owners[i]]. The slopes of all models are solved together from their
+# stacked sufficient statistics.
+def predict_stacked(models, x, owners):
+    stats = np.array([[m.weight, m.sum_x, m.sum_y, m.sum_xy, m.sum_xx, m.shift] for m in models])
+    weight, sum_x, sum_y, sum_xy, sum_xx, shift = stats.T
+    mean_x = sum_x / weight
+    mean_y = sum_y / weight
+    sxx = sum_xx - sum_x * mean_x
+    sxy = sum_xy - sum_x * mean_y
+    slope = np.divide(sxy, sxx, out=np.zeros_like(sxy), where=sxx > 0)
+
+    owners = np.asarray(owners)
+    x = np.asarray(x, dtype=np.float64)
+    return mean_y[owners] + slope[owners] * (x - shift[owners] - mean_x[owners])
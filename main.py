@@ -8,7 +8,7 @@ This program retrieves historical price data for a selected cryptocurrency,
 uses it to train a machine learning model, and generates price predictions 
 for a specified time period. The predicted prices are saved in an Excel 
 spreadsheet and displayed to the user. The program uses the CryptoCompare 
-API to retrieve historical price data and the scikit-learn library to train 
+API to retrieve historical price data and a closed-form linear regression to train 
 the machine learning model.
 
 This application assumes that the user has a basic understanding of 
@@ -17,251 +17,393 @@ program are not guaranteed to be accurate and should not be relied upon for
 investment decisions.
 
 """
-import requests
-import openpyxl
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta
-from sklearn.linear_model import LinearRegression
+from linreg import StreamingLinearRegression
+from reports import ReportWriter
+from upstream import CRYPTOCOMPARE_API_URL, client
 from colorama import init, Fore, Back
 import os
-import itertools
-from statsmodels.tsa.arima_model import ARIMA
+import algorithms
 
 
-# This code block checks if the 'reports' folder exists and creates it if it doesn't.
-# This is to ensure that the Excel spreadsheet containing the price predictions can be saved to the correct directory.
-if not os.path.exists('reports'):
-    os.mkdir('reports')
-# initialize colorama
-init()
-
 # Define the CryptoCompare API endpoint and parameters
-CRYPTOCOMPARE_API_ENDPOINT = "https://min-api.cryptocompare.com/data/v2/histohour"
-
-# Define the machine learning model to predict cryptocurrency prices
-model = LinearRegression()
-
-# Define the Excel spreadsheet to store the price predictions
-wb = openpyxl.Workbook()
-ws = wb.active
-ws.title = "Price Predictions"
-ws.cell(1, 1, value="Date")
-ws.cell(1, 2, value="Price")
-
-# Set the 'again' flag to False to trigger the initial cryptocurrency selection prompt
-again = False
-
-# Start the main program loop
-while True:
-    ws.delete_rows(2, ws.max_row)
-    
-    # If this isn't the first iteration of the loop, prompt the user to analyze another cryptocurrency
-    if again:
-        print("Do you want to analyze another cryptocurrency? (y/n)")
-        choice = input("> ")
-        if choice.lower() == "n":
-            break
-        
-        # If the user selects something other than 'y' or 'n', prompt them again
-        elif choice.lower() != "y":
-            print("Invalid input. Please enter 'y' or 'n'.")
-            continue
-    
-    # Set the 'again' flag to True to bypass the initial cryptocurrency selection prompt
-    else:
-        again = True
-
-    # Prompt the user to select a cryptocurrency to analyze
-    print("Choose a cryptocurrency to analyze:")
-    
+CRYPTOCOMPARE_API_ENDPOINT = f"{CRYPTOCOMPARE_API_URL}/data/v2/histohour"
+
+# The list of top cryptocurrencies is cached on disk and fetched again once it is a day old
+TOP_COINS_CACHE = os.environ.get("TOP_COINS_CACHE", "top_coins.json")
+TOP_COINS_MAX_AGE = 24 * 60 * 60
+
+# Hours of price history each time period is trained on
+TIME_PERIODS = {
+    "24 hours": 24,
+    "7 days": 168,
+    "12 months": 365,
+}
+
+ALGORITHMS = ("Linear-Regression", "ARIMA")
+
+REPORT_FORMATS = {"xlsx": ".xlsx", "csv": "", "parquet": ".parquet"}
+
+
+# Define function to get the symbols of the top cryptocurrencies by market cap
+def get_top_cryptocurrencies(limit=50, cache_path=TOP_COINS_CACHE, max_age=TOP_COINS_MAX_AGE):
+    try:
+        with open(cache_path) as f:
+            cached = json.load(f)
+        if time.time() - cached["fetched_at"] < max_age and len(cached["coins"]) >= limit:
+            return cached["coins"][:limit]
+    except (OSError, ValueError, KeyError):
+        pass
+
     # Send a request to the CryptoCompare API to get the list of top cryptocurrencies by market cap
-    response = requests.get("https://min-api.cryptocompare.com/data/top/mktcapfull?limit=50&tsym=USD")
-    
+    response = client.get(f"{CRYPTOCOMPARE_API_URL}/data/top/mktcapfull", params={"limit": limit, "tsym": "USD"})
+    response.raise_for_status()
+
     # Extract the names of the top cryptocurrencies from the API response
-    cryptocurrencies = [c["CoinInfo"]["Name"] for c in response.json()["Data"]]
-    
-    # Print the list of cryptocurrencies to the console, with a number for each option
-    for i, c in enumerate(cryptocurrencies):
-        print(f"{i + 1}. {c}")
-    
-    # Prompt the user to select a cryptocurrency from the list
-    choice = int(input("> "))
-    
-    # Define the CryptoCompare API parameters for the selected cryptocurrency and time period
-    selected_cryptocurrency = cryptocurrencies[choice - 1]
-
-    # Prompt the user to select a time period to analyze
-    print("Choose a time period to analyze:")
-    print("1. 24 hours")
-    print("2. 7 days")
-    print("3. 12 months")
-    time_period_choice = int(input("> "))
-
-    # Prompt the user to select an algorithm for price prediction
-    print("Choose an algorithm to use for price prediction:")
-    print("1. Linear Regression")
-    print("2. ARIMA")
-    algorithm_choice = int(input("> "))
-
-    # This function returns a list of combinations of p, d, and q 
-    # values for the ARIMA model to optimize its performance.
-    def get_pdq_values():
-        p = range(0, 6) # Define range of values for p parameter
-        d = range(0, 2) # Define range of values for d parameter
-        q = range(0, 2) # Define range of values for q parameter
-        # Generate all possible combinations of p, d, and q values
-        pdq = [(x[0], x[1], x[2]) for x in list(itertools.product(p, d, q))]
-        return pdq  # Return the list of all combinations
-
-    # set up the pdq values
-    pdq = get_pdq_values()
-    
-
-    # Define the CryptoCompare API parameters for the selected cryptocurrency and time period
-    if time_period_choice == 1:
-        # Define the time period as 24 hours
-        name_time_period_choice = "24 hours"
-        # Set the CryptoCompare API parameters to retrieve the last 24 hours of data, with 1 hour intervals
-        CRYPTOCOMPARE_API_PARAMS = {
-            "fsym": selected_cryptocurrency,
-            "tsym": "USD",
-            "limit": 24,
-            "aggregate": 1
-        }
-        # Set the machine learning model to use linear regression
-        if algorithm_choice == 1:
-            model = LinearRegression()
-        # Set the machine learning model to use ARIMA, with the pdq values defined in the get_pdq_values() function
-        elif algorithm_choice == 2:
-            pdq
-    elif time_period_choice == 2:
-        # Define the time period as 7 days
-        name_time_period_choice = "7 days"
-        # Set the CryptoCompare API parameters to retrieve the last 7 days of data, with 1 hour intervals 
-        CRYPTOCOMPARE_API_PARAMS = {
-            "fsym": selected_cryptocurrency,
-            "tsym": "USD",
-            "limit": 168,
-            "aggregate": 1
-        }
-        # Set the machine learning model to use linear regression
-        if algorithm_choice == 1:
-            model = LinearRegression()
-        # Set the machine learning model to use ARIMA, with the pdq values defined in the get_pdq_values() function
-        elif algorithm_choice == 2:
-            pdq
-    elif time_period_choice == 3:
-        # Define the time period as 12 months
-        name_time_period_choice = "12 months"
-        # Set the CryptoCompare API parameters to retrieve the last 12 months of data, with 1 hour intervals
-        CRYPTOCOMPARE_API_PARAMS = {
-            "fsym": selected_cryptocurrency,
-            "tsym": "USD",
-            "limit": 365,
-            "aggregate": 1
-        }
-        # Set the machine learning model to use linear regression
-        if algorithm_choice == 1:
-            model = LinearRegression()
-        # Set the machine learning model to use ARIMA, with the pdq values defined in the get_pdq_values() function
-        elif algorithm_choice == 2:
-            pdq
-    else:
-        print("Invalid time period choice. Please try again.")
-        continue
-
-    # Get the historical price data for the selected cryptocurrency
-    response = requests.get(CRYPTOCOMPARE_API_ENDPOINT, params=CRYPTOCOMPARE_API_PARAMS)
-    print(response)
-
-    if not response.ok:
-        print("Could not retrieve historical price data. Please try again.")
-        continue
-
-    history_data = response.json()["Data"]["Data"]
+    coins = [c["CoinInfo"]["Name"] for c in response.json()["Data"]]
+
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"coins": coins, "fetched_at": time.time()}, f)
+    os.replace(tmp_path, cache_path)
+    return coins
+
 
+# Define function to fetch the hourly price history of a cryptocurrency
+def fetch_history(coin, hours):
+    params = {"fsym": coin, "tsym": "USD", "limit": hours, "aggregate": 1}
+    response = client.get(CRYPTOCOMPARE_API_ENDPOINT, params=params)
+    response.raise_for_status()
+    data = response.json()
+    if data.get("Response") == "Error":
+        raise ValueError(data.get("Message", "CryptoCompare returned an error"))
+    history_data = data["Data"]["Data"]
     if not history_data:
-        print("Historical price data is empty. Please try again.")
-        continue
+        raise ValueError("Historical price data is empty")
+    return history_data
+
+
+# Define function to create the model of an algorithm. Models come from the plugin table
+# in algorithms.py, so ARIMA's modules are only imported once ARIMA is chosen.
+def make_model(algorithm, coin, time_period, **search_options):
+    if algorithm == "Linear-Regression":
+        return StreamingLinearRegression()
+    # ARIMA searches the pdq values defined in the get_pdq_values() function when no orders are given
+    return algorithms.create("arima", coin=coin, timeframe=time_period, **search_options)
+
+
+# Define function to get the dates to predict for a time period
+def get_prediction_times(time_period, now):
+    if time_period == "24 hours":
+        return [now + timedelta(hours=i+1) for i in range(24)]
+    if time_period == "7 days":
+        return [now + timedelta(days=i+1) for i in range(7)]
+    # Each date is 30 days after the previous date
+    return [now + timedelta(days=30*(i+1)) for i in range(12)]
 
+
+# Define function to train a model on the price history and predict all dates of a time period in one call
+def predict_prices(model, history_data, time_period, now):
     # Prepare the historical price data for machine learning
-    timestamps = [datetime.fromtimestamp(h["time"]).timestamp() * 1000 for h in history_data]
+    timestamps = [[h["time"] * 1000] for h in history_data]
     prices = [h["close"] for h in history_data]
-    timestamps = [[t] for t in timestamps]
-
-    # Train the machine learning model on the historical price data
     model.fit(timestamps, prices)
 
-    # Generate the price predictions for the selected time period
-    if time_period_choice == 1:
-        current_time = datetime.now()
-        for i in range(24):
-            next_time = current_time + timedelta(hours=i+1)
-            next_timestamp = int(next_time.timestamp() * 1000)
-            next_price = model.predict([[next_timestamp]])[0]
-            ws.cell(i+2, 1, value=next_time)
-            ws.cell(i+2, 2, value=next_price)
-            ws.cell(i+2, 1).number_format = "mm/dd/yyyy hh:mm"
-    elif time_period_choice == 2:
-        current_time = datetime.now()
-        for i in range(7):
-            next_time = current_time + timedelta(days=i+1)
-            if next_time - current_time > timedelta(days=7):
+    prediction_times = get_prediction_times(time_period, now)
+    prediction_timestamps = [[int(t.timestamp() * 1000)] for t in prediction_times]
+    return prediction_times, [float(p) for p in model.predict(prediction_timestamps)]
+
+
+# Define function to build the report columns of one prediction
+def report_columns(time_period, algorithm_name, prediction_times, predicted_prices):
+    columns = {
+        "Date": prediction_times,
+        "Price": predicted_prices,
+        "Algorithm": [algorithm_name] + [None] * (len(predicted_prices) - 1),
+    }
+    # The 12 months report lists dates only
+    if time_period == "12 months":
+        columns["Date"] = [t.date() for t in prediction_times]
+        return columns, None
+    return columns, {"Date": "mm/dd/yyyy hh:mm"}
+
+
+def interactive():
+    # This code block checks if the 'reports' folder exists and creates it if it doesn't.
+    # This is to ensure that the Excel spreadsheet containing the price predictions can be saved to the correct directory.
+    if not os.path.exists('reports'):
+        os.mkdir('reports')
+    # initialize colorama
+    init()
+
+    # Define the machine learning model to predict cryptocurrency prices
+    model = StreamingLinearRegression()
+
+    # Set the 'again' flag to False to trigger the initial cryptocurrency selection prompt
+    again = False
+
+    # Start the main program loop
+    while True:
+        # If this isn't the first iteration of the loop, prompt the user to analyze another cryptocurrency
+        if again:
+            print("Do you want to analyze another cryptocurrency? (y/n)")
+            choice = input("> ")
+            if choice.lower() == "n":
                 break
-            next_timestamp = int(next_time.timestamp() * 1000)
-            next_price = model.predict([[next_timestamp]])[0]
-            ws.cell(i+2, 1, value=next_time)
-            ws.cell(i+2, 2, value=next_price)
-            ws.cell(i+2, 1).number_format = "mm/dd/yyyy hh:mm"
-    elif time_period_choice == 3:
-        current_time = datetime.now()
-        for i in range(12):
-            # Calculate the next date, which is 30 days after the previous date
-            next_date_time = current_time + timedelta(days=30*(i+1))
-            next_date = next_date_time.date()
-
-            # Calculate the timestamp for the next date
-            next_timestamp = int(next_date_time.timestamp() * 1000)
-            
-            # Predict the price for the next date using the machine learning model
-            next_price = model.predict([[next_timestamp]])[0]
-            
-            # Write the date and price to the Excel spreadsheet
-            ws.cell(i+2, 1, value=next_date)
-            ws.cell(i+2, 2, value=next_price)
-
-    # Save the Excel spreadsheet
-    from datetime import datetime
-
-    # Get current date and time
+
+            # If the user selects something other than 'y' or 'n', prompt them again
+            elif choice.lower() != "y":
+                print("Invalid input. Please enter 'y' or 'n'.")
+                continue
+
+        # Set the 'again' flag to True to bypass the initial cryptocurrency selection prompt
+        else:
+            again = True
+
+        # Prompt the user to select a cryptocurrency to analyze
+        print("Choose a cryptocurrency to analyze:")
+
+        # Get the list of top cryptocurrencies by market cap, fetched from the CryptoCompare API at most once a day
+        cryptocurrencies = get_top_cryptocurrencies()
+
+        # Print the list of cryptocurrencies to the console, with a number for each option
+        for i, c in enumerate(cryptocurrencies):
+            print(f"{i + 1}. {c}")
+
+        # Prompt the user to select a cryptocurrency from the list
+        choice = int(input("> "))
+
+        # Define the CryptoCompare API parameters for the selected cryptocurrency and time period
+        selected_cryptocurrency = cryptocurrencies[choice - 1]
+
+        # Prompt the user to select a time period to analyze
+        print("Choose a time period to analyze:")
+        print("1. 24 hours")
+        print("2. 7 days")
+        print("3. 12 months")
+        time_period_choice = int(input("> "))
+
+        # Prompt the user to select an algorithm for price prediction
+        print("Choose an algorithm to use for price prediction:")
+        print("1. Linear Regression")
+        print("2. ARIMA")
+        algorithm_choice = int(input("> "))
+
+        # Define the CryptoCompare API parameters for the selected cryptocurrency and time period
+        if time_period_choice == 1:
+            # Define the time period as 24 hours
+            name_time_period_choice = "24 hours"
+            # Set the CryptoCompare API parameters to retrieve the last 24 hours of data, with 1 hour intervals
+            CRYPTOCOMPARE_API_PARAMS = {
+                "fsym": selected_cryptocurrency,
+                "tsym": "USD",
+                "limit": 24,
+                "aggregate": 1
+            }
+            # Set the machine learning model to use linear regression
+            if algorithm_choice == 1:
+                model = StreamingLinearRegression()
+            # Set the machine learning model to use ARIMA, searching the pdq values defined in the get_pdq_values() function
+            elif algorithm_choice == 2:
+                model = make_model("ARIMA", selected_cryptocurrency, name_time_period_choice)
+        elif time_period_choice == 2:
+            # Define the time period as 7 days
+            name_time_period_choice = "7 days"
+            # Set the CryptoCompare API parameters to retrieve the last 7 days of data, with 1 hour intervals 
+            CRYPTOCOMPARE_API_PARAMS = {
+                "fsym": selected_cryptocurrency,
+                "tsym": "USD",
+                "limit": 168,
+                "aggregate": 1
+            }
+            # Set the machine learning model to use linear regression
+            if algorithm_choice == 1:
+                model = StreamingLinearRegression()
+            # Set the machine learning model to use ARIMA, searching the pdq values defined in the get_pdq_values() function
+            elif algorithm_choice == 2:
+                model = make_model("ARIMA", selected_cryptocurrency, name_time_period_choice)
+        elif time_period_choice == 3:
+            # Define the time period as 12 months
+            name_time_period_choice = "12 months"
+            # Set the CryptoCompare API parameters to retrieve the last 12 months of data, with 1 hour intervals
+            CRYPTOCOMPARE_API_PARAMS = {
+                "fsym": selected_cryptocurrency,
+                "tsym": "USD",
+                "limit": 365,
+                "aggregate": 1
+            }
+            # Set the machine learning model to use linear regression
+            if algorithm_choice == 1:
+                model = StreamingLinearRegression()
+            # Set the machine learning model to use ARIMA, searching the pdq values defined in the get_pdq_values() function
+            elif algorithm_choice == 2:
+                model = make_model("ARIMA", selected_cryptocurrency, name_time_period_choice)
+        else:
+            print("Invalid time period choice. Please try again.")
+            continue
+
+        # Get the historical price data for the selected cryptocurrency
+        response = client.get(CRYPTOCOMPARE_API_ENDPOINT, params=CRYPTOCOMPARE_API_PARAMS)
+        print(response)
+
+        if not response.ok:
+            print("Could not retrieve historical price data. Please try again.")
+            continue
+
+        history_data = response.json()["Data"]["Data"]
+
+        if not history_data:
+            print("Historical price data is empty. Please try again.")
+            continue
+
+        # Train the machine learning model on the historical price data and predict the selected time period
+        prediction_times, predicted_prices = predict_prices(model, history_data, name_time_period_choice, datetime.now())
+        algorithm_name = "Linear-Regression" if algorithm_choice == 1 else "ARIMA"
+        columns, number_formats = report_columns(name_time_period_choice, algorithm_name, prediction_times, predicted_prices)
+
+        # Save the Excel spreadsheet
+
+        # Get current date and time
+        now = datetime.now()
+
+        # Convert to string
+        date_time_string = now.strftime("%m%d%Y-%H%M%S")
+
+        report_path = f"reports/{algorithm_name}-{name_time_period_choice.replace(' ','-')}-{selected_cryptocurrency}-{date_time_string}.xlsx"
+        try:
+            with ReportWriter(report_path) as report:
+                report.add_sheet("Price Predictions", columns, number_formats=number_formats)
+            print(f"Saved to: {report_path}")
+        except:
+            print("Error: Could not save price predictions to Excel spreadsheet. Please try again.")
+            exit()
+
+        # Print the results to the console
+        print(f"Price predictions for: {selected_cryptocurrency} ")
+        print(f"Algorithm: {'Linear Regression' if algorithm_choice == 1 else 'ARIMA'}")
+        print(f"Time period: {name_time_period_choice}")
+        print("+" + "-"*27 + "+" + "-"*12 + "+")
+        print("| Date".ljust(27) + " | Price".ljust(14) + "|")
+        print("+" + "-"*27 + "+" + "-"*12 + "+")
+        for date, predicted_price in zip(columns["Date"], predicted_prices):
+            price = f"${predicted_price:.2f}"
+            price_width = len(price)
+            date_width = 25
+            price_column_width = max(10, price_width)
+            date_column_width = max(25, date_width)
+            print(f"| {date.strftime('%m/%d/%Y %I:%M:%S %p').ljust(date_column_width)} | {price.rjust(price_column_width)} |")
+        print("+" + "-"*27 + "+" + "-"*12 + "+")
+
+    print("Thank you for using the cryptocurrency price prediction tool!")
+
+
+# Define function to parse the batch mode arguments
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Predict the prices of many cryptocurrencies without prompts.")
+    parser.add_argument("--coins", nargs="+", metavar="SYMBOL",
+                        help="cryptocurrencies to predict, e.g. BTC ETH (default: the top coins by market cap)")
+    parser.add_argument("--top", type=int, default=50, help="number of top coins to predict when --coins is not given")
+    parser.add_argument("--periods", nargs="+", default=[p.replace(" ", "-") for p in TIME_PERIODS],
+                        choices=[p.replace(" ", "-") for p in TIME_PERIODS])
+    parser.add_argument("--algorithms", nargs="+", default=[a.lower() for a in ALGORITHMS],
+                        choices=[a.lower() for a in ALGORITHMS])
+    parser.add_argument("--output", default="reports", help="directory the report is saved to")
+    parser.add_argument("--format", choices=REPORT_FORMATS, default="xlsx")
+    parser.add_argument("--fetch-workers", type=int, default=8, help="concurrent price history downloads")
+    parser.add_argument("--fit-workers", type=int, default=None, help="processes fitting models (default: one per core)")
+    return parser.parse_args(argv)
+
+
+# Fit one model and predict one time period; runs in the worker processes
+def _predict_job(coin, time_period, algorithm, history_data, now):
+    start = time.perf_counter()
+    # The batch already runs one fit per core, so each ARIMA order search fits its orders in this worker
+    model = make_model(algorithm, coin, time_period, max_workers=1)
+    prediction_times, predicted_prices = predict_prices(model, history_data, time_period, now)
+    return prediction_times, predicted_prices, time.perf_counter() - start
+
+
+# Define function to predict every requested coin, time period and algorithm into one report
+def run_batch(args):
+    started = time.perf_counter()
+    timings = {}
     now = datetime.now()
+    time_periods = [p.replace("-", " ") for p in args.periods]
+    selected_algorithms = [a for a in ALGORITHMS if a.lower() in args.algorithms]
 
-    # Convert to string
-    date_time_string = now.strftime("%m%d%Y-%H%M%S")
+    coins = args.coins or get_top_cryptocurrencies(args.top)
+    timings["coin list"] = time.perf_counter() - started
 
-    try:
-        ws.cell(1, 3, value="Algorithm")
-        ws.cell(2, 3, value="Linear-Regression" if algorithm_choice == 1 else "ARIMA")
-        wb.save(f"reports/{'Linear-Regression' if algorithm_choice == 1 else 'ARIMA'}-{name_time_period_choice.replace(' ','-')}-{selected_cryptocurrency}-{date_time_string}.xlsx")
-        print(f"Saved to: reports/{'Linear-Regression' if algorithm_choice == 1 else 'ARIMA'}-{name_time_period_choice.replace(' ','-')}-{selected_cryptocurrency}-{date_time_string}.xlsx")
-    except:
-        print("Error: Could not save price predictions to Excel spreadsheet. Please try again.")
-        exit()
-
-    # Print the results to the console
-    print(f"Price predictions for: {selected_cryptocurrency} ")
-    print(f"Algorithm: {'Linear Regression' if algorithm_choice == 1 else 'ARIMA'}")
-    print(f"Time period: {name_time_period_choice}")
-    print("+" + "-"*27 + "+" + "-"*12 + "+")
-    print("| Date".ljust(27) + " | Price".ljust(14) + "|")
-    print("+" + "-"*27 + "+" + "-"*12 + "+")
-    for row in ws.iter_rows(min_row=2, max_row=ws.max_row, values_only=True):
-        date = row[0]
-        price = f"${row[1]:.2f}"
-        price_width = len(price)
-        date_width = 25
-        price_column_width = max(10, price_width)
-        date_column_width = max(25, date_width)
-        print(f"| {date.strftime('%m/%d/%Y %I:%M:%S %p').ljust(date_column_width)} | {price.rjust(price_column_width)} |")
-    print("+" + "-"*27 + "+" + "-"*12 + "+")
-
-print("Thank you for using the cryptocurrency price prediction tool!")
+    # One request per coin covers every time period: shorter periods train on the most recent hours of it
+    hours = max(TIME_PERIODS[p] for p in time_periods)
+    histories, failures = {}, []
+    step = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.fetch_workers) as pool:
+        futures = {coin: pool.submit(fetch_history, coin, hours) for coin in coins}
+        for coin, future in futures.items():
+            try:
+                histories[coin] = future.result()
+            except Exception as e:
+                failures.extend((coin, p, a, e) for p in time_periods for a in selected_algorithms)
+    timings["fetch"] = time.perf_counter() - step
+
+    os.makedirs(args.output, exist_ok=True)
+    report_path = os.path.join(args.output, f"predictions-{now.strftime('%m%d%Y-%H%M%S')}{REPORT_FORMATS[args.format]}")
+    sink = None if args.format == "xlsx" else args.format
+    summary = {"Coin": [], "Time period": [], "Algorithm": [], "Sheet": [], "Seconds": []}
+    fit_seconds = {a: [] for a in selected_algorithms}
+
+    step = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.fit_workers) as pool, ReportWriter(report_path, sink=sink) as report:
+        jobs = {}
+        for coin, history_data in histories.items():
+            for time_period in time_periods:
+                # CryptoCompare returns one point more than the requested hours
+                history = history_data[-(TIME_PERIODS[time_period] + 1):]
+                for algorithm in selected_algorithms:
+                    jobs[coin, time_period, algorithm] = pool.submit(_predict_job, coin, time_period, algorithm, history, now)
+
+        # Sheets are written in a fixed order as soon as their fit is done
+        for (coin, time_period, algorithm), future in jobs.items():
+            try:
+                prediction_times, predicted_prices, seconds = future.result()
+            except Exception as e:
+                failures.append((coin, time_period, algorithm, e))
+                continue
+            columns, number_formats = report_columns(time_period, algorithm, prediction_times, predicted_prices)
+            sheet = report.add_sheet(f"{coin} {algorithm} {time_period.replace(' ', '-')}", columns, number_formats)
+            fit_seconds[algorithm].append(seconds)
+            for name, value in zip(summary, (coin, time_period, algorithm, sheet, seconds)):
+                summary[name].append(value)
+        report.add_sheet("Summary", summary)
+    timings["fit and report"] = time.perf_counter() - step
+    timings["total"] = time.perf_counter() - started
+
+    for coin, time_period, algorithm, error in failures:
+        print(f"Failed: {coin} {time_period} {algorithm}: {error}", file=sys.stderr)
+    print(f"Saved {len(summary['Sheet'])} predictions for {len(histories)} of {len(coins)} coins to: {report_path}")
+    print("+" + "-"*28 + "+" + "-"*12 + "+")
+    for name, seconds in timings.items():
+        print(f"| {name.ljust(26)} | {f'{seconds:.2f}s'.rjust(10)} |")
+    for algorithm, seconds in fit_seconds.items():
+        if seconds:
+            print(f"| {f'{algorithm} mean fit'.ljust(26)} | {f'{sum(seconds) / len(seconds):.3f}s'.rjust(10)} |")
+    print("+" + "-"*28 + "+" + "-"*12 + "+")
+    return 1 if failures else 0
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv:
+        return run_batch(parse_args(argv))
+    interactive()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
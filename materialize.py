@@ -0,0 +1,234 @@
+"""
+Forecasts recomputed ahead of expiry for the keys clients keep asking for.
+
+Every prediction request is recorded with the Materializer, which keeps an
+exponentially decaying request rate per key. When a forecast is computed its
+expiry is noted, and a refresh is scheduled `lead` seconds before it. Once
+that refresh is due the key is checked again: hot keys (at least `min_rate`
+requests per hour) are queued and recomputed by background workers, so
+their next requests hit a materialized result instead of paying for the
+fetch, training and prediction inline. Keys that went cold are left to
+expire.
+
+stats() reports the queue depth and the refresh lag, the seconds between a
+refresh becoming due and finishing. The clock is injectable and
+run_pending() does all due work in the calling thread, so the scheduler can
+be stepped through with a fake clock and a stubbed refresh function.
+"""
+import heapq
+import itertools
+import logging
+import math
+import queue
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class _KeyState:
+    def __init__(self, now):
+        self.count = 0.0  # requests, decayed to `updated`
+        self.updated = now
+        self.expires_at = None
+        self.due = None
+
+
+class Materializer:
+    """Refresh the forecasts of frequently requested keys before they expire.
+
+    refresh:     function(key) that recomputes and stores the forecast of a key
+    ttl:         seconds a computed forecast stays cached
+    lead:        seconds before expiry a refresh becomes due (default: a tenth of the ttl)
+    min_rate:    requests per hour for a key to be kept materialized
+    half_life:   seconds for a key's request rate to decay by half
+    retry_after: seconds before a failed refresh is tried again
+    """
+
+    def __init__(self, refresh, ttl, lead=None, min_rate=1.0, half_life=60 * 60, retry_after=60,
+                 max_keys=10000, workers=2, clock=time.monotonic):
+        self.refresh = refresh
+        self.ttl = ttl
+        self.lead = ttl / 10 if lead is None else lead
+        self.min_rate = min_rate
+        self.half_life = half_life
+        self.retry_after = retry_after
+        self.max_keys = max_keys
+        self.workers = workers
+        self.clock = clock
+
+        self._lock = threading.Lock()
+        self._keys = {}
+        self._schedule = []  # heap of (due, sequence, key), stale entries are skipped
+        self._sequence = itertools.count()
+        self._queue = queue.Queue()
+        self._wakeup = threading.Event()
+        self._threads = []
+        self._stopping = False
+        self.counters = {'refreshes': 0, 'failures': 0, 'late': 0, 'skipped_cold': 0}
+        self.last_lag = None
+        self.max_lag = 0.0
+        self._total_lag = 0.0
+
+    # Count one request for a key
+    def record(self, key):
+        now = self.clock()
+        with self._lock:
+            state = self._keys.get(key)
+            if state is None:
+                if len(self._keys) >= self.max_keys:
+                    self._forget_coldest(now)
+                state = self._keys[key] = _KeyState(now)
+            self._decay(state, now)
+            state.count += 1
+
+    # Note that the forecast of a key was just computed and schedule its refresh
+    def materialized(self, key, ttl=None):
+        now = self.clock()
+        with self._lock:
+            state = self._keys.get(key)
+            if state is None:
+                return  # Never requested, nothing to keep warm
+            state.expires_at = now + (self.ttl if ttl is None else ttl)
+            self._schedule_at(key, state, state.expires_at - self.lead)
+        self._wakeup.set()
+
+    # Requests per hour of a key, from its decayed request count
+    def rate(self, key):
+        with self._lock:
+            state = self._keys.get(key)
+            if state is None:
+                return 0.0
+            self._decay(state, self.clock())
+            return self._rate(state)
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        now = self.clock()
+        with self._lock:
+            hot = sum(1 for state in self._keys.values() if self._rate(state, now) >= self.min_rate)
+            tracked = len(self._keys)
+            scheduled = sum(1 for state in self._keys.values() if state.due is not None)
+            refreshes = self.counters['refreshes']
+            return dict(
+                self.counters,
+                tracked_keys=tracked,
+                hot_keys=hot,
+                scheduled=scheduled,
+                queue_depth=self._queue.qsize(),
+                refresh_lag_seconds=self.last_lag,
+                refresh_lag_max_seconds=self.max_lag,
+                refresh_lag_mean_seconds=self._total_lag / refreshes if refreshes else None,
+            )
+
+    # Queue every due refresh and run the queue in this thread. Returns the number of refreshes run.
+    def run_pending(self):
+        self._enqueue_due()
+        ran = 0
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                return ran
+            self._run(*item)
+            ran += 1
+
+    # Start the scheduler and worker threads
+    def start(self):
+        if self._threads:
+            return
+        self._stopping = False
+        self._threads = [threading.Thread(target=self._schedule_loop, name='materialize-scheduler', daemon=True)]
+        self._threads += [threading.Thread(target=self._work_loop, name=f'materialize-{i}', daemon=True)
+                          for i in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout=None):
+        self._stopping = True
+        self._wakeup.set()
+        for _ in range(self.workers):
+            self._queue.put(None)
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _schedule_loop(self):
+        while not self._stopping:
+            next_due = self._enqueue_due()
+            # The clock may be a fake one, so never sleep long without checking again
+            delay = 1.0 if next_due is None else min(max(next_due - self.clock(), 0.01), 1.0)
+            self._wakeup.wait(delay)
+            self._wakeup.clear()
+
+    def _work_loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            self._run(*item)
+
+    # Move due refreshes of hot keys to the queue. Returns when the next refresh is due.
+    def _enqueue_due(self):
+        now = self.clock()
+        with self._lock:
+            while self._schedule and self._schedule[0][0] <= now:
+                due, _, key = heapq.heappop(self._schedule)
+                state = self._keys.get(key)
+                if state is None or state.due != due:
+                    continue  # Rescheduled or forgotten since
+                state.due = None
+                if self._rate(state, now) >= self.min_rate:
+                    self._queue.put((key, due))
+                else:
+                    self.counters['skipped_cold'] += 1
+            return self._schedule[0][0] if self._schedule else None
+
+    def _run(self, key, due):
+        try:
+            self.refresh(key)
+        except Exception:
+            logger.exception('Refreshing %r failed', key)
+            now = self.clock()
+            with self._lock:
+                self.counters['failures'] += 1
+                state = self._keys.get(key)
+                if state is not None and state.due is None:
+                    self._schedule_at(key, state, now + self.retry_after)
+            return
+
+        now = self.clock()
+        with self._lock:
+            state = self._keys.get(key)
+            lag = max(0.0, now - due)
+            self.counters['refreshes'] += 1
+            if state is not None and state.expires_at is not None and now > state.expires_at:
+                self.counters['late'] += 1
+            self.last_lag = lag
+            self.max_lag = max(self.max_lag, lag)
+            self._total_lag += lag
+        self.materialized(key)
+
+    def _schedule_at(self, key, state, due):
+        state.due = due
+        heapq.heappush(self._schedule, (due, next(self._sequence), key))
+
+    def _decay(self, state, now):
+        if now > state.updated:
+            state.count *= 0.5 ** ((now - state.updated) / self.half_life)
+            state.updated = now
+
+    def _rate(self, state, now=None):
+        count = state.count
+        if now is not None and now > state.updated:
+            count *= 0.5 ** ((now - state.updated) / self.half_life)
+        # A steady rate of r requests per second decays to a count of r * half_life / ln 2
+        return count * math.log(2) / self.half_life * 60 * 60
+
+    # Drop the key with the lowest request rate to bound memory
+    def _forget_coldest(self, now):
+        coldest = min(self._keys, key=lambda k: self._rate(self._keys[k], now))
+        del self._keys[coldest]
@@ -0,0 +1,257 @@
+"""
+Prometheus-style metrics for the prediction services.
+
+Histograms are kept in memory and rendered in the Prometheus text format by
+render(); counters the services already keep (cache hits, upstream
+retries, materializer queue) are read by collectors at scrape time, so
+nothing is counted twice on the request path.
+
+stage() times one step of a request (fetch, train, predict, ...) into the
+`prediction_stage_seconds` histogram. A request sent with an `X-Trace`
+header also gets its stage timings back in a `Server-Timing` header.
+Set METRICS=0 (or metrics.enabled = False at runtime) to turn all
+instrumentation off.
+"""
+import bisect
+import os
+import threading
+import time
+
+from flask import request
+
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Upper bounds in seconds, from sub-millisecond cache hits to cold 10 year fetches
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+TRACE_HEADER = 'X-Trace'
+_TRACE_ENVIRON = 'HTTP_' + TRACE_HEADER.upper().replace('-', '_')
+
+enabled = os.environ.get('METRICS', '1') != '0'
+
+_local = threading.local()
+_histograms = []
+_collectors = []
+
+
+class Histogram:
+    """Cumulative-bucket histogram with one series per label value tuple."""
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}  # labels -> [bucket counts..., +Inf count, sum]
+        _histograms.append(self)
+
+    def observe(self, value, *labels):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[i] += 1
+            series[-1] += value
+
+    def samples(self):
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for labels, values in sorted(series.items()):
+            label_pairs = list(zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), values):
+                cumulative += count
+                yield f'{self.name}_bucket', label_pairs + [('le', _format_bound(bound))], cumulative
+            yield f'{self.name}_sum', label_pairs, values[-1]
+            yield f'{self.name}_count', label_pairs, cumulative
+
+
+stage_seconds = Histogram('prediction_stage_seconds', 'Time spent in each stage of computing predictions', ['stage'])
+request_seconds = Histogram('http_request_duration_seconds', 'Request latency by endpoint and status', ['endpoint', 'status'])
+_in_flight = 0
+_in_flight_lock = threading.Lock()
+
+
+class _Stage:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        elapsed = time.perf_counter() - self.start
+        stage_seconds.observe(elapsed, self.name)
+        trace = getattr(_local, 'trace', None)
+        if trace is not None:
+            trace.append((self.name, elapsed))
+
+
+class _NoStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NO_STAGE = _NoStage()
+
+
+# Time a block as one stage: `with metrics.stage('train'): ...`
+def stage(name):
+    return _Stage(name) if enabled else _NO_STAGE
+
+
+# Register a function returning (name, type, help, [(labels dict, value), ...]) families at scrape time
+def collector(fn):
+    _collectors.append(fn)
+    return fn
+
+
+# Count requests in flight, time them per endpoint, and answer X-Trace requests with Server-Timing
+def instrument(app):
+    @app.before_request
+    def start_request():
+        global _in_flight
+        if not enabled:
+            return
+        with _in_flight_lock:
+            _in_flight += 1
+        # The WSGI environ is much cheaper to look at than request.headers
+        trace = [] if _TRACE_ENVIRON in request.environ else None
+        _local.request = (time.perf_counter(), request.endpoint or 'unknown')
+        _local.trace = trace
+
+    @app.after_request
+    def finish_request(response):
+        started = getattr(_local, 'request', None)
+        if started is None:
+            return response
+        trace = _local.trace
+        if trace:
+            response.headers['Server-Timing'] = ', '.join(
+                f'{name};dur={seconds * 1000:.3f}' for name, seconds in trace)
+        request_seconds.observe(time.perf_counter() - started[0], started[1], str(response.status_code))
+        return response
+
+    @app.teardown_request
+    def end_request(exc):
+        global _in_flight
+        if getattr(_local, 'request', None) is None:
+            return
+        with _in_flight_lock:
+            _in_flight -= 1
+        _local.request = None
+        _local.trace = None
+
+
+@collector
+def _collect_in_flight():
+    return [('http_requests_in_flight', 'gauge', 'Requests being handled by this worker', [({}, _in_flight)])]
+
+
+# Export the hit, miss and eviction counters of caches, e.g. register_caches(predictions=cache, models=model_cache)
+def register_caches(**caches):
+    @collector
+    def collect():
+        families = []
+        for counter, help in (('hits', 'Cache lookups that found a value'),
+                              ('misses', 'Cache lookups that found nothing'),
+                              ('evictions', 'Entries dropped to make room for new ones')):
+            samples = [({'cache': name}, getattr(c, counter)) for name, c in caches.items() if hasattr(c, counter)]
+            families.append((f'cache_{counter}_total', 'counter', help, samples))
+        return families
+    return collect
+
+
+# Export the request, retry and rate-limit counters of an upstream.UpstreamClient
+def register_upstream(client):
+    @collector
+    def collect():
+        counters = dict(client.counters)
+        return [
+            ('upstream_requests_total', 'counter', 'Upstream HTTP requests sent, retries included', [({}, counters['requests'])]),
+            ('upstream_retries_total', 'counter', 'Upstream requests retried', [({}, counters['retries'])]),
+            ('upstream_rate_limited_total', 'counter', 'Upstream responses with status 429', [({}, counters['rate_limited'])]),
+            ('upstream_throttle_seconds_total', 'counter', 'Seconds spent waiting for the client-side rate limit',
+             [({}, counters['throttle_seconds'])]),
+        ]
+    return collect
+
+
+# Export the queue depth, refresh lag and counters of a materialize.Materializer
+def register_materializer(materializer):
+    @collector
+    def collect():
+        stats = materializer.stats()
+        lag = stats['refresh_lag_seconds']
+        return [
+            ('materializer_queue_depth', 'gauge', 'Refreshes due and waiting for a worker', [({}, stats['queue_depth'])]),
+            ('materializer_hot_keys', 'gauge', 'Keys requested often enough to be kept materialized', [({}, stats['hot_keys'])]),
+            ('materializer_refresh_lag_seconds', 'gauge', 'Seconds between the last refresh becoming due and finishing',
+             [({}, lag if lag is not None else 0.0)]),
+            ('materializer_refreshes_total', 'counter', 'Background refreshes finished', [({}, stats['refreshes'])]),
+            ('materializer_failures_total', 'counter', 'Background refreshes that failed', [({}, stats['failures'])]),
+            ('materializer_late_total', 'counter', 'Refreshes that finished after the old forecast expired', [({}, stats['late'])]),
+        ]
+    return collect
+
+
+# Export the tick, bar and prediction counters of an ingest.IngestWorker
+def register_ingestor(ingestor):
+    @collector
+    def collect():
+        stats = ingestor.stats()
+        return [
+            ('ingest_ticks_total', 'counter', 'Ticks taken from the feed', [({}, stats['ticks'])]),
+            ('ingest_dropped_ticks_total', 'counter', 'Ticks dropped as out of order or invalid', [({}, stats['dropped'])]),
+            ('ingest_bars_total', 'counter', 'Bars applied to the price store and models', [({}, stats['bars'])]),
+            ('ingest_failures_total', 'counter', 'Bars that failed to apply', [({}, stats['failures'])]),
+            ('ingest_predictions_replaced_total', 'counter', 'Cached predictions replaced after moving past the threshold',
+             [({}, stats['replaced'])]),
+            ('ingest_predictions_kept_total', 'counter', 'Cached predictions kept as within the threshold',
+             [({}, stats['kept'])]),
+        ]
+    return collect
+
+
+# All metrics in the Prometheus text exposition format
+def render():
+    lines = []
+    for histogram in _histograms:
+        lines.append(f'# HELP {histogram.name} {histogram.help}')
+        lines.append(f'# TYPE {histogram.name} histogram')
+        for name, labels, value in histogram.samples():
+            lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+    for collect in _collectors:
+        for name, kind, help, samples in collect():
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in samples:
+                lines.append(f'{name}{_format_labels(list(labels.items()))} {_format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_bound(bound):
+    return '+Inf' if bound == float('inf') else repr(bound)
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
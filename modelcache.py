@@ -0,0 +1,94 @@
+"""
+Content-addressed cache of trained models.
+
+Models are keyed by (coin, data watermark, algorithm, hyperparameters), where
+the watermark is the timestamp of the last price point the model was trained
+on. A coin's model is therefore trained once per new watermark and shared by
+every prediction key (bitcoin-hour-24, bitcoin-day-7, ...), and one coin can
+never be served another coin's model.
+
+The cache is an LRU bounded both by entry count and by the serialized size of
+the models it holds, and counts hits, misses and evictions.
+"""
+import pickle
+import threading
+from collections import OrderedDict
+
+
+class ModelCache:
+    """Bounded LRU of trained models with byte-size accounting."""
+
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (model, size in bytes)
+        self._lock = threading.Lock()
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(coin, watermark, algorithm, hyperparameters=None):
+        params = tuple(sorted((hyperparameters or {}).items()))
+        return (coin.lower(), int(watermark), algorithm, params)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, model):
+        size = model_size(model)
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (model, size)
+            self.current_bytes += size
+            self._evict()
+        return model
+
+    # Return the model for this watermark, training it only if it is not cached yet
+    def get_or_train(self, coin, watermark, algorithm, hyperparameters, train):
+        key = self.make_key(coin, watermark, algorithm, hyperparameters)
+        model = self.get(key)
+        if model is not None:
+            return model
+        return self.put(key, train())
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.current_bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def _evict(self):
+        # Always keep the entry that was just added, even if it alone is over budget
+        while len(self._entries) > 1 and (
+                len(self._entries) > self.max_entries or self.current_bytes > self.max_bytes):
+            _, (_, size) = self._entries.popitem(last=False)
+            self.current_bytes -= size
+            self.evictions += 1
+
+
+# Size of a model as it would be stored, preferring the model's own serialization
+def model_size(model):
+    if hasattr(model, 'dumps'):
+        return len(model.dumps())
+    return len(pickle.dumps(model, protocol=pickle.HIGHEST_PROTOCOL))
@@ -1,39 +1,289 @@
-from flask import Flask, jsonify, request
-import requests
-import pandas as pd
-from sklearn.linear_model import LinearRegression
-from flask_caching import Cache
-import json
-import pickle
+from flask import Flask, jsonify, request, stream_with_context
+from linreg import StreamingLinearRegression
+import algorithms
+from pricestore import store
+from cachebackend import TrackedCache
+import cachebackend
+import codec
+from modelcache import ModelCache
+from singleflight import SingleFlight, StaleWhileRevalidate
+from materialize import Materializer
+from upstream import client
+import forecast
+import metrics
+import tiers
+import quotes
+from coinlist import UnknownCoin, coin_list
+import batch
+import ingest
+import intervals
+from lazy import lazy_import
+import os
 import time
 
+# Only needed once a request fails, to tell the errors apart
+requests = lazy_import('requests')
+pd = lazy_import('pandas')
+
 app = Flask(__name__)
-cache = Cache(app, config={'CACHE_TYPE': 'simple'})
+metrics.instrument(app)
+cache = TrackedCache(app, config=cachebackend.cache_config())
+model_cache = ModelCache()
+coin_cache = StaleWhileRevalidate(ttl=60 * 60, stale_ttl=24 * 60 * 60)
+coin_flight = SingleFlight()
+fx = quotes.FxRates(store)
+fx_cache = StaleWhileRevalidate(ttl=60 * 60, stale_ttl=24 * 60 * 60)
+
+# Seconds predictions stay cached
+PREDICTION_TTL = 60 * 60
 
+# The models a prediction can be made with (?model=), linear being the default
+PREDICTION_MODELS = ('linear', 'ensemble')
 
-# Define function to fetch price data from the API
-@cache.cached(timeout=60 * 60)
+
+# Define function to fetch price data from the API and read its resolution tiers
 def fetch_price_data(crypto):
-    api_endpoint = f'https://api.coingecko.com/api/v3/coins/{crypto.lower()}/market_chart?vs_currency=usd&days=3652'
-    response = requests.get(api_endpoint)
-    response.raise_for_status() # Raise an exception if the request fails
-    price_data = response.json()
-    prices = pd.DataFrame(price_data['prices'], columns=['timestamp', 'price'])
-    prices['timestamp'] = pd.to_datetime(prices['timestamp'], unit='ms')
-    return prices
+    # Only the points newer than the last stored timestamp are downloaded
+    with metrics.stage('fetch'):
+        store.refresh(crypto)
+    # The hourly, daily and weekly bars are aggregated once per data update
+    with metrics.stage('tiers'):
+        series = {tier: store.closes(crypto, tier) for tier in tiers.TIERS}
+    return series
+
+
+# Define function to train a linear regression model on the closing prices of every tier.
+# Each freq predicts with the model of its tier (tiers.FREQ_TIERS). Models are cached
+# per coin and data watermark, so a coin is trained once per data update no matter
+# how many freq/period combinations are requested.
+def train_models(crypto, watermark, series):
+    # Fit straight on the int32 offsets and float32 closes of the compact series
+    def fit(tier):
+        model = StreamingLinearRegression()
+        return model.fit(series[tier].offsets, series[tier].values, origin=series[tier].base)
+
+    with metrics.stage('train'):
+        return {tier: model_cache.get_or_train(crypto, watermark, 'linear-regression', {'tier': tier}, lambda: fit(tier))
+                for tier in tiers.TIERS}
+
+
+# Define function to fetch the price data and train the models of a coin,
+# bypassing this worker's coin cache. Concurrent calls for a coin share one fetch.
+# fresh=True bypasses the entry other workers shared this hour too, and replaces it.
+def refresh_coin(crypto, fresh=False):
+    def refresh():
+        # Other workers sharing the cache backend may have done the work this hour
+        shared = None if fresh else cache.get(shared_coin_key(crypto))
+        if shared is not None:
+            return codec.decode_coin(shared)
+
+        series = fetch_price_data(crypto)
+        watermark = series['day'].end * 1000
+        models = train_models(crypto, watermark, series)
+        cache.set(shared_coin_key(crypto), codec.encode_coin(watermark, models), timeout=2 * 60 * 60)
+        return watermark, models
+
+    # A fresh refresh must not settle for a concurrent one that may take the shared entry
+    return coin_flight.do((crypto.lower(), fresh), refresh)
+
+
+# Define function to build the key a coin's watermark and models are shared under this hour
+def shared_coin_key(crypto):
+    return f'coin:{crypto.lower()}:{int(time.time() // (60 * 60))}'
+
+
+# Define function to bring the FX series of a quote currency up to date and return its watermark.
+# The USD coin behind it goes through the coin cache, so it is shared with predictions for that coin.
+def load_quote(quote):
+    watermark, _ = load_coin(quotes.reference_coin(quote))
+    if quote in quotes.FIAT_QUOTES:
+        watermark = max(watermark, fx_cache.get(quote, lambda: fx.refresh(quote)))
+    return watermark
+
+
+# Define function to train the model of one tier of a coin for any other model (the ensemble
+# of ensemble.py) or quote currency than the shared linear USD models. Cached per data
+# watermark like those, so only requests for them pay for training it.
+def train_predictor(crypto, watermark, tier, model='linear', quote='usd'):
+    hyperparameters = {'tier': tier}
+    if quote != 'usd':
+        # Closes in the quote currency are the USD closes divided by the FX series (quotes.py)
+        hyperparameters.update(quote=quote, fx=load_quote(quote))
+
+    def fit():
+        series = fx.quoted(crypto, quote, tier)
+        # The ensemble's module is only imported once it is asked for
+        predictor = algorithms.resolve(model).for_tier(tier) if model == 'ensemble' else StreamingLinearRegression()
+        return predictor.fit(series.offsets, series.values, origin=series.base)
+
+    algorithm = 'ensemble' if model == 'ensemble' else 'linear-regression'
+    with metrics.stage('train'):
+        return model_cache.get_or_train(crypto, watermark, algorithm, hyperparameters, fit)
+
+
+# Define function to fetch the price data and train the models of a coin.
+# Concurrent requests for the same coin share one call, and once the data is an
+# hour old it keeps being served while a single background refresh runs.
+def load_coin(crypto):
+    return coin_cache.get(crypto.lower(), lambda: refresh_coin(crypto))
+
+
+# Define function to predict the future dates and prices of one (crypto, freq, period), and the
+# bounds of the prediction intervals at the confidence `levels` ('80,95', see intervals.py).
+def predict_prices(crypto, freq, period, model='linear', quote='usd', levels=''):
+    watermark, models = load_coin(crypto)
+
+    # Predict future prices using the model trained on the tier of this freq
+    tier = tiers.FREQ_TIERS[freq]
+    if model == 'linear' and quote == 'usd':
+        predictor = models[tier]
+    else:
+        predictor = train_predictor(crypto, watermark, tier, model, quote)
+    with metrics.stage('dates'):
+        future_dates = forecast.future_dates(forecast.watermark_date(watermark), period, freq)
+    with metrics.stage('predict'):
+        x = forecast.epoch_seconds(future_dates).reshape(-1, 1)
+        future_prices = predictor.predict(x)
+        # The intervals come from the error variance of the same model, for the whole horizon at once
+        bounds = {}
+        if levels:
+            bounds = intervals.bounds(future_prices, predictor.predict_std(x), intervals.parse_levels(levels),
+                                      getattr(predictor, 'dof', None))
+    return future_dates, future_prices, bounds
+
+
+# Define function to build the key of a prediction. Linear USD predictions keep
+# their (crypto, freq, period) key, other models, quote currencies and intervals add theirs.
+def prediction_key(crypto, freq, period, model='linear', quote='usd', levels=''):
+    if levels:
+        return (crypto, freq, period, model, quote, levels)
+    if quote != 'usd':
+        return (crypto, freq, period, model, quote)
+    if model != 'linear':
+        return (crypto, freq, period, model)
+    return (crypto, freq, period)
+
+
+# Define function to compute the predictions of one (crypto, freq, period) and cache them
+def compute_predictions(crypto, freq, period, model='linear', quote='usd', levels=''):
+    future_dates, future_prices, bounds = predict_prices(crypto, freq, period, model, quote, levels)
+
+    # Format the predictions based on the frequency requested
+    with metrics.stage('format'):
+        predictions = forecast.encode_predictions(future_dates, future_prices, freq, bounds)
 
+    cache_key = '-'.join(str(part) for part in prediction_key(crypto, freq, period, model, quote, levels))
+    cache.set(cache_key, predictions, timeout=PREDICTION_TTL)
+    return predictions
 
-# Define function to train a linear regression model on price data
-@cache.cached(timeout=60 * 60, key_prefix='train_model')
-def train_model(prices):
-    # Convert timestamps to Unix timestamp integers
-    timestamps = prices['timestamp'].map(lambda x: int(x.timestamp()))
 
-    # Train a linear regression model on the price data
-    model = LinearRegression()
-    model.fit(timestamps.to_frame(), prices['price'])
+# Define function to recompute a materialized prediction before it expires. Its coin is reloaded
+# once per materialization cycle: the first of the coin's keys to come due reloads it, bypassing
+# what other workers shared, and recomputes the coin's other hot keys from the new models, which
+# puts them all on one schedule. Keys due later in the cycle reuse the reloaded coin.
+def materialize(key):
+    crypto = key[0]
+    age = coin_cache.age(crypto.lower())
+    if age is not None and age < materializer.lead:
+        compute_predictions(*key)
+        return
+    coin_cache.set(crypto.lower(), refresh_coin(crypto, fresh=True))
+    compute_predictions(*key)
+    for other in cached_prediction_keys(crypto):
+        if other != key and materializer.rate(other) >= materializer.min_rate:
+            compute_predictions(*other)
+            materializer.materialized(other)
 
-    return model
+
+# Frequently requested predictions are recomputed in the background before they expire
+materializer = Materializer(materialize, ttl=PREDICTION_TTL)
+if os.environ.get('MATERIALIZE', '1') != '0':
+    materializer.start()
+
+
+# Define function to list the prediction keys of a coin that have an entry in the cache
+def cached_prediction_keys(crypto):
+    keys = []
+    for cache_key in cache.keys(f'{crypto}-'):
+        parts = cache_key[len(crypto) + 1:].split('-')
+        # Other coins whose id starts with this one's are not followed by a freq and period
+        if len(parts) < 2 or parts[0] not in tiers.FREQ_TIERS or not parts[1].isdigit():
+            continue
+        model = parts[2] if len(parts) > 2 else 'linear'
+        quote = parts[3] if len(parts) > 3 else 'usd'
+        levels = parts[4] if len(parts) > 4 else ''
+        if model in PREDICTION_MODELS and quote in quotes.QUOTES and len(parts) <= 5:
+            keys.append(prediction_key(crypto, parts[0], int(parts[1]), model, quote, levels))
+    return keys
+
+
+# Define function to apply the points of a bar from the tick feed (ingest.py) to a coin.
+# They are appended to the price store, and a coin loaded by this worker has its linear
+# models brought forward by the tier bars that changed instead of being refitted. Its
+# cached linear USD predictions are recomputed from the new models, but only replaced when
+# they moved by more than ingest.THRESHOLD. Returns the number of predictions replaced and kept.
+def ingest_prices(crypto, timestamps, prices):
+    # Ticks only continue the upstream history: fetch it first for a coin without any, and
+    # backfill the tail when the bar starts well after it, since appending the ticks moves
+    # the last stored timestamp past the gap for good
+    last = store.last_timestamp(crypto)
+    if last is None or int(min(timestamps)) - last > ingest.BACKFILL_GAP * 1000:
+        with metrics.stage('fetch'):
+            store.refresh(crypto)
+
+    loaded = coin_cache.peek(crypto.lower())
+    previous, changes = store.extend(crypto, timestamps, prices)
+    if changes is None or loaded is None:
+        # Nothing new, or nobody asked for the coin yet: the next load reads the new points
+        return 0, 0
+
+    watermark, models = loaded
+    new_watermark = changes['day'][1].end * 1000
+    if previous is not None and previous // 1000 * 1000 == watermark:
+        models = {tier: models[tier].copy() for tier in tiers.TIERS}
+        for tier, (removed, added) in changes.items():
+            models[tier].remove(removed.offsets, removed.values, origin=removed.base)
+            models[tier].extend(added.offsets, added.values, origin=added.base)
+            model_cache.put(model_cache.make_key(crypto, new_watermark, 'linear-regression', {'tier': tier}),
+                            models[tier])
+    else:
+        # The models were trained on other data than the store held, train on what it holds now
+        models = train_models(crypto, new_watermark, {tier: store.closes(crypto, tier) for tier in tiers.TIERS})
+    coin_cache.set(crypto.lower(), (new_watermark, models))
+    cache.set(shared_coin_key(crypto), codec.encode_coin(new_watermark, models), timeout=2 * 60 * 60)
+
+    replaced = kept = 0
+    for key in cached_prediction_keys(crypto):
+        # Other models and quotes would be refitted on every bar, they are left to their TTL
+        # and the materializer. Interval bounds come from the same linear models.
+        if len(key) > 3 and key[3:5] != ('linear', 'usd'):
+            continue
+        cache_key = '-'.join(str(part) for part in key)
+        # Read from the backend directly so the comparison does not count as a hit
+        cached = cache.cache.get(cache_key)
+        if cached is None:
+            continue
+        future_dates, future_prices, bounds = predict_prices(*key)
+        if not ingest.forecast_moved(cached, future_dates, future_prices, key[1]):
+            kept += 1
+            continue
+        cache.set(cache_key, forecast.encode_predictions(future_dates, future_prices, key[1], bounds),
+                  timeout=PREDICTION_TTL)
+        materializer.materialized(key)
+        replaced += 1
+    return replaced, kept
+
+
+# Prices streamed from a tick feed move coins forward between data refreshes (off unless INGEST_SOURCE is set)
+ingestor = ingest.from_env(ingest_prices)
+if ingestor is not None:
+    ingestor.start()
+
+metrics.register_caches(predictions=cache, models=model_cache, coins=coin_cache)
+metrics.register_upstream(client)
+metrics.register_materializer(materializer)
+if ingestor is not None:
+    metrics.register_ingestor(ingestor)
 
 
 @app.route('/predictions/<freq>/<int:period>/<crypto>', methods=['GET'])
@@ -46,38 +296,57 @@ def get_predictions(freq, period, crypto):
     if period < 1 or period > 3652:
         return jsonify({'error': 'Invalid period specified. Please use a value between 1 and 3652.'}), 400
 
-    cache_key = f'{crypto}-{freq}-{period}'
-    cached_predictions = cache.get(cache_key)
-    if cached_predictions is not None:
-        return jsonify(cached_predictions)
+    # ?format=ndjson|columns picks another encoding, ?stream=1 sends it in chunks
+    fmt = request.args.get('format', 'json')
+    if fmt not in forecast.FORMATS:
+        return jsonify({'error': f'Invalid format specified. Please use one of {list(forecast.FORMATS)}.'}), 400
+    stream = fmt == 'ndjson' or request.args.get('stream', '0').lower() in ('1', 'true')
 
-    try:
-        # Fetch and aggregate price data
-        prices = fetch_price_data(crypto)
+    # ?model=ensemble predicts with the weighted ensemble instead of the linear trend
+    model = request.args.get('model', 'linear')
+    if model not in PREDICTION_MODELS:
+        return jsonify({'error': f'Invalid model specified. Please use one of {list(PREDICTION_MODELS)}.'}), 400
+
+    # ?quote=eur quotes the prices in another currency than USD
+    quote = request.args.get('quote', 'usd').lower()
+    if quote not in quotes.QUOTES:
+        return jsonify({'error': f'Invalid quote currency specified. Please use one of {list(quotes.QUOTES)}.'}), 400
 
-        # Train a linear regression model on the price data
-        model = train_model(prices)
+    # ?intervals=80,95 adds the bounds of prediction intervals at these confidence levels
+    try:
+        levels = intervals.format_levels(intervals.parse_levels(request.args.get('intervals', '')))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-        # Predict future prices using the trained model
-        future_dates = pd.date_range(start=prices['timestamp'].iloc[-1], periods=period, freq=freq[0].upper())
+    # Reject unknown coins before anything is fetched; unique symbols and names resolve to their id
+    try:
+        crypto = coin_list.resolve(crypto)
+    except UnknownCoin as e:
+        return jsonify({'error': str(e), 'suggestions': [c['id'] for c in coin_list.search(crypto, 5)]}), 404
 
-        future_dates_int = future_dates.map(lambda x: int(x.timestamp()))
-        future_dates_reshaped = future_dates_int.to_numpy().reshape(-1, 1)
-        future_prices = model.predict(future_dates_reshaped)
+    key = prediction_key(crypto, freq, period, model, quote, levels)
+    materializer.record(key)
+    if fmt == 'json':
+        cache_key = '-'.join(str(part) for part in key)
+        cached_predictions = cache.get(cache_key)
+        if cached_predictions is not None:
+            return app.response_class(cached_predictions, mimetype='application/json')
 
-        # Format the predictions based on the frequency requested
-        if freq == 'hour':
-            predictions = [{'date': date.strftime('%Y-%m-%d %H:%M:%S'), 'price': str(price)} for date, price in zip(future_dates, future_prices)]
-        elif freq == 'day':
-            predictions = [{'date': date.strftime('%Y-%m-%d'), 'price': str(price)} for date, price in zip(future_dates, future_prices)]
-        elif freq == 'month':
-            predictions = [{'date': date.strftime('%Y-%m'), 'price': str(price)} for date, price in zip(future_dates, future_prices)]
-        else:
-            predictions = [{'date': date.strftime('%Y'), 'price': str(price)} for date, price in zip(future_dates, future_prices)]
+    try:
+        if fmt == 'json' and not stream:
+            # Fetch the price data, train the model and predict, sharing the coin with concurrent requests
+            predictions = compute_predictions(crypto, freq, period, model, quote, levels)
+            materializer.materialized(key)
 
-        cache.set(cache_key, predictions, timeout=60 * 60)
+            return app.response_class(predictions, mimetype='application/json')
 
-        return jsonify(predictions)
+        # Other encodings are not cached, predicting from the cached models is cheap
+        future_dates, future_prices, bounds = predict_prices(crypto, freq, period, model, quote, levels)
+        mimetype = forecast.MIMETYPES[fmt]
+        if stream:
+            chunks = forecast.iter_encoded(future_dates, future_prices, freq, fmt, bounds=bounds)
+            return app.response_class(stream_with_context(chunks), mimetype=mimetype)
+        return app.response_class(forecast.encode(future_dates, future_prices, freq, fmt, bounds), mimetype=mimetype)
 
     except requests.exceptions.HTTPError as e:
         return jsonify({'error': f'An HTTP error occurred: {str(e)}'}), 500
@@ -89,28 +358,75 @@ def get_predictions(freq, period, crypto):
         return jsonify({'error': f'An error occurred: {str(e)}'}), 500
 
     
-# View the cache contents
+# Predict many (crypto, freq, period) tuples in one request
+@app.route('/predictions/batch', methods=['POST'])
+def get_batch_predictions():
+    try:
+        items = batch.parse_batch(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    # Unknown coins get an error entry without being fetched
+    resolved, unknown = [], {}
+    for crypto, freq, period in items:
+        try:
+            crypto = coin_list.resolve(crypto)
+            materializer.record((crypto, freq, period))
+        except UnknownCoin as e:
+            unknown[crypto] = e
+        resolved.append((crypto, freq, period))
+
+    def load_known_coin(crypto):
+        if crypto in unknown:
+            raise unknown[crypto]
+        return load_coin(crypto)
+
+    chunks = batch.stream_batch(resolved, load_known_coin, cache, timeout=PREDICTION_TTL,
+                                on_computed=materializer.materialized)
+    return app.response_class(stream_with_context(chunks), mimetype='application/json')
+
+
+# Stage latencies and cache, upstream and materializer counters in the Prometheus text format
+@app.route('/metrics', methods=['GET'])
+def view_metrics():
+    return app.response_class(metrics.render(), content_type=metrics.CONTENT_TYPE)
+
+
+# Hit rate of the cache and memory of this worker
+@app.route('/cache/stats', methods=['GET'])
+def view_cache_stats():
+    stats = cachebackend.cache_stats(cache)
+    stats['models'] = model_cache.stats()
+    stats['materializer'] = materializer.stats()
+    if ingestor is not None:
+        stats['ingest'] = ingestor.stats()
+    return jsonify(stats)
+
+
+# View the cache contents: metadata only, filtered by key prefix and paginated
 @app.route('/cache', methods=['GET'])
 def view_cache():
-    cache_data = []
-    json_cache_data = []
-    for key, value in cache.cache._cache.items():
-        try:
-            deserialized_value = pickle.loads(value[1])
-        except (pickle.UnpicklingError, TypeError):
-            try:
-                json_str = value[1].decode('utf-8')
-                deserialized_value = json.loads(json_str)
-            except (json.JSONDecodeError, TypeError):
-                deserialized_value = value[1].decode('utf-8', 'ignore')
+    prefix = request.args.get('prefix', '')
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', 100, type=int), 1), 1000)
 
-        expiration_time = value[0] - time.monotonic() if value[0] != 0 else None
-        cache_data.append({'key': key, 'value': deserialized_value, 'expiration_time': expiration_time})
+    keys = cache.keys(prefix)
+    entries = cache.describe(keys[offset:offset + limit])
+    return jsonify({'total': len(keys), 'offset': offset, 'limit': limit, 'entries': entries})
 
 
-        json_cache_data = json.dumps(cache_data, default=str)
+# View a single cache entry including its value
+@app.route('/cache/entry/<path:key>', methods=['GET'])
+def view_cache_entry(key):
+    entries = cache.describe([key])
+    # Read from the backend directly so looking at an entry does not count as a hit
+    value = cache.cache.get(key)
+    if not entries or value is None:
+        return jsonify({'error': f'No cache entry for {key}.'}), 404
 
-    return json_cache_data
+    entry = entries[0]
+    entry['value'] = value if not isinstance(value, bytes) else f'<{len(value)} bytes>'
+    return jsonify(entry)
 
 if __name__ == '__main__':
     app.run(debug=True)
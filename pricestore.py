@@ -0,0 +1,298 @@
+"""
+Local columnar price-history store.
+
+Every coin is kept on disk as two append-only binary columns: int64
+timestamps (milliseconds since the epoch, as returned by CoinGecko) and
+float64 prices. The columns are read back through numpy memory maps, so
+loading a coin does not parse any JSON and does not copy the data until a
+DataFrame is actually needed.
+
+The first refresh of a coin downloads the full 10 year history once. Every
+later refresh only asks CoinGecko for the points newer than the last stored
+timestamp and appends them to the columns.
+
+Next to the raw columns every coin keeps its hourly, daily and weekly OHLC
+bars (see tiers.py) as one binary file per tier. They are brought up to date
+once per data update, re-aggregating only the last bar and the new points.
+Points from the tick feed (ingest.py) are appended with extend(), which also
+reports the closes every tier lost and gained; it only extends coins that
+already have their history.
+
+Set COINGECKO_API_URL to point the store at a local HTTP stub, and
+PRICE_STORE_DIR to change where the columns are written.
+"""
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+import tiers
+from lazy import lazy_import
+from series import CompactSeries
+from upstream import COINGECKO_API_URL, client
+
+try:
+    import fcntl
+except ImportError:  # Windows has no fcntl, fall back to the in-process lock only
+    fcntl = None
+
+# Only frame() and the error for a coin without history need pandas
+pd = lazy_import('pandas')
+
+
+PRICE_STORE_DIR = os.environ.get('PRICE_STORE_DIR', 'pricestore')
+
+# Number of days requested on a cold start
+HISTORY_DAYS = 3652
+
+# Coin ids are used as file names, so only allow what CoinGecko ids look like
+_COIN_ID = re.compile(r'^[a-z0-9][a-z0-9._-]*$')
+
+
+class PriceStore:
+    """Per-coin on-disk columns of (timestamp, price) with incremental refresh."""
+
+    def __init__(self, root=PRICE_STORE_DIR, api_url=COINGECKO_API_URL, vs_currency='usd'):
+        self.root = root
+        self.api_url = api_url.rstrip('/')
+        self.vs_currency = vs_currency
+        self._lock = threading.Lock()
+        self._coin_locks = {}
+        os.makedirs(self.root, exist_ok=True)
+
+    def _paths(self, coin):
+        coin = coin.lower()
+        if not _COIN_ID.match(coin):
+            raise ValueError(f'Invalid coin id: {coin!r}')
+        base = os.path.join(self.root, f'{coin}-{self.vs_currency}')
+        return base + '.ts', base + '.px', base + '.lock'
+
+    def _tier_path(self, coin, tier):
+        return self._paths(coin)[0][:-len('.ts')] + f'.{tier}'
+
+    # Ids of every coin with stored history, sorted
+    def coins(self):
+        suffix = f'-{self.vs_currency}.ts'
+        return sorted(name[:-len(suffix)] for name in os.listdir(self.root) if name.endswith(suffix))
+
+    # Read the stored columns for a coin as read-only memory maps
+    def read(self, coin):
+        ts_path, px_path, _ = self._paths(coin)
+        timestamps = _map_column(ts_path, np.int64)
+        prices = _map_column(px_path, np.float64)
+
+        # A crash between the two appends can leave one column longer than the other
+        n = min(len(timestamps), len(prices))
+        return timestamps[:n], prices[:n]
+
+    # Return the last stored timestamp in milliseconds, or None for an unknown coin
+    def last_timestamp(self, coin):
+        timestamps, _ = self.read(coin)
+        if len(timestamps) == 0:
+            return None
+        return int(timestamps[-1])
+
+    # Append new points, skipping anything not newer than what is already stored
+    def append(self, coin, timestamps, prices):
+        timestamps = np.asarray(timestamps, dtype=np.int64)
+        prices = np.asarray(prices, dtype=np.float64)
+
+        last = self.last_timestamp(coin)
+        if last is not None:
+            newer = timestamps > last
+            timestamps, prices = timestamps[newer], prices[newer]
+        if len(timestamps) == 0:
+            return 0
+
+        # Keep the columns sorted and free of duplicates within the batch too
+        order = np.argsort(timestamps, kind='stable')
+        timestamps, keep = np.unique(timestamps[order], return_index=True)
+        prices = prices[order][keep]
+
+        ts_path, px_path, _ = self._paths(coin)
+        self._truncate_to_common_length(ts_path, px_path)
+        with open(ts_path, 'ab') as f:
+            timestamps.tofile(f)
+        with open(px_path, 'ab') as f:
+            prices.tofile(f)
+        return len(timestamps)
+
+    # Bring a coin up to date: one full fetch on a cold start, only the tail afterwards
+    def refresh(self, coin):
+        with self._locked(coin):
+            last = self.last_timestamp(coin)
+            if last is None:
+                points = self._fetch_full(coin)
+            else:
+                points = self._fetch_since(coin, last)
+            if not points:
+                return 0
+            data = np.asarray(points, dtype=np.float64)
+            added = self.append(coin, data[:, 0].astype(np.int64), data[:, 1])
+            self._update_tiers(coin)
+            return added
+
+    # Append points that did not come from the API (the tick feed of ingest.py) and bring
+    # the tiers up to date. Returns the last timestamp (ms) stored before, or None, and
+    # per tier the closes that went out of its training span, the old last bar included
+    # since it is rewritten, and the closes that came in, as (removed, added)
+    # CompactSeries, so models trained on a tier can follow without a refit. The
+    # changes are None when none of the points was newer than the stored ones. Points for
+    # a coin without stored history are dropped: they would seed the columns and the
+    # full history would never be fetched, so refresh() the coin first.
+    def extend(self, coin, timestamps, prices, dtype=np.float32):
+        with self._locked(coin):
+            self._update_tiers(coin)
+            previous = self.last_timestamp(coin)
+            if previous is None:
+                return None, None
+            before = {tier: np.array(tiers.recent(_map_column(self._tier_path(coin, tier), tiers.BAR_DTYPE), tier))
+                      for tier in tiers.TIERS}
+            if not self.append(coin, timestamps, prices):
+                return previous, None
+            self._update_tiers(coin)
+
+            changes = {}
+            for tier in tiers.TIERS:
+                after = tiers.recent(_map_column(self._tier_path(coin, tier), tiers.BAR_DTYPE), tier)
+                old = before[tier]
+                if len(old) == 0:
+                    removed, added = old, after
+                else:
+                    # Bars before the old last bar never change, only the span start moves
+                    gone = old['time'] < after['time'][0]
+                    gone[-1] = True
+                    removed = old[gone]
+                    added = after[np.searchsorted(after['time'], old['time'][-1]):]
+                changes[tier] = (CompactSeries.from_arrays(removed['time'], removed['close'], dtype),
+                                 CompactSeries.from_arrays(added['time'], added['close'], dtype))
+            return previous, changes
+
+    # Copy out the OHLC bars of one tier within its training span (tiers.TIER_SPANS),
+    # aggregating any points appended since the tiers were last brought up to date
+    def bars(self, coin, tier):
+        with self._locked(coin):
+            self._update_tiers(coin)
+            bars = _map_column(self._tier_path(coin, tier), tiers.BAR_DTYPE)
+            if len(bars) == 0:
+                raise pd.errors.EmptyDataError(f'No price history stored for {coin}')
+            # The last bar is rewritten in place by the next update, so never hand out the map
+            return np.array(tiers.recent(bars, tier))
+
+    # Closing prices of one tier within its training span as a CompactSeries
+    # (int32 second offsets, float32 prices), copied out like bars().
+    # recent=False returns every stored bar of the tier instead, e.g. for backtests.
+    def closes(self, coin, tier, dtype=np.float32, recent=True):
+        with self._locked(coin):
+            self._update_tiers(coin)
+            bars = _map_column(self._tier_path(coin, tier), tiers.BAR_DTYPE)
+            if len(bars) == 0:
+                raise pd.errors.EmptyDataError(f'No price history stored for {coin}')
+            if recent:
+                bars = tiers.recent(bars, tier)
+            return CompactSeries.from_arrays(bars['time'], bars['close'], dtype)
+
+    # Build the DataFrame the Flask apps have always worked with
+    def frame(self, coin):
+        timestamps, prices = self.read(coin)
+        if len(timestamps) == 0:
+            raise pd.errors.EmptyDataError(f'No price history stored for {coin}')
+        return pd.DataFrame({
+            'timestamp': pd.to_datetime(timestamps, unit='ms'),
+            'price': prices,
+        })
+
+    # Re-aggregate the last bar of every tier with the points appended after it.
+    # Must be called with the coin locked.
+    def _update_tiers(self, coin):
+        timestamps, prices = self.read(coin)
+        if len(timestamps) == 0:
+            return
+        for tier in tiers.TIERS:
+            path = self._tier_path(coin, tier)
+            bars = _map_column(path, tiers.BAR_DTYPE)
+            if len(bars) and bars['time'][-1] == timestamps[-1]:
+                continue
+
+            if len(bars) and bars['time'][-1] < timestamps[-1]:
+                # The last bar may be incomplete: rewrite it together with the new points
+                keep = len(bars) - 1
+                first = np.searchsorted(timestamps, tiers.bucket_start(int(bars['time'][-1]), tier))
+            else:
+                keep, first = 0, 0  # No bars yet, or bars ahead of a truncated raw column
+            del bars
+
+            new_bars = tiers.aggregate(timestamps[first:], prices[first:], tier)
+            with open(path, 'r+b' if keep else 'wb') as f:
+                f.seek(keep * tiers.BAR_DTYPE.itemsize)
+                new_bars.tofile(f)
+
+    def _fetch_full(self, coin):
+        api_endpoint = f'{self.api_url}/coins/{coin.lower()}/market_chart'
+        params = {'vs_currency': self.vs_currency, 'days': HISTORY_DAYS}
+        return self._get_prices(api_endpoint, params)
+
+    def _fetch_since(self, coin, last_ms):
+        api_endpoint = f'{self.api_url}/coins/{coin.lower()}/market_chart/range'
+        params = {
+            'vs_currency': self.vs_currency,
+            'from': last_ms // 1000 + 1,
+            'to': int(time.time()),
+        }
+        return self._get_prices(api_endpoint, params)
+
+    def _get_prices(self, api_endpoint, params):
+        return client.get_json(api_endpoint, params=params).get('prices', [])
+
+    def _truncate_to_common_length(self, ts_path, px_path):
+        n = min(_column_length(ts_path, np.int64), _column_length(px_path, np.float64))
+        for path, dtype in ((ts_path, np.int64), (px_path, np.float64)):
+            if os.path.exists(path) and os.path.getsize(path) != n * np.dtype(dtype).itemsize:
+                os.truncate(path, n * np.dtype(dtype).itemsize)
+
+    def _locked(self, coin):
+        lock_path = self._paths(coin)[2]
+        with self._lock:
+            thread_lock = self._coin_locks.setdefault(lock_path, threading.Lock())
+        return _CoinLock(thread_lock, lock_path)
+
+
+class _CoinLock:
+    # Serialize refreshes within the process, and across processes where flock exists
+    def __init__(self, thread_lock, path):
+        self.thread_lock = thread_lock
+        self.path = path
+        self.file = None
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        if fcntl is not None:
+            self.file = open(self.path, 'a')
+            fcntl.flock(self.file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self.file is not None:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+            self.file.close()
+            self.file = None
+        self.thread_lock.release()
+
+
+def _column_length(path, dtype):
+    if not os.path.exists(path):
+        return 0
+    return os.path.getsize(path) // np.dtype(dtype).itemsize
+
+
+def _map_column(path, dtype):
+    n = _column_length(path, dtype)
+    if n == 0:
+        return np.empty(0, dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode='r', shape=(n,))
+
+
+# Shared store used by the Flask apps
+store = PriceStore()
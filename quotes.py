@@ -0,0 +1,108 @@
+"""
+Quote currencies derived locally from the stored USD series.
+
+Prices are only downloaded in USD. To quote a coin in another currency, the
+services divide its USD closes by one FX series per quote currency, the USD
+price of one unit of the quote:
+
+    crypto quotes (btc, eth, ...)  the USD series of the quote coin itself,
+                                   which the store already keeps
+    fiat quotes (eur, gbp, ...)    bitcoin's USD series divided by bitcoin's
+                                   series in that currency, the only
+                                   download a quote currency adds
+
+N coins in M quote currencies therefore take N + M downloads instead of
+N x M. The cross rates are computed on the resolution tiers: both series
+are joined on their bar buckets with one searchsorted (as of the latest FX
+bar at or before each bar) and divided in one pass.
+"""
+import threading
+
+import numpy as np
+
+import tiers
+from lazy import lazy_import
+from pricestore import PriceStore
+from series import CompactSeries
+
+# Only the error for series that do not overlap needs pandas
+pd = lazy_import('pandas')
+
+
+# Quote currency symbols served by the USD series of a coin
+CRYPTO_QUOTES = {
+    'btc': 'bitcoin',
+    'eth': 'ethereum',
+    'sol': 'solana',
+    'bnb': 'binancecoin',
+}
+
+FIAT_QUOTES = ('eur', 'gbp', 'jpy', 'chf', 'cad', 'aud', 'cny', 'inr', 'krw')
+
+QUOTES = ('usd',) + tuple(CRYPTO_QUOTES) + FIAT_QUOTES
+
+# Coin whose price in a fiat currency and in USD gives that currency's FX series
+FX_REFERENCE_COIN = 'bitcoin'
+
+
+# Join `series` with the `rates` of the same tier on their bar buckets and divide.
+# Every bar uses the latest rate at or before its bucket; bars older than the
+# first rate are dropped.
+def cross(series, rates, tier):
+    seconds = series.seconds()
+    buckets = tiers.bucket_start(seconds * 1000, tier)
+    rate_buckets = tiers.bucket_start(rates.seconds() * 1000, tier)
+    index = np.searchsorted(rate_buckets, buckets, side='right') - 1
+    keep = index >= 0
+    if not keep.any():
+        raise pd.errors.EmptyDataError('No FX rates overlap the price history')
+
+    values = series.values[keep].astype(np.float64) / rates.values[index[keep]].astype(np.float64)
+    return CompactSeries.from_arrays(seconds[keep] * 1000, values, series.values.dtype)
+
+
+# The coin whose USD series a quote's FX series is derived from
+def reference_coin(quote):
+    return CRYPTO_QUOTES.get(quote, FX_REFERENCE_COIN)
+
+
+class FxRates:
+    """FX series of the quote currencies, at the resolution of every tier.
+
+    store is the USD price store; fiat quotes get a store of their own for
+    the reference coin, in the same directory.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._fiat_stores = {}
+        self._lock = threading.Lock()
+
+    def _fiat_store(self, quote):
+        with self._lock:
+            if quote not in self._fiat_stores:
+                self._fiat_stores[quote] = PriceStore(self.store.root, self.store.api_url, vs_currency=quote)
+            return self._fiat_stores[quote]
+
+    # Bring the series of a fiat quote's reference coin in that currency up to
+    # date and return its watermark (ms). The USD series behind every quote
+    # (reference_coin) is a coin like any other and is refreshed with the coins.
+    def refresh(self, quote):
+        fiat_store = self._fiat_store(quote)
+        fiat_store.refresh(FX_REFERENCE_COIN)
+        return fiat_store.last_timestamp(FX_REFERENCE_COIN)
+
+    # USD price of one unit of `quote` at the resolution of `tier`
+    def rates(self, quote, tier):
+        if quote in CRYPTO_QUOTES:
+            return self.store.closes(CRYPTO_QUOTES[quote], tier, dtype=np.float64)
+        reference = self.store.closes(FX_REFERENCE_COIN, tier, dtype=np.float64)
+        in_quote = self._fiat_store(quote).closes(FX_REFERENCE_COIN, tier, dtype=np.float64)
+        return cross(reference, in_quote, tier)
+
+    # Closes of a coin quoted in `quote` at the resolution of `tier`
+    def quoted(self, coin, quote, tier, dtype=np.float32):
+        series = self.store.closes(coin, tier, dtype)
+        if quote == 'usd':
+            return series
+        return cross(series, self.rates(quote, tier), tier)
@@ -0,0 +1,194 @@
+"""
+Streaming report writer for price predictions.
+
+Reports are written column-wise: each sheet is given whole columns of
+values at once and streamed to disk row by row, so memory stays constant no
+matter how many coins and algorithms go into one report. A single report
+can hold any number of sheets, e.g. one per coin and algorithm.
+
+Sinks, picked from the file extension or the `sink` argument:
+
+    xlsxwriter  .xlsx with xlsxwriter's constant-memory mode (default when installed)
+    openpyxl    .xlsx with openpyxl's write-only mode (fastest with lxml installed)
+    csv         a directory with one .csv file per sheet
+    parquet     a directory with one .parquet file per sheet (needs pyarrow)
+"""
+import csv
+import importlib.util
+import os
+import re
+
+
+SINKS = ('openpyxl', 'xlsxwriter', 'csv', 'parquet')
+
+# Excel limits sheet names to 31 characters without []:*?/\
+_INVALID_SHEET_CHARS = re.compile(r'[\[\]:*?/\\]')
+_MAX_SHEET_NAME = 31
+
+
+class ReportWriter:
+    """Write many sheets of columns into one report."""
+
+    def __init__(self, path, sink=None):
+        if sink is None:
+            sink = _sink_from_path(path)
+        if sink not in SINKS:
+            raise ValueError(f'Unknown report sink {sink!r}, use one of {SINKS}')
+        self.path = path
+        self.sink = sink
+        self.sheet_names = []
+        self._writer = _SINK_CLASSES[sink](path)
+
+    # Add a sheet from a dict of column name -> sequence of values.
+    # number_formats maps column names to Excel number formats, e.g. {'Date': 'mm/dd/yyyy hh:mm'}
+    def add_sheet(self, name, columns, number_formats=None):
+        name = self._unique_sheet_name(name)
+        headers = list(columns)
+        values = [columns[header] for header in headers]
+        lengths = {len(v) for v in values}
+        if len(lengths) > 1:
+            raise ValueError(f'Columns of sheet {name!r} have different lengths: {sorted(lengths)}')
+        self._writer.add_sheet(name, headers, values, number_formats or {})
+        self.sheet_names.append(name)
+        return name
+
+    def close(self):
+        self._writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _unique_sheet_name(self, name):
+        name = _INVALID_SHEET_CHARS.sub('-', str(name))[:_MAX_SHEET_NAME] or 'Sheet'
+        candidate, n = name, 2
+        taken = {s.lower() for s in self.sheet_names}
+        while candidate.lower() in taken:
+            suffix = f' ({n})'
+            candidate = name[:_MAX_SHEET_NAME - len(suffix)] + suffix
+            n += 1
+        return candidate
+
+
+def _sink_from_path(path):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv' or extension == '':
+        return 'csv'
+    if extension == '.parquet':
+        return 'parquet'
+    if importlib.util.find_spec('xlsxwriter') is not None:
+        return 'xlsxwriter'
+    return 'openpyxl'
+
+
+def _rows(values):
+    return zip(*[_to_python(v) for v in values])
+
+
+# NumPy arrays turn into Python scalars in one call instead of per cell
+def _to_python(column):
+    return column.tolist() if hasattr(column, 'tolist') else column
+
+
+class _OpenpyxlSink:
+    def __init__(self, path):
+        import openpyxl
+
+        self.path = path
+        self.workbook = openpyxl.Workbook(write_only=True)
+
+    def add_sheet(self, name, headers, values, number_formats):
+        from openpyxl.cell import WriteOnlyCell
+
+        sheet = self.workbook.create_sheet(title=name)
+        sheet.append(headers)
+        formats = [number_formats.get(header) for header in headers]
+        if not any(formats):
+            for row in _rows(values):
+                sheet.append(row)
+            return
+
+        for row in _rows(values):
+            cells = []
+            for value, number_format in zip(row, formats):
+                if number_format is not None and value is not None:
+                    cell = WriteOnlyCell(sheet, value=value)
+                    cell.number_format = number_format
+                    cells.append(cell)
+                else:
+                    cells.append(value)
+            sheet.append(cells)
+
+    def close(self):
+        self.workbook.save(self.path)
+
+
+class _XlsxwriterSink:
+    def __init__(self, path):
+        import xlsxwriter
+
+        self.workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+        self._formats = {}
+
+    def add_sheet(self, name, headers, values, number_formats):
+        sheet = self.workbook.add_worksheet(name)
+        sheet.write_row(0, 0, headers)
+        formats = [self._format(number_formats.get(header)) for header in headers]
+        # Constant-memory mode only accepts rows in order, so columns are streamed row-wise
+        for r, row in enumerate(_rows(values), start=1):
+            for c, (value, cell_format) in enumerate(zip(row, formats)):
+                if value is not None:
+                    sheet.write(r, c, value, cell_format)
+
+    def _format(self, number_format):
+        if number_format is None:
+            return None
+        if number_format not in self._formats:
+            self._formats[number_format] = self.workbook.add_format({'num_format': number_format})
+        return self._formats[number_format]
+
+    def close(self):
+        self.workbook.close()
+
+
+class _CsvSink:
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def add_sheet(self, name, headers, values, number_formats):
+        with open(os.path.join(self.path, f'{name}.csv'), 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(headers)
+            writer.writerows(_rows(values))
+
+    def close(self):
+        pass
+
+
+class _ParquetSink:
+    def __init__(self, path):
+        import pyarrow  # noqa: F401, fail early when the optional dependency is missing
+
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def add_sheet(self, name, headers, values, number_formats):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.table({header: _to_python(v) for header, v in zip(headers, values)})
+        pq.write_table(table, os.path.join(self.path, f'{name}.parquet'))
+
+    def close(self):
+        pass
+
+
+_SINK_CLASSES = {
+    'openpyxl': _OpenpyxlSink,
+    'xlsxwriter': _XlsxwriterSink,
+    'csv': _CsvSink,
+    'parquet': _ParquetSink,
+}
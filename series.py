@@ -0,0 +1,70 @@
+"""
+Compact in-memory price series.
+
+A CompactSeries keeps timestamps as int32 second offsets from an int64 base
+time and prices as float32, 8 bytes a point instead of the 16 of a
+datetime64[ns]/float64 DataFrame plus its index and block overhead. float32
+keeps about 7 significant digits, well below the noise of a price feed;
+pass dtype=np.float64 where that is not enough.
+
+The offsets and values are plain NumPy arrays, so they are handed to a model
+as they are (model.fit(series.offsets, series.values, origin=series.base))
+and no pandas object exists until to_frame() is called.
+"""
+import numpy as np
+
+from lazy import lazy_import
+
+# Only to_frame() and repr() need pandas
+pd = lazy_import('pandas')
+
+
+# int32 seconds cover 68 years from the base
+_MAX_OFFSET = np.iinfo(np.int32).max
+
+
+class CompactSeries:
+    """Prices with int32 second offsets from `base` (epoch seconds)."""
+
+    __slots__ = ('base', 'offsets', 'values')
+
+    def __init__(self, base, offsets, values):
+        if len(offsets) != len(values):
+            raise ValueError(f'{len(offsets)} offsets but {len(values)} values')
+        self.base = int(base)
+        self.offsets = offsets
+        self.values = values
+
+    @classmethod
+    def from_arrays(cls, timestamps_ms, prices, dtype=np.float32):
+        seconds = np.asarray(timestamps_ms, dtype=np.int64) // 1000
+        base = int(seconds[0]) if len(seconds) else 0
+        offsets = seconds - base
+        if len(offsets) and (offsets.min() < 0 or offsets.max() > _MAX_OFFSET):
+            raise ValueError('Timestamps must be sorted and span less than 68 years')
+        return cls(base, offsets.astype(np.int32), np.asarray(prices).astype(dtype))
+
+    def __len__(self):
+        return len(self.offsets)
+
+    @property
+    def nbytes(self):
+        return self.offsets.nbytes + self.values.nbytes
+
+    # Epoch seconds of the last point
+    @property
+    def end(self):
+        return self.base + int(self.offsets[-1])
+
+    # Epoch seconds of every point
+    def seconds(self):
+        return self.offsets.astype(np.int64) + self.base
+
+    def to_frame(self):
+        return pd.DataFrame({
+            'timestamp': pd.to_datetime(self.seconds(), unit='s'),
+            'price': self.values.astype(np.float64),
+        })
+
+    def __repr__(self):
+        return f'CompactSeries({len(self)} points from {pd.Timestamp(self.base, unit="s")})'
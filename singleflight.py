@@ -0,0 +1,154 @@
+"""
+Request coalescing for expensive per-coin work.
+
+SingleFlight makes concurrent callers asking for the same key wait on one
+in-flight computation and share its result (or its exception), instead of
+each of them hitting CoinGecko and training a model.
+
+StaleWhileRevalidate builds on it: once an entry's TTL expires it keeps
+serving the old value while a single background refresh runs, so only the
+very first request for a key ever waits on the computation.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Run at most one computation per key at a time and share its outcome."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def in_flight(self, key):
+        with self._lock:
+            return key in self._calls
+
+
+class StaleWhileRevalidate:
+    """Cache that serves expired values while one background refresh runs.
+
+    ttl:         seconds a value is fresh
+    stale_ttl:   seconds after expiry a value may still be served (None for no limit)
+    max_entries: number of keys kept, least recently used keys are dropped first
+    """
+
+    def __init__(self, ttl, stale_ttl=None, max_entries=1024, clock=time.monotonic):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self._flight = SingleFlight()
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # key -> (value, fresh_until)
+        self._refreshing = set()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, compute):
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+
+        if entry is not None:
+            value, fresh_until = entry
+            if now < fresh_until:
+                self.hits += 1
+                return value
+            if self.stale_ttl is None or now < fresh_until + self.stale_ttl:
+                self.stale_hits += 1
+                self._refresh_in_background(key, compute)
+                return value
+
+        self.misses += 1
+        return self._flight.do(key, lambda: self._compute(key, compute))
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, self.clock() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    # The value of a key, fresh or stale, without computing it or counting a lookup
+    def peek(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+        return None if entry is None else entry[0]
+
+    # Seconds since the value of a key was set, None when there is none
+    def age(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+        return None if entry is None else self.clock() - (entry[1] - self.ttl)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def refreshing(self, key):
+        with self._lock:
+            return key in self._refreshing
+
+    def _compute(self, key, compute):
+        return self.set(key, compute())
+
+    def _refresh_in_background(self, key, compute):
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        def run():
+            try:
+                self._flight.do(key, lambda: self._compute(key, compute))
+            except Exception:
+                # Keep serving the stale value, the next request retries the refresh
+                logger.exception('Background refresh of %r failed', key)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+
+        threading.Thread(target=run, name=f'refresh-{key}', daemon=True).start()
@@ -0,0 +1,30 @@
+"""
+Shared setup of the tests.
+
+The services read their configuration from the environment when they are
+imported, so the mock CoinGecko server (benchmarks/mockserver.py) is started
+and the price store and coin list are pointed at temporary paths before any
+test imports pp.
+"""
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+import mockserver  # noqa: E402
+
+SERVER = mockserver.start_server()
+os.environ['COINGECKO_API_URL'] = SERVER.coingecko_url
+os.environ['PRICE_STORE_DIR'] = tempfile.mkdtemp()
+os.environ['COIN_LIST_CACHE'] = os.path.join(tempfile.mkdtemp(), 'coin_list.json')
+os.environ['MATERIALIZE'] = '0'
+os.environ.pop('INGEST_SOURCE', None)
+
+
+@pytest.fixture
+def server():
+    return SERVER
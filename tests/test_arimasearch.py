@@ -0,0 +1,42 @@
+import numpy as np
+import pytest
+
+import arimasearch
+
+pytest.importorskip('statsmodels')
+
+
+def random_walk(n=150, seed=0):
+    rng = np.random.default_rng(seed)
+    return 100 + np.cumsum(rng.normal(0.05, 1, n))
+
+
+ORDERS = arimasearch.get_pdq_values(range(0, 4), range(0, 2), range(0, 2))
+
+
+def test_a_single_worker_fits_the_orders_in_process(monkeypatch):
+    series = random_walk()
+    expected = arimasearch.search_order(series, ORDERS, max_workers=2)
+
+    def no_pool(*args, **kwargs):
+        raise AssertionError('a single worker must not start a process pool')
+
+    monkeypatch.setattr(arimasearch, 'ProcessPoolExecutor', no_pool)
+    order, score, scores = arimasearch.search_order(series, ORDERS, max_workers=1)
+    assert (order, score) == expected[:2]
+    assert set(scores) <= set(expected[2])
+
+
+def test_early_stopping_skips_dominated_orders():
+    order, score, scores = arimasearch.search_order(random_walk(), ORDERS, max_workers=1, patience=1)
+    assert len(scores) < len(ORDERS)
+    assert score == min(s['aic'] for s in scores.values()) == scores[order]['aic']
+
+
+def test_cached_orders_are_reused(tmp_path, monkeypatch):
+    path = str(tmp_path / 'orders.json')
+    series = random_walk()
+    order = arimasearch.cached_order('coin-01', '1 day', series, cache_path=path, orders=ORDERS, max_workers=1)
+
+    monkeypatch.setattr(arimasearch, 'search_order', lambda *args, **kwargs: pytest.fail('searched again'))
+    assert arimasearch.cached_order('coin-01', '1 day', series, cache_path=path) == order
@@ -0,0 +1,57 @@
+import numpy as np
+
+import backtest
+import mockserver
+import tiers
+from linreg import StreamingLinearRegression
+from pricestore import PriceStore
+
+
+# Two years of daily points with ten days of hourly points after them, like a refreshed coin
+def mixed_history(tmp_path):
+    store = PriceStore(root=str(tmp_path))
+    end_ms = 1_700_000_000_000 // mockserver.DAY_MS * mockserver.DAY_MS
+    split_ms = end_ms - 10 * mockserver.DAY_MS
+    store.append('coin-07', *mockserver.synthetic_series('coin-07', split_ms - 730 * mockserver.DAY_MS, split_ms,
+                                                         mockserver.DAY_MS))
+    store.append('coin-07', *mockserver.synthetic_series('coin-07', split_ms + 1, end_ms, mockserver.HOUR_MS))
+    return store
+
+
+def test_backtests_run_on_evenly_spaced_tier_bars(tmp_path):
+    store = mixed_history(tmp_path)
+    rows = backtest.backtest_coin('coin-07', 'linear-regression', store_root=str(tmp_path))
+    assert [row['horizon'] for row in rows] == list(backtest.DEFAULT_HORIZONS['day'])
+    assert {row['tier'] for row in rows} == {'day'}
+
+    # One bar per day, stamped with its last point, whatever the resolution of the raw points
+    series = store.closes('coin-07', 'day', dtype=np.float64)
+    days = tiers.bucket_start(series.seconds() * 1000, 'day')
+    assert np.all(np.diff(days) == mockserver.DAY_MS)
+    # Every daily bar but the last h and the warm-up is an origin
+    assert [row['forecasts'] for row in rows] == [len(series) - 30 + 1 - h for h in (1, 7, 30)]
+
+
+def test_linear_forecasts_match_a_refit_at_each_origin(tmp_path):
+    store = mixed_history(tmp_path)
+    series = store.closes('coin-07', 'day', dtype=np.float64)
+    timestamps, prices = series.seconds() * 1000, series.values
+    origins = np.array([100, 400, len(prices) - 8])
+    forecasts = backtest.linear_forecasts(timestamps, prices, origins, (1, 7), window=90)
+
+    for column, origin in enumerate(origins):
+        model = StreamingLinearRegression().fit(series.seconds()[origin - 89:origin + 1], prices[origin - 89:origin + 1])
+        expected = model.predict(series.seconds()[[origin + 1, origin + 7]])
+        np.testing.assert_allclose(forecasts[:, column], expected, rtol=1e-9)
+
+
+def test_hourly_backtests_cover_every_stored_bar(tmp_path):
+    store = PriceStore(root=str(tmp_path))
+    end_ms = 1_700_000_000_000 // mockserver.HOUR_MS * mockserver.HOUR_MS
+    store.append('coin-08', *mockserver.synthetic_series('coin-08', end_ms - 200 * mockserver.DAY_MS, end_ms,
+                                                         mockserver.HOUR_MS))
+    bars = len(store.closes('coin-08', 'hour', recent=False))
+    assert bars == 200 * 24 + 1 > len(store.closes('coin-08', 'hour'))
+
+    rows = backtest.backtest_coin('coin-08', 'linear-regression', tier='hour', store_root=str(tmp_path))
+    assert [row['forecasts'] for row in rows] == [bars - 168 + 1 - h for h in (1, 24, 168)]
@@ -0,0 +1,62 @@
+import json
+import threading
+
+import pytest
+
+import batch
+import forecast
+import pp
+
+
+class DictCache:
+    def __init__(self):
+        self.entries = {}
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def set(self, key, value, timeout=None):
+        self.entries[key] = value
+
+
+def test_parse_batch():
+    assert batch.parse_batch({'requests': [['bitcoin', 'day', 7], {'crypto': 'eth', 'freq': 'hour', 'period': 24}]}) == [
+        ('bitcoin', 'day', 7), ('eth', 'hour', 24)]
+    for payload in ([], {'requests': [['bitcoin', 'week', 7]]}, [['bitcoin', 'day', 0]], [['bitcoin', 'day', True]],
+                    [['', 'day', 7]], [['bitcoin', 'day']]):
+        with pytest.raises(ValueError):
+            batch.parse_batch(payload)
+
+
+def test_elements_stream_as_their_coins_load():
+    coins = {crypto: pp.load_coin(crypto) for crypto in ('coin-60', 'coin-61')}
+    released = {crypto: threading.Event() for crypto in coins}
+
+    def load_coin(crypto):
+        if crypto == 'missing':
+            raise ValueError('no such coin')
+        if not released[crypto].wait(5):
+            raise TimeoutError(f'{crypto} was never released')
+        return coins[crypto]
+
+    computed = []
+    items = [('coin-60', 'day', 7), ('missing', 'day', 7), ('coin-61', 'hour', 24), ('coin-60', 'day', 7)]
+    chunks = batch.stream_batch(items, load_coin, DictCache(), on_computed=computed.append)
+
+    # The array opens before any coin is loaded
+    assert next(chunks) == '['
+    released['coin-60'].set()
+    first = next(chunks)
+    assert first.startswith('{"crypto": "coin-60"') and '"predictions": [' in first
+    second = next(chunks)
+    assert '"error": "An error occurred: no such coin"' in second
+    released['coin-61'].set()
+    rest = list(chunks)
+    assert rest[-1] == ']'
+
+    body = json.loads('[' + first + second + ''.join(rest))
+    assert [element['crypto'] for element in body] == [crypto for crypto, _, _ in items]
+    assert body[3] == body[0]
+    dates, prices, _ = pp.predict_prices('coin-61', 'hour', 24)
+    assert body[2]['predictions'] == json.loads(forecast.encode_predictions(dates, prices, 'hour'))
+    assert sorted(computed) == [('coin-60', 'day', 7), ('coin-61', 'hour', 24)]
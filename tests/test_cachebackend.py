@@ -0,0 +1,70 @@
+import pytest
+from flask import Flask
+
+import cachebackend
+from cachebackend import TrackedCache
+
+pytest.importorskip('fakeredis')
+
+
+def make_cache(monkeypatch, prefix='test:'):
+    monkeypatch.setenv('CACHE_TYPE', 'fakeredis')
+    monkeypatch.setenv('CACHE_KEY_PREFIX', prefix)
+    return TrackedCache(Flask(__name__), config=cachebackend.cache_config())
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = make_cache(monkeypatch)
+    cache.clear()
+    return cache
+
+
+def test_fakeredis_config(monkeypatch):
+    monkeypatch.setenv('CACHE_TYPE', 'fakeredis')
+    monkeypatch.delenv('CACHE_KEY_PREFIX', raising=False)
+    assert cachebackend.cache_config() == {'CACHE_TYPE': 'cachebackend.fakeredis_cache', 'CACHE_KEY_PREFIX': 'pp:'}
+
+
+def test_hits_misses_and_index(cache):
+    assert cache.get('bitcoin-day-7') is None
+    cache.set('bitcoin-day-7', '[{"date": "2024-01-01", "price": "1.0"}]', timeout=60)
+    cache.set('bitcoin-hour-24', '[]')
+    cache.set('ethereum-day-7', {'a': 1})
+    assert cache.get('bitcoin-day-7') is not None
+    assert cache.get('bitcoin-day-7') is not None
+
+    assert (cache.hits, cache.misses) == (2, 1)
+    assert cachebackend.cache_stats(cache)['hit_rate'] == pytest.approx(2 / 3)
+    # The index hashes live next to the entries but are never listed
+    assert cache.keys() == ['bitcoin-day-7', 'bitcoin-hour-24', 'ethereum-day-7']
+    assert cache.keys('bitcoin-') == ['bitcoin-day-7', 'bitcoin-hour-24']
+
+    described = {entry['key']: entry for entry in cache.describe(['bitcoin-day-7', 'ethereum-day-7', 'missing'])}
+    assert set(described) == {'bitcoin-day-7', 'ethereum-day-7'}
+    assert described['bitcoin-day-7']['type'] == 'str'
+    assert described['bitcoin-day-7']['hits'] == 2
+    assert described['bitcoin-day-7']['size_bytes'] > 0
+    assert 0 < described['bitcoin-day-7']['ttl_remaining'] <= 60
+    assert described['ethereum-day-7']['type'] == 'dict'
+
+    cache.delete('bitcoin-day-7')
+    assert cache.keys('bitcoin-') == ['bitcoin-hour-24']
+    assert cache.describe(['bitcoin-day-7']) == []
+
+
+def test_workers_share_entries_and_metadata(cache, monkeypatch):
+    other = make_cache(monkeypatch)
+    cache.set('coin:bitcoin:1', 'shared')
+    assert other.get('coin:bitcoin:1') == 'shared'
+    assert other.keys() == ['coin:bitcoin:1']
+    assert cache.describe(['coin:bitcoin:1'])[0]['hits'] == 1
+
+
+def test_prefixes_keep_caches_apart(cache, monkeypatch):
+    other = make_cache(monkeypatch, prefix='other:')
+    other.clear()
+    other.set('bitcoin-day-7', 'other')
+    cache.set('bitcoin-day-7', 'ours')
+    assert cache.get('bitcoin-day-7') == 'ours'
+    assert other.keys() == ['bitcoin-day-7']
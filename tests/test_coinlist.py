@@ -0,0 +1,51 @@
+import pytest
+
+from coinlist import CoinIndex, UnknownCoin
+from mockserver import coin_list
+
+
+@pytest.fixture(scope='module')
+def index():
+    return CoinIndex(coin_list(300) + [{'id': 'bitcoin', 'symbol': 'btc', 'name': 'Bitcoin'},
+                                       {'id': 'bitcoin-cash', 'symbol': 'bch', 'name': 'Bitcoin Cash'},
+                                       {'id': 'wrapped-bitcoin', 'symbol': 'btc', 'name': 'Wrapped Bitcoin'}])
+
+
+# Every coin whose id, symbol or name starts with the prefix, the slow way
+def matches(index, prefix):
+    prefix = prefix.lower()
+    return {c['id'] for c in index.coins if any(c[field].lower().startswith(prefix) for field in ('id', 'symbol', 'name'))}
+
+
+@pytest.mark.parametrize('prefix', ['coin-1', 'Coin 2', 'c1', 'c', 'BIT', 'btc', 'coin-299', 'zzz', ''])
+def test_search_and_count_find_every_match(index, prefix):
+    expected = matches(index, prefix)
+    assert index.count(prefix) == len(expected)
+    found = [c['id'] for c in index.search(prefix, limit=10 ** 6)]
+    assert len(found) == len(set(found)) and set(found) == expected
+    assert len(index.search(prefix, limit=5)) == min(5, len(expected))
+
+
+def test_exact_matches_come_first(index):
+    assert [c['id'] for c in index.search('btc', 2)] == ['bitcoin', 'wrapped-bitcoin']
+    assert index.search('bitcoin', 1)[0]['id'] == 'bitcoin'
+
+
+def test_resolve(index):
+    assert index.resolve('Bitcoin Cash') == 'bitcoin-cash'
+    assert index.resolve('c07') == 'coin-07'
+    with pytest.raises(UnknownCoin) as error:
+        index.resolve('btc')
+    assert error.value.candidates == ['bitcoin', 'wrapped-bitcoin']
+    with pytest.raises(UnknownCoin):
+        index.resolve('nope')
+
+
+def test_the_total_count_of_a_search_is_every_match():
+    import APIpp
+
+    client = APIpp.app.test_client()
+    response = client.get('/cryptocurrencies?q=coin 1&limit=5&offset=5')
+    assert response.status_code == 200
+    assert len(response.get_json()) == 5
+    assert int(response.headers['X-Total-Count']) == len(matches(APIpp.coin_list.index(), 'coin 1'))
@@ -0,0 +1,26 @@
+import json
+
+import numpy as np
+import pytest
+
+import forecast
+
+
+@pytest.mark.parametrize('without_orjson', [False, True])
+def test_columns_stream_equals_encode(monkeypatch, without_orjson):
+    if without_orjson:
+        monkeypatch.setattr(forecast, 'orjson', None)
+    dates = forecast.future_dates(np.datetime64('2024-01-01T00:00'), 3000, 'hour')
+    prices = np.linspace(100.0, 200.0, 3000)
+    prices[[0, 1500, 2999]] = [np.nan, np.inf, -np.inf]
+    bounds = {80: (prices - 1, prices + 1)}
+
+    encoded = forecast.encode(dates, prices, 'hour', fmt='columns', bounds=bounds)
+    assert ''.join(forecast.iter_encoded(dates, prices, 'hour', fmt='columns', chunk=1000, bounds=bounds)) == encoded
+
+    # Strict JSON: NaN and Infinity are not numbers there
+    columns = json.loads(encoded, parse_constant=pytest.fail)
+    assert len(columns['t']) == 3000
+    assert columns['p'][0] is None and columns['p'][1500] is None and columns['p'][2999] is None
+    assert columns['p'][1] == prices[1]
+    assert columns['lower_80'][0] is None and columns['upper_80'][1] == prices[1] + 1
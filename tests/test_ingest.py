@@ -0,0 +1,76 @@
+import time
+
+import numpy as np
+
+import ingest
+import mockserver
+import pp
+from pricestore import store
+
+
+HOUR_MS = mockserver.HOUR_MS
+DAY_MS = mockserver.DAY_MS
+
+
+def replay(tmp_path, ticks):
+    path = str(tmp_path / 'ticks.ndjson')
+    ingest.write_ticks(path, ticks)
+    worker = ingest.IngestWorker(ingest.ReplaySource(path), pp.ingest_prices)
+    worker.run()
+    return worker.stats()
+
+
+def test_extend_drops_points_of_a_coin_without_history():
+    assert store.extend('coin-40', [1_700_000_000_000], [11.0]) == (None, None)
+    assert store.last_timestamp('coin-40') is None
+
+
+def test_ticks_of_a_coin_without_history_fetch_it_first(tmp_path):
+    now_ms = int(time.time() * 1000)
+    stats = replay(tmp_path, [('coin-41', now_ms + i * 1000, 11.0) for i in range(2)])
+    assert stats['failures'] == 0
+
+    timestamps, prices = store.read('coin-41')
+    assert len(timestamps) > 3000
+    assert timestamps[0] < now_ms - 3000 * DAY_MS
+    assert timestamps[-1] == now_ms + 1000 and prices[-1] == 11.0
+
+    response = pp.app.test_client().get('/predictions/day/7/coin-41')
+    assert response.status_code == 200
+    assert {item['price'] for item in response.get_json()} != {'11.0'}
+
+
+def test_a_gap_before_the_ticks_is_backfilled_from_upstream(tmp_path, server):
+    # History that ends two days ago, then ticks from now on
+    now_ms = int(time.time() * 1000)
+    timestamps, prices = mockserver.synthetic_series('coin-42', now_ms - 400 * DAY_MS, now_ms - 2 * DAY_MS, DAY_MS)
+    store.append('coin-42', timestamps, prices)
+    last = store.last_timestamp('coin-42')
+
+    served = server.RequestHandlerClass.requests_served
+    ticks = [('coin-42', now_ms + i * 5000, 11.0) for i in range(60)]
+    stats = replay(tmp_path, ticks)
+    assert stats['failures'] == 0 and stats['bars'] >= 5
+    # Only the first bar starts far enough after the stored history to backfill
+    assert server.RequestHandlerClass.requests_served == served + 1
+
+    stored, _ = store.read('coin-42')
+    gap = stored[(stored > last) & (stored < now_ms)]
+    assert len(gap) >= 47
+    assert np.all(np.diff(gap) == HOUR_MS)
+    assert stored[-1] == ticks[-1][1]
+
+
+def test_ticks_only_repredict_the_incrementally_updated_models(tmp_path, monkeypatch):
+    client = pp.app.test_client()
+    for query in ('', '?intervals=80', '?model=ensemble'):
+        assert client.get(f'/predictions/hour/3/coin-43{query}').status_code == 200
+    last = store.last_timestamp('coin-43')
+
+    trained = []
+    train_predictor = pp.train_predictor
+    monkeypatch.setattr(pp, 'train_predictor', lambda *args: trained.append(args) or train_predictor(*args))
+    # A bar at ten times the last price moves every linear prediction
+    price = store.read('coin-43')[1][-1] * 10
+    assert pp.ingest_prices('coin-43', [last + 1000, last + 2000], [price, price]) == (2, 0)
+    assert trained == []
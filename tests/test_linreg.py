@@ -0,0 +1,116 @@
+import numpy as np
+import pytest
+
+from linreg import StreamingLinearRegression, predict_stacked
+
+linear_model = pytest.importorskip('sklearn.linear_model')
+
+
+# Hourly timestamps around now and a noisy trend, the shape of the price series
+def series(n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    x = 1.7e9 + np.arange(n) * 3600.0
+    y = 100 + 2e-5 * (x - x[0]) + rng.normal(0, 3, n)
+    return x, y
+
+
+def reference(x, y, sample_weight=None):
+    return linear_model.LinearRegression().fit(x.reshape(-1, 1), y, sample_weight=sample_weight)
+
+
+def assert_same(model, expected, x):
+    np.testing.assert_allclose(model.coef_, expected.coef_, rtol=1e-7)
+    np.testing.assert_allclose(model.intercept_, expected.intercept_, rtol=1e-7)
+    np.testing.assert_allclose(model.predict(x), expected.predict(x.reshape(-1, 1)), rtol=1e-9)
+
+
+def test_fit():
+    x, y = series()
+    assert_same(StreamingLinearRegression().fit(x.reshape(-1, 1), y), reference(x, y), x)
+
+
+def test_fit_on_offsets_from_an_origin():
+    x, y = series()
+    base = int(x[0])
+    model = StreamingLinearRegression().fit((x - base).astype(np.int32), y.astype(np.float32), origin=base)
+    assert_same(model, reference(x, y.astype(np.float32)), x)
+
+
+def test_update():
+    x, y = series()
+    model = StreamingLinearRegression()
+    for xi, yi in zip(x, y):
+        model.update(xi, yi)
+    assert_same(model, reference(x, y), x)
+
+
+def test_extend():
+    x, y = series()
+    model = StreamingLinearRegression().fit(x[:300], y[:300])
+    model.extend(x[300:], y[300:])
+    assert_same(model, reference(x, y), x)
+
+
+def test_remove():
+    x, y = series()
+    model = StreamingLinearRegression().fit(x, y)
+    # The oldest points leave the span and the last one is rewritten
+    model.remove(x[:100], y[:100])
+    model.remove(x[-1:], y[-1:])
+    y = y.copy()
+    y[-1] += 5
+    model.extend(x[-1:], y[-1:])
+    assert_same(model, reference(x[100:], y[100:]), x)
+
+
+def test_remove_is_refused_with_decay_or_window():
+    x, y = series(10)
+    with pytest.raises(ValueError):
+        StreamingLinearRegression(decay=0.9).fit(x, y).remove(x[:1], y[:1])
+    with pytest.raises(ValueError):
+        StreamingLinearRegression(window=5).fit(x, y).remove(x[:1], y[:1])
+
+
+@pytest.mark.parametrize('decay', [0.999, 0.98])
+def test_decay(decay):
+    x, y = series()
+    weights = decay ** np.arange(len(x) - 1, -1, -1)
+    expected = reference(x, y, sample_weight=weights)
+
+    model = StreamingLinearRegression(decay=decay).fit(x[:200], y[:200])
+    for xi, yi in zip(x[200:300], y[200:300]):
+        model.update(xi, yi)
+    model.extend(x[300:], y[300:])
+    assert_same(model, expected, x)
+
+
+def test_window():
+    x, y = series(1000)
+    expected = reference(x[-120:], y[-120:])
+
+    model = StreamingLinearRegression(window=120).fit(x[:500], y[:500])
+    for xi, yi in zip(x[500:900], y[500:900]):
+        model.update(xi, yi)
+    model.extend(x[900:], y[900:])
+    assert_same(model, expected, x)
+
+
+def test_serialization_round_trip():
+    x, y = series()
+    model = StreamingLinearRegression(window=50).fit(x, y)
+    restored = StreamingLinearRegression.loads(model.dumps())
+    np.testing.assert_array_equal(restored.predict(x), model.predict(x))
+    restored.update(x[-1] + 3600, 1.0)
+    model.update(x[-1] + 3600, 1.0)
+    np.testing.assert_array_equal(restored.predict(x), model.predict(x))
+
+
+def test_predict_stacked():
+    models, expected = [], []
+    x = np.linspace(1.7e9, 1.8e9, 30)
+    for seed in range(3):
+        xs, ys = series(200, seed)
+        models.append(StreamingLinearRegression().fit(xs, ys * (seed + 1)))
+        expected.append(models[-1].predict(x))
+    owners = np.repeat(np.arange(3), len(x))
+    np.testing.assert_allclose(predict_stacked(models, np.tile(x, 3), owners), np.concatenate(expected), rtol=1e-12)
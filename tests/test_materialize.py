@@ -0,0 +1,95 @@
+import pytest
+
+from materialize import Materializer
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def make_materializer(refresh, **kwargs):
+    clock = FakeClock()
+    return Materializer(refresh, ttl=3600, lead=300, min_rate=1, half_life=3600, clock=clock, **kwargs), clock
+
+
+def test_hot_keys_are_refreshed_ahead_of_expiry():
+    refreshed = []
+    materializer, clock = make_materializer(refreshed.append)
+    key = ('bitcoin', 'day', 7)
+    for _ in range(10):
+        materializer.record(key)
+    materializer.materialized(key)
+
+    clock.now += 3600 - 300 - 1
+    assert materializer.run_pending() == 0
+    clock.now += 11
+    assert materializer.run_pending() == 1
+    assert refreshed == [key]
+
+    stats = materializer.stats()
+    assert stats['refreshes'] == 1 and stats['late'] == 0
+    assert stats['refresh_lag_seconds'] == pytest.approx(10)
+    # The refresh materialized the key again, so the next one is due a ttl later
+    clock.now += 3600 - 300
+    assert materializer.run_pending() == 1
+
+
+def test_cold_keys_are_left_to_expire():
+    refreshed = []
+    materializer, clock = make_materializer(refreshed.append)
+    materializer.record('rare')
+    materializer.materialized('rare')
+    materializer.materialized('never-requested')
+
+    clock.now += 3600
+    assert materializer.run_pending() == 0
+    assert refreshed == []
+    stats = materializer.stats()
+    assert stats['skipped_cold'] == 1 and stats['scheduled'] == 0 and stats['tracked_keys'] == 1
+
+
+def test_request_rates_decay():
+    materializer, clock = make_materializer(lambda key: None)
+    for _ in range(4):
+        materializer.record('key')
+    rate = materializer.rate('key')
+    clock.now += 3600
+    assert materializer.rate('key') == pytest.approx(rate / 2)
+
+
+def test_failed_refreshes_are_retried():
+    calls = []
+
+    def refresh(key):
+        calls.append(clock.now)
+        if len(calls) == 1:
+            raise RuntimeError('upstream down')
+
+    materializer, clock = make_materializer(refresh, retry_after=60)
+    for _ in range(10):
+        materializer.record('key')
+    materializer.materialized('key')
+
+    clock.now += 3300
+    assert materializer.run_pending() == 1
+    assert materializer.stats()['failures'] == 1
+    clock.now += 59
+    assert materializer.run_pending() == 0
+    clock.now += 1
+    assert materializer.run_pending() == 1
+    assert calls == [4300, 4360]
+    assert materializer.stats()['refreshes'] == 1
+
+
+def test_the_coldest_key_is_forgotten_at_max_keys():
+    materializer, clock = make_materializer(lambda key: None, max_keys=2)
+    for _ in range(3):
+        materializer.record('hot')
+    materializer.record('cold')
+    materializer.record('new')
+    assert materializer.rate('cold') == 0
+    assert materializer.rate('hot') > 0 and materializer.rate('new') > 0
@@ -0,0 +1,47 @@
+import time
+
+import codec
+import forecast
+import pp
+from pricestore import store
+
+
+def test_fresh_predictions_bypass_the_shared_coin_entry(monkeypatch):
+    client = pp.app.test_client()
+    assert client.get('/predictions/day/7/coin-50').status_code == 200
+    watermark, _ = pp.load_coin('coin-50')
+
+    # A point arrives after the coin was shared with the other workers this hour
+    newer = (int(time.time()) + 60 * 60) * 1000
+    store.append('coin-50', [newer], [store.read('coin-50')[1][-1] * 1.01])
+
+    assert pp.refresh_coin('coin-50')[0] == watermark
+    assert pp.refresh_coin('coin-50', fresh=True)[0] == newer
+    assert codec.decode_coin(pp.cache.get(pp.shared_coin_key('coin-50')))[0] == newer
+
+    # The prediction comes due for materialization an hour after the coin was loaded
+    later = time.monotonic() + pp.PREDICTION_TTL
+    monkeypatch.setattr(pp.coin_cache, 'clock', lambda: later)
+    pp.materialize(('coin-50', 'hour', 3))
+    dates, prices, _ = pp.predict_prices('coin-50', 'hour', 3)
+    assert dates[0] == forecast.watermark_date(newer)
+    assert pp.load_coin('coin-50')[0] == newer
+
+
+def test_materialization_reloads_a_coin_once_per_cycle(monkeypatch):
+    client = pp.app.test_client()
+    keys = [('coin-51', 'day', 7), ('coin-51', 'hour', 3), ('coin-51', 'hour', 24)]
+    for crypto, freq, period in keys:
+        for _ in range(3):
+            assert client.get(f'/predictions/{freq}/{period}/{crypto}').status_code == 200
+
+    refreshes = []
+    refresh_coin = pp.refresh_coin
+    monkeypatch.setattr(pp, 'refresh_coin', lambda crypto, fresh=False: refreshes.append(crypto) or refresh_coin(crypto, fresh))
+    # An hour later every key comes due again
+    later = time.monotonic() + pp.PREDICTION_TTL
+    monkeypatch.setattr(pp.coin_cache, 'clock', lambda: later)
+
+    for key in keys:
+        pp.materialize(key)
+    assert refreshes == ['coin-51']
@@ -0,0 +1,61 @@
+import time
+
+import numpy as np
+
+import mockserver
+import tiers
+from pricestore import HISTORY_DAYS, PriceStore
+
+
+def make_store(tmp_path, server):
+    return PriceStore(root=str(tmp_path), api_url=server.coingecko_url)
+
+
+def test_cold_fetch_downloads_the_full_history_once(tmp_path, server):
+    store = make_store(tmp_path, server)
+    served = server.RequestHandlerClass.requests_served
+    assert store.last_timestamp('coin-01') is None
+
+    added = store.refresh('coin-01')
+    assert server.RequestHandlerClass.requests_served == served + 1
+    timestamps, prices = store.read('coin-01')
+    assert added == len(timestamps) >= HISTORY_DAYS
+    assert np.all(np.diff(timestamps) == mockserver.DAY_MS)
+    expected_timestamps, expected_prices = mockserver.synthetic_series('coin-01', timestamps[0], timestamps[-1],
+                                                                       mockserver.DAY_MS)
+    np.testing.assert_array_equal(timestamps, expected_timestamps)
+    np.testing.assert_allclose(prices, expected_prices)
+    assert store.coins() == ['coin-01']
+
+
+def test_refresh_only_downloads_the_tail(tmp_path, server):
+    store = make_store(tmp_path, server)
+    now_ms = int(time.time() * 1000)
+    timestamps, prices = mockserver.synthetic_series('coin-02', now_ms - 400 * mockserver.DAY_MS,
+                                                     now_ms - 3 * mockserver.DAY_MS, mockserver.DAY_MS)
+    store.append('coin-02', timestamps, prices)
+    last = store.last_timestamp('coin-02')
+
+    served = server.RequestHandlerClass.requests_served
+    added = store.refresh('coin-02')
+    assert server.RequestHandlerClass.requests_served == served + 1
+    assert added >= 3 * 24 - 1
+
+    stored, _ = store.read('coin-02')
+    assert len(stored) == len(timestamps) + added
+    np.testing.assert_array_equal(stored[:len(timestamps)], timestamps)
+    tail = stored[len(timestamps):]
+    assert tail[0] > last and np.all(np.diff(tail) == mockserver.HOUR_MS)
+
+    # The last bar of every tier ends at the new watermark
+    for tier in tiers.TIERS:
+        assert store.closes('coin-02', tier).end * 1000 == stored[-1]
+
+
+def test_append_skips_points_that_are_not_newer(tmp_path, server):
+    store = make_store(tmp_path, server)
+    assert store.append('coin-03', [3000, 1000, 2000, 2000], [3.0, 1.0, 2.0, 2.5]) == 3
+    assert store.append('coin-03', [2000, 3000, 4000], [9.0, 9.0, 4.0]) == 1
+    timestamps, prices = store.read('coin-03')
+    assert timestamps.tolist() == [1000, 2000, 3000, 4000]
+    assert prices.tolist() == [1.0, 2.0, 3.0, 4.0]
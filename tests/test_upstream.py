@@ -0,0 +1,93 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+from upstream import HostLimit, TokenBucket, UpstreamClient
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+# A server answering with the scripted (status, headers) responses in turn, then 200
+@pytest.fixture
+def scripted():
+    responses = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            status, headers = responses.pop(0) if responses else (200, {})
+            body = json.dumps({'status': status}).encode()
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_port}/', responses
+    server.shutdown()
+
+
+def test_rate_limited_requests_are_retried_after_retry_after(scripted):
+    url, responses = scripted
+    responses += [(429, {'Retry-After': '3'}), (503, {})]
+    clock = FakeClock()
+    client = UpstreamClient(backoff=0.5, clock=clock, sleep=clock.sleep)
+
+    assert client.get_json(url) == {'status': 200}
+    assert len(clock.sleeps) == 2
+    assert clock.sleeps[0] >= 3
+    assert 0 <= clock.sleeps[1] <= 1.0
+    assert client.counters['requests'] == 3
+    assert client.counters['retries'] == 2
+    assert client.counters['rate_limited'] == 1
+
+
+def test_the_last_response_is_returned_once_retries_are_exhausted(scripted):
+    url, responses = scripted
+    responses += [(500, {})] * 3
+    clock = FakeClock()
+    client = UpstreamClient(max_retries=2, clock=clock, sleep=clock.sleep)
+
+    assert client.get(url).status_code == 500
+    assert client.counters['requests'] == 3
+    responses += [(500, {})] * 3
+    with pytest.raises(requests.HTTPError):
+        client.get_json(url)
+
+
+def test_token_bucket_spaces_requests_after_a_burst():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=0.5, capacity=2, clock=clock, sleep=clock.sleep)
+    assert bucket.acquire() == 0 and bucket.acquire() == 0
+    assert bucket.acquire() == pytest.approx(2.0)
+    clock.now += 10
+    assert [bucket.acquire() for _ in range(3)] == [0, 0, pytest.approx(2.0)]
+
+
+def test_hosts_are_throttled_by_their_limit(server):
+    clock = FakeClock()
+    client = UpstreamClient(host_limits={'127.0.0.1': HostLimit(rate=1, burst=1, concurrency=2)},
+                            clock=clock, sleep=clock.sleep)
+    for _ in range(3):
+        assert client.get(f'{server.base_url}/unknown').status_code == 404
+    assert client.counters['throttle_seconds'] == pytest.approx(2.0)
+    assert client.counters['retries'] == 0
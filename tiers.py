@@ -0,0 +1,93 @@
+"""
+Resolution tiers of a coin's price history.
+
+The raw CoinGecko series mixes daily points (older history) with 5 minute
+and hourly points (recent refreshes). It is aggregated into hourly, daily
+and weekly OHLC bars, and every prediction frequency trains on the tier
+that matches its horizon instead of on every raw point:
+
+    hour  -> hourly bars of the last 90 days (CoinGecko's hourly window)
+    day   -> daily bars
+    month -> weekly bars
+    year  -> weekly bars
+
+A bar is stamped with the time of the last raw point in it, so the last bar
+of every tier ends at the same watermark as the raw series and predictions
+start from the same date whatever tier they use. Weeks start on Monday.
+"""
+import numpy as np
+
+
+HOUR_MS = 60 * 60 * 1000
+DAY_MS = 24 * HOUR_MS
+WEEK_MS = 7 * DAY_MS
+
+TIERS = ('hour', 'day', 'week')
+
+TIER_MS = {
+    'hour': HOUR_MS,
+    'day': DAY_MS,
+    'week': WEEK_MS,
+}
+
+# The epoch is a Thursday, shift week buckets to start on Monday
+_BUCKET_OFFSETS = {
+    'week': 4 * DAY_MS,
+}
+
+# Bars kept for training, counted back from the watermark (None keeps everything)
+TIER_SPANS = {
+    'hour': 90 * DAY_MS,
+    'day': None,
+    'week': None,
+}
+
+FREQ_TIERS = {
+    'hour': 'hour',
+    'day': 'day',
+    'month': 'week',
+    'year': 'week',
+}
+
+BAR_DTYPE = np.dtype([
+    ('time', '<i8'),  # milliseconds since the epoch of the last raw point in the bar
+    ('open', '<f8'),
+    ('high', '<f8'),
+    ('low', '<f8'),
+    ('close', '<f8'),
+])
+
+
+# Start in milliseconds of the bucket a timestamp falls in
+def bucket_start(timestamp_ms, tier):
+    offset = _BUCKET_OFFSETS.get(tier, 0)
+    return (timestamp_ms - offset) // TIER_MS[tier] * TIER_MS[tier] + offset
+
+
+# Aggregate sorted raw points into OHLC bars of one tier, in one vectorized pass
+def aggregate(timestamps_ms, prices, tier):
+    timestamps_ms = np.asarray(timestamps_ms, dtype=np.int64)
+    prices = np.asarray(prices, dtype=np.float64)
+    if len(timestamps_ms) == 0:
+        return np.empty(0, dtype=BAR_DTYPE)
+
+    buckets = (timestamps_ms - _BUCKET_OFFSETS.get(tier, 0)) // TIER_MS[tier]
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(buckets)] - 1
+
+    bars = np.empty(len(starts), dtype=BAR_DTYPE)
+    bars['time'] = timestamps_ms[ends]
+    bars['open'] = prices[starts]
+    bars['high'] = np.maximum.reduceat(prices, starts)
+    bars['low'] = np.minimum.reduceat(prices, starts)
+    bars['close'] = prices[ends]
+    return bars
+
+
+# The bars of a tier a model trains on: the tier's span back from the last bar, without copying
+def recent(bars, tier):
+    span = TIER_SPANS[tier]
+    if span is None or len(bars) == 0:
+        return bars
+    first = np.searchsorted(bars['time'], bars['time'][-1] - span, side='right')
+    return bars[first:]
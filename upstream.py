@@ -0,0 +1,179 @@
+"""
+Shared HTTP client for every upstream data fetch in the project.
+
+All calls go through one pooled requests.Session, so connections to
+CoinGecko and CryptoCompare are kept alive instead of paying a TCP and TLS
+handshake per request. Every host has a concurrency limit and a token-bucket
+scheduler matching its public rate limit. Requests that fail with 429, a 5xx
+or a connection error are retried with jittered exponential backoff,
+honouring Retry-After when the server sends it.
+
+The base URLs can be pointed at a local mock server with COINGECKO_API_URL
+and CRYPTOCOMPARE_API_URL.
+"""
+import os
+import random
+import threading
+import time
+from collections import namedtuple
+from urllib.parse import urlparse
+
+from lazy import lazy_import
+
+# requests is imported with the session, on the first request
+requests = lazy_import('requests')
+
+
+COINGECKO_API_URL = os.environ.get('COINGECKO_API_URL', 'https://api.coingecko.com/api/v3')
+CRYPTOCOMPARE_API_URL = os.environ.get('CRYPTOCOMPARE_API_URL', 'https://min-api.cryptocompare.com')
+
+# rate: sustained requests per second, burst: bucket size, concurrency: parallel connections
+HostLimit = namedtuple('HostLimit', ['rate', 'burst', 'concurrency'])
+
+HOST_LIMITS = {
+    # Public API: about 30 calls per minute
+    'api.coingecko.com': HostLimit(rate=0.5, burst=5, concurrency=4),
+    # Free tier: 50 calls per second, kept well under it
+    'min-api.cryptocompare.com': HostLimit(rate=20, burst=20, concurrency=8),
+}
+# Anything else (mock servers, private mirrors) is not rate limited
+DEFAULT_LIMIT = HostLimit(rate=None, burst=None, concurrency=16)
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# (connect, read) timeouts in seconds
+DEFAULT_TIMEOUT = (5, 30)
+
+
+class TokenBucket:
+    """Allow `rate` acquisitions per second on average with bursts of `capacity`."""
+
+    def __init__(self, rate, capacity, clock=time.monotonic, sleep=time.sleep):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = capacity
+        self.updated = clock()
+        self._lock = threading.Lock()
+
+    # Take one token, blocking until one is available. Returns the seconds waited.
+    def acquire(self):
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self.clock()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            self.sleep(wait)
+            waited += wait
+
+
+class UpstreamClient:
+    """Pooled, rate-limited HTTP client with retries."""
+
+    def __init__(self, host_limits=None, max_retries=4, backoff=0.5, max_backoff=30.0,
+                 timeout=DEFAULT_TIMEOUT, pool_size=16, clock=time.monotonic, sleep=time.sleep):
+        self.host_limits = dict(HOST_LIMITS if host_limits is None else host_limits)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.clock = clock
+        self.sleep = sleep
+
+        self.pool_size = pool_size
+        self._session = None
+
+        self._lock = threading.Lock()
+        self._hosts = {}  # host -> (semaphore, token bucket or None)
+        self.counters = {'requests': 0, 'retries': 0, 'rate_limited': 0, 'throttle_seconds': 0.0}
+
+    # The pooled session, created on first use
+    @property
+    def session(self):
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    session = requests.Session()
+                    adapter = requests.adapters.HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size,
+                                                            max_retries=0)
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    self._session = session
+        return self._session
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def get_json(self, url, **kwargs):
+        response = self.get(url, **kwargs)
+        response.raise_for_status()  # Raise an exception if the request fails
+        return response.json()
+
+    # Send a request, retrying 429/5xx responses and connection errors.
+    # The last response is returned once retries are exhausted, so callers
+    # keep using raise_for_status() / response.ok as before.
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        semaphore, bucket = self._host(urlparse(url).hostname)
+
+        attempt = 0
+        while True:
+            if bucket is not None:
+                waited = bucket.acquire()
+                if waited:
+                    self._count('throttle_seconds', waited)
+
+            self._count('requests')
+            try:
+                with semaphore:
+                    response = self.session.request(method, url, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt >= self.max_retries:
+                    raise
+                response = None
+
+            if response is not None and response.status_code not in RETRY_STATUSES:
+                return response
+            if response is not None and attempt >= self.max_retries:
+                return response
+
+            if response is not None and response.status_code == 429:
+                self._count('rate_limited')
+            self._count('retries')
+            self.sleep(self._retry_delay(attempt, response))
+            attempt += 1
+
+    def _retry_delay(self, attempt, response):
+        # Full jitter: anywhere between 0 and the exponential backoff cap
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        retry_after = response.headers.get('Retry-After') if response is not None else None
+        if retry_after is not None:
+            try:
+                delay = max(delay, min(self.max_backoff, float(retry_after)))
+            except ValueError:
+                pass  # HTTP-date form, fall back to the backoff
+        return delay
+
+    def _host(self, host):
+        with self._lock:
+            if host not in self._hosts:
+                limit = self.host_limits.get(host, DEFAULT_LIMIT)
+                bucket = None
+                if limit.rate is not None:
+                    bucket = TokenBucket(limit.rate, limit.burst, clock=self.clock, sleep=self.sleep)
+                self._hosts[host] = (threading.BoundedSemaphore(limit.concurrency), bucket)
+            return self._hosts[host]
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+
+# Shared client used by the services, the CLI and the scripts
+client = UpstreamClient()